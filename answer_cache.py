@@ -0,0 +1,141 @@
+# answer_cache.py — exact + semantic answer cache in front of ollama_generate
+import os
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ----------------------------
+# Config
+# ----------------------------
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# semantic tier: reuse an answer when the query embedding is this close (cosine) to a cached one
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "0") == "1"
+ANSWER_CACHE_SIM_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIM_THRESHOLD", "0.93"))
+
+
+def normalize_query(text):
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip("?!. ")
+
+
+class _Entry:
+    __slots__ = ("scope", "query", "answer", "vec", "expires", "size")
+
+    def __init__(self, scope, query, answer, vec, expires):
+        self.scope = scope
+        self.query = query
+        self.answer = answer
+        self.vec = vec
+        self.expires = expires
+        self.size = sys.getsizeof(query) + sys.getsizeof(answer) + (vec.nbytes if vec is not None else 0)
+
+
+class AnswerCache:
+    """LRU/TTL cache keyed on (model, active version, normalized query), bounded by entries and bytes."""
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, max_bytes=ANSWER_CACHE_MAX_BYTES,
+                 ttl=ANSWER_CACHE_TTL, sim_threshold=ANSWER_CACHE_SIM_THRESHOLD):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sim_threshold = sim_threshold
+        self._entries = OrderedDict()  # (scope, query) -> _Entry, oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ----------------------------
+    # Internals (call with the lock held)
+    # ----------------------------
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    # ----------------------------
+    # Lookup / store
+    # ----------------------------
+    def get(self, scope, query, vec=None):
+        """Return a cached answer or None. `vec` (L2-normalized) enables the semantic tier."""
+        key = (scope, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires < now:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer
+
+            if vec is not None:
+                best_key, best_sim = None, self.sim_threshold
+                for k, e in self._entries.items():
+                    if e.scope != scope or e.vec is None or e.expires < now:
+                        continue
+                    sim = float(np.dot(e.vec, vec))
+                    if sim >= best_sim:
+                        best_key, best_sim = k, sim
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.semantic_hits += 1
+                    return self._entries[best_key].answer
+
+            self.misses += 1
+            return None
+
+    def put(self, scope, query, answer, vec=None):
+        key = (scope, normalize_query(query))
+        entry = _Entry(scope, key[1], answer, vec, time.time() + self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+
+    def invalidate(self, model_key=None):
+        """Drop entries for scopes whose model contains `model_key` (all entries when None)."""
+        with self._lock:
+            if model_key is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return removed
+            stale = [k for k, e in self._entries.items() if model_key in e.scope[0]]
+            for k in stale:
+                self._drop(k)
+            return len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "enabled": ANSWER_CACHE_ENABLED,
+                "semantic": ANSWER_CACHE_SEMANTIC,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+answer_cache = AnswerCache()
@@ -1,16 +1,15 @@
 # app.py — Full backend (Chat + Whisper + Ollama + Admin version management)
 import os
+import io
+import csv
 import json
 import time
 import sys
 import threading
-from flask import Flask, request, jsonify, send_from_directory, session
+_BOOT_T0 = time.perf_counter()  # startup time is reported once the module has finished loading
+from flask import Flask, Response, g, request, jsonify, send_from_directory, session, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from PyPDF2 import PdfReader
-import whisper
-import requests
-from deep_translator import GoogleTranslator
 from dotenv import load_dotenv
 
 # ----------------------------
@@ -20,6 +19,23 @@ load_dotenv()
 sys.stdout.reconfigure(encoding="utf-8")
 print(">>> USING PYTHON FROM:", sys.executable)
 
+# local modules read their config from the environment, so import them after load_dotenv()
+import ollama_client
+from ollama_client import OllamaBusy
+from chunk_store import store_files
+from bm25_index import index_files
+from retriever import Retriever, default_retriever, embed_query, CONTEXT_TOKEN_BUDGET, CHARS_PER_TOKEN
+from answer_cache import answer_cache, ANSWER_CACHE_ENABLED, ANSWER_CACHE_SEMANTIC
+from chat_store import ChatLogStore
+from conversations import ConversationStore, summary_prompt
+from prompt_builder import build_prompt, version_prefix
+from version_registry import VersionRegistry
+from train_jobs import TrainJobManager
+from model_registry import registry as model_registry, process_rss_mb, WARMUP_MODELS
+import metrics
+from translator import Translator
+from transcriber import Transcriber, VoiceSessions, TranscriberBusy, TranscribeTimeout
+
 # ----------------------------
 # Config / Paths
 # ----------------------------
@@ -27,14 +43,17 @@ BASE_DIR = os.getcwd()
 DATA_DIR = os.path.join(BASE_DIR, "data")
 PDF_STORE = os.path.join(DATA_DIR, "pdfs")
 VERSIONS_PATH = os.path.join(DATA_DIR, "versions.json")
-CHAT_LOG = os.path.join(DATA_DIR, "chat_logs.json")
+CHAT_LOG = os.path.join(DATA_DIR, "chat_logs.json")  # legacy JSON array, migrated into CHAT_DB once
+CHAT_DB = os.path.join(DATA_DIR, "chat_logs.db")
+TRANSLATION_DB = os.getenv("TRANSLATION_CACHE_DB", os.path.join(DATA_DIR, "translations.db"))
 
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(PDF_STORE, exist_ok=True)
 
-# Ollama / model config
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+# Ollama / model config (endpoint, pool and queue limits live in ollama_client.py)
 MODEL_NAME = os.getenv("DEFAULT_MODEL", "gemma2:2b")
+# chat models loaded + primed on Ollama when a version is activated (comma-separated)
+OLLAMA_WARM_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARM_MODELS", MODEL_NAME).split(",") if m.strip()]
 
 # Admin debug + delete behavior
 DEBUG_ADMIN = True
@@ -48,21 +67,10 @@ app.secret_key = os.getenv("FLASK_SECRET", "super_secret_key_change_this")
 CORS(app, supports_credentials=True)
 
 # ----------------------------
-# Whisper model (load in background)
+# Whisper (model loads on the transcriber's own worker thread; see WHISPER_MODEL in transcriber.py)
 # ----------------------------
-whisper_model = None
-
-def load_whisper_model():
-    global whisper_model
-    try:
-        print("🎙️ Loading Whisper model (small)...")
-        whisper_model = whisper.load_model("small", device="cpu")
-        print("✅ Whisper loaded.")
-    except Exception as e:
-        print("❌ Whisper load error:", e)
-        whisper_model = None
-
-threading.Thread(target=load_whisper_model).start()
+transcriber = Transcriber()
+voice_sessions = VoiceSessions(transcriber)
 
 # ----------------------------
 # Utils: debug log
@@ -71,94 +79,212 @@ def dlog(*args, **kwargs):
     if DEBUG_ADMIN:
         print("[DEBUG]", *args, **kwargs)
 
+# ----------------------------
+# Utils: request timing (Prometheus histograms, served on /metrics; METRICS_ENABLED=0 makes these no-ops)
+# ----------------------------
+def stage(name):
+    """`with stage("retrieval"):` adds the block's time to request_stage_duration_seconds for this endpoint."""
+    return metrics.span(metrics.STAGE_SECONDS, metrics.current_endpoint.get(), name)
+
+@app.before_request
+def _start_timer():
+    if metrics.METRICS_ENABLED:
+        g.t0 = time.perf_counter()
+        metrics.current_endpoint.set(request.endpoint or "unmatched")
+
+@app.after_request
+def _observe_request(resp):
+    if metrics.METRICS_ENABLED and "t0" in g:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.t0, request.endpoint or "unmatched",
+                                        request.method, str(resp.status_code))
+    return resp
+
 # ----------------------------
 # Utils: versions storage
 # versions.json structure: list of {model, version, description, timestamp, files[], active}
+# Held in memory by the registry; writes are atomic, other processes' edits are picked up by mtime.
 # ----------------------------
+version_registry = VersionRegistry(VERSIONS_PATH, PDF_STORE, log=dlog)
+
 def load_versions():
-    if not os.path.exists(VERSIONS_PATH):
-        return []
-    try:
-        with open(VERSIONS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        dlog("load_versions error:", e)
-        return []
+    return version_registry.all()
 
 def save_versions(versions):
     try:
-        with open(VERSIONS_PATH, "w", encoding="utf-8") as f:
-            json.dump(versions, f, indent=2, ensure_ascii=False)
+        version_registry.save(versions)
     except Exception as e:
         dlog("save_versions error:", e)
 
 # ----------------------------
-# Utils: extract text from PDF
+# Utils: Ollama call (pooled session + bounded queue, see ollama_client.py)
 # ----------------------------
-def extract_pdf_text(path):
-    text = ""
+def reply_text(data):
+    # Ollama response shape may differ; try common keys:
+    if isinstance(data, dict):
+        # try a few keys
+        for k in ("response", "text", "content", "output"):
+            if k in data:
+                return data[k]
+        # if nested
+        if "choices" in data and isinstance(data["choices"], list) and data["choices"]:
+            ch = data["choices"][0]
+            return ch.get("message", ch.get("text", "")) if isinstance(ch, dict) else str(ch)
+    return str(data)
+
+def ollama_generate(prompt, model=MODEL_NAME, timeout=60, turn=None):
+    """turn: a prepare_chat() turn; its session's Ollama context goes out and the returned one is kept on it."""
     try:
-        reader = PdfReader(path)
-        for page in reader.pages:
-            text += page.extract_text() or ""
+        data = ollama_client.generate(prompt, model=model, timeout=timeout, context=turn and turn["ollama_context"])
+        if turn is not None and isinstance(data, dict):
+            turn["reply_context"] = data.get("context")
+        return reply_text(data)
+    except OllamaBusy:
+        raise
     except Exception as e:
-        dlog("PDF extract error:", path, e)
-    return text
+        dlog("Ollama generate error:", e)
+        return "⚠️ Ollama not responding."
 
 # ----------------------------
-# Utils: Ollama call
+# Context: FAISS retrieval (active version's index, else the ingest_dataset.py index),
+# falling back to the active version's context.txt
 # ----------------------------
-def ollama_generate(prompt, model=MODEL_NAME, timeout=60):
+_version_retrievers = {}
+# files a trained version writes next to its PDFs (metadata.json: versions trained before the chunk store)
+VERSION_ARTIFACTS = ("context.txt", "faiss.index", "metadata.json") + tuple(store_files("chunks")) + tuple(index_files("bm25"))
+
+def find_active_version(model):
+    return version_registry.active_for(model)
+
+def version_retriever(entry):
+    folder = os.path.join(PDF_STORE, entry["model"], entry["version"])
+    if folder not in _version_retrievers:
+        _version_retrievers[folder] = Retriever(os.path.join(folder, "faiss.index"), os.path.join(folder, "chunks"),
+                                                 os.path.join(folder, "metadata.json"), os.path.join(folder, "bm25"))
+    return _version_retrievers[folder]
+
+def forget_version_retriever(model_key, version):
+    # its files were rewritten or removed; the next request opens them afresh instead of trusting the
+    # retriever's throttled stat
+    _version_retrievers.pop(os.path.join(PDF_STORE, model_key, version), None)
+
+def retriever_for(active):
+    return version_retriever(active) if active and active.get("indexed") else default_retriever
+
+def fallback_context(active):
+    """The active version's context.txt (budget-trimmed); the same text for every question."""
+    if not active:
+        return ""
     try:
-        payload = {"model": model, "prompt": prompt, "stream": False}
-        res = requests.post(OLLAMA_URL, json=payload, timeout=timeout)
-        res.raise_for_status()
-        data = res.json()
-        # Ollama response shape may differ; try common keys:
-        if isinstance(data, dict):
-            # try a few keys
-            for k in ("response", "text", "content", "output"):
-                if k in data:
-                    return data[k]
-            # if nested
-            if "choices" in data and isinstance(data["choices"], list) and data["choices"]:
-                ch = data["choices"][0]
-                return ch.get("message", ch.get("text", "")) if isinstance(ch, dict) else str(ch)
-        return str(data)
+        return version_registry.context_for(active, CONTEXT_TOKEN_BUDGET * CHARS_PER_TOKEN)
     except Exception as e:
-        dlog("Ollama generate error:", e)
-        return "⚠️ Ollama not responding."
+        dlog("read context error:", e)
+        return ""
+
+def build_context(query, model, qvec=None):
+    """Return (context, retrieval_info) for the prompt; retrieval_info is None on fallback."""
+    active = find_active_version(model)
+    retriever = retriever_for(active)
+    if retriever.available():
+        try:
+            result = retriever.search(query, vec=qvec)
+            dlog("retrieval:", len(result["chunks"]), "chunks,", result["tokens"], "tokens,", result["latency_ms"], "ms",
+                 f"(bm25 {result['lexical_ms']} ms)" if result.get("lexical_ms") is not None else "")
+            return result["context"], result
+        except Exception as e:
+            dlog("retrieval error:", e)
+    return fallback_context(active), None
+
+# ----------------------------
+# Ollama warm-up: load the model and evaluate the active version's prompt prefix ahead of the first chat
+# (on activation, and at boot with WARMUP_MODELS=ollama)
+# ----------------------------
+last_warm_up = {}  # model -> per-host timings of the latest warm-up
+
+def warm_up_chat_models(model_key=None):
+    """Warm the OLLAMA_WARM_MODELS whose context comes from `model_key` (default: all of them) in the background."""
+    models = [m for m in OLLAMA_WARM_MODELS if model_key is None or model_key in m]
+
+    def run():
+        for model in models:
+            active = find_active_version(model)
+            # same prefix prepare_chat builds: the fixed context only when there is no index to retrieve from
+            reference = "" if retriever_for(active).available() else fallback_context(active)
+            results = ollama_client.warm_up(model, version_prefix(reference))
+            last_warm_up[model] = {"ts": int(time.time()), "version": active["version"] if active else None,
+                                   "hosts": results}
+            dlog("Ollama warm-up", model, results)
+    if models:
+        threading.Thread(target=run, name="ollama-warmup", daemon=True).start()
+    return models
+
+# ----------------------------
+# Answer cache helpers
+# scope = (model, active context version) so a new version / rebuilt index never hits old answers
+# ----------------------------
+def cache_scope(model, context_model=None):
+    active = find_active_version(context_model or model)
+    return (model, f"{active['model']}:{active['version']}" if active else "-", default_retriever.version())
+
+def query_vector(query):
+    """Embedding for the semantic cache tier (also reused by retrieval); None when the tier is off."""
+    if not (ANSWER_CACHE_ENABLED and ANSWER_CACHE_SEMANTIC):
+        return None
+    try:
+        return embed_query(query)[0]
+    except Exception as e:
+        dlog("query embedding error:", e)
+        return None
+
+def cached_answer(scope, query, qvec):
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return answer_cache.get(scope, query, qvec)
+
+def remember_answer(scope, query, reply, qvec):
+    # never cache failures
+    if ANSWER_CACHE_ENABLED and reply and not reply.startswith("⚠️"):
+        answer_cache.put(scope, query, reply, qvec)
 
 # ----------------------------
 # Chat logging
 # ----------------------------
-def log_chat(user, question, answer, model=MODEL_NAME, feedback=None):
-    logs = []
-    if os.path.exists(CHAT_LOG):
-        try:
-            with open(CHAT_LOG, "r", encoding="utf-8") as f:
-                logs = json.load(f)
-        except Exception:
-            logs = []
-    entry = {"user": user, "question": question, "answer": answer, "model": model, "feedback": feedback, "ts": int(time.time())}
-    logs.append(entry)
+chat_store = ChatLogStore(CHAT_DB, legacy_json_path=CHAT_LOG)
+
+def log_chat(user, question, answer, model=MODEL_NAME, feedback=None, lang=None, scope=None, t0=None):
+    """Append a chat entry; returns the stored entry (with its id) or None on failure.
+
+    scope: the cache_scope() of the request (records the context version), t0: its perf_counter() start.
+    """
+    entry = {"user": user, "question": question, "answer": answer, "model": model, "feedback": feedback,
+             "lang": lang, "ts": int(time.time()),
+             "version": scope[1] if scope and scope[1] != "-" else None,
+             "latency_ms": int((time.perf_counter() - t0) * 1000) if t0 is not None else None}
     try:
-        with open(CHAT_LOG, "w", encoding="utf-8") as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
+        entry["id"] = chat_store.append(entry)
+        return entry
     except Exception as e:
         dlog("log_chat error:", e)
+        return None
+
+# ----------------------------
+# Conversation memory (/api/chat with a session_id): recent turns + rolling summary, see conversations.py
+# ----------------------------
+def summarize_turns(summary, turns):
+    return reply_text(ollama_client.generate(summary_prompt(summary, turns), model=MODEL_NAME))
+
+conversations = ConversationStore(summarize=summarize_turns, log=dlog)
+
+def valid_session_id(sid):
+    return sid is None or (isinstance(sid, str) and 0 < len(sid) <= 128)
 
 # ----------------------------
 # Translation helper
 # ----------------------------
-def translate_text(text, target_lang):
-    if not text or not text.strip():
-        return text
-    try:
-        return GoogleTranslator(source="auto", target=target_lang).translate(text)
-    except Exception as e:
-        dlog("translate error:", e)
-        return text
+# cached (memory + data/translations.db) and batched per paragraph; backend set by TRANSLATOR_BACKEND
+translator = Translator(db_path=TRANSLATION_DB, log=dlog)
+
+def translate_text(text, target_lang, source_lang="auto"):
+    return translator.translate(text, target_lang, source_lang)
 
 # ----------------------------
 # Serve frontend
@@ -167,102 +293,345 @@ def translate_text(text, target_lang):
 def serve_frontend():
     return send_from_directory(app.static_folder, "index.html")
 
+# ----------------------------
+# Chat turn, split around the generation call so the WSGI handlers below and the async ones in
+# asgi_app.py share it: prepare_chat -> generate (blocking here, awaited there) -> finish_chat
+# ----------------------------
+def prepare_chat(message, lang, model, context_model=None, t0=None, session_id=None):
+    """Translation, answer cache and retrieval for one turn; returns the turn state (prompt included).
+
+    session_id: conversation to continue; its history goes into the prompt (or Ollama's context) and
+    follow-ups bypass the answer cache, since their meaning depends on that history.
+    """
+    turn = {"message": message, "lang": lang, "model": model, "t0": t0 if t0 is not None else time.perf_counter()}
+    conv = conversations.get(session_id) if session_id else None
+    history = conv.history() if conv else ""
+    # translate if telugu requested
+    query = message
+    if lang == "te":
+        with stage("translate_in"):
+            query = translate_text(message, "en")
+
+    with stage("versions"):
+        scope = cache_scope(model, context_model)
+    with stage("embed"):
+        qvec = query_vector(query)
+    with stage("cache"):
+        cached = cached_answer(scope, query, qvec) if not history else None
+
+    with stage("retrieval"):
+        context, retrieval = ("", None) if cached is not None else build_context(
+            query, context_model or model, qvec[None, :] if qvec is not None else None)
+
+    # without retrieval the context is the version's fixed text, which goes into the stable prompt prefix
+    reference, context = (context, "") if retrieval is None else ("", context)
+    # a follow-up continues from the token array Ollama returned last turn; otherwise the history is spelled out
+    ollama_context = conv.reusable_context(model) if history else None
+    prompt = build_prompt(query, context, history, reference, continuation=ollama_context is not None)
+    turn.update(query=query, scope=scope, qvec=qvec, cached=cached, retrieval=retrieval, prompt=prompt,
+                conversation=conv, history=bool(history), ollama_context=ollama_context, reply_context=None)
+    return turn
+
+def finish_chat(turn, reply, fresh, user="user", translate_reply=True):
+    """Cache a freshly generated reply, add it to the conversation, translate it back, log the turn;
+    returns the response fields."""
+    if fresh and not turn["history"]:
+        remember_answer(turn["scope"], turn["query"], reply, turn["qvec"])
+    conv = turn["conversation"]
+    if conv is not None and reply and not reply.startswith("⚠️"):
+        conversations.record(conv, turn["query"], reply, turn["model"], turn["reply_context"], turn["ollama_context"])
+    if translate_reply and turn["lang"] == "te":
+        # translate back to Telugu if needed (optional, here assume Ollama responded in english)
+        try:
+            with stage("translate_out"):
+                reply = translate_text(reply, "te", "en")
+        except Exception:
+            pass
+
+    with stage("log"):
+        entry = log_chat(user, turn["message"], reply, model=turn["model"], lang=turn["lang"],
+                         scope=turn["scope"], t0=turn["t0"])
+    resp = {"reply": reply, "ts": entry["ts"] if entry else int(time.time()), "cached": turn["cached"] is not None}
+    if entry:
+        resp["id"] = entry["id"]
+    if conv is not None:
+        resp["session_id"] = conv.id
+    retrieval = turn["retrieval"]
+    if retrieval:
+        resp["retrieval_ms"] = retrieval["latency_ms"]
+        resp["sources"] = sorted({c["source"] for c in retrieval["chunks"] if c.get("source")})
+    return resp
+
 # ----------------------------
 # Chat endpoint — uses active version context if available
+# body: {message, lang, model[, session_id (client-chosen, keeps the conversation), stream]}
 # ----------------------------
 @app.route("/api/chat", methods=["POST"])
 def api_chat():
+    t0 = time.perf_counter()
     data = request.get_json(force=True)
     message = data.get("message", "").strip()
     lang = data.get("lang", "auto")
     model = data.get("model", MODEL_NAME)
+    session_id = data.get("session_id")
 
     if not message:
         return jsonify({"reply": "⚠️ Please enter a message."}), 400
+    if not valid_session_id(session_id):
+        return jsonify({"error": "Invalid session_id"}), 400
 
-    # Load active version's context for the requested model (if any)
-    versions = load_versions()
-    active = None
-    for v in versions:
-        # match model key by prefix (e.g., "gemma2" in "gemma2:2b") or exact
-        if (v.get("model") and v.get("model") in model) or (v.get("model") == model):
-            if v.get("active"):
-                active = v
-                break
-
-    context = ""
-    if active:
-        ctx_path = os.path.join(PDF_STORE, active["model"], active["version"], "context.txt")
-        if os.path.exists(ctx_path):
-            try:
-                with open(ctx_path, "r", encoding="utf-8") as f:
-                    context = f.read()[:4000]
-            except Exception as e:
-                dlog("read context error:", e)
+    turn = prepare_chat(message, lang, model, t0=t0, session_id=session_id)
 
-    # translate if telugu requested
-    query = message
-    if lang == "te":
-        query = translate_text(message, "en")
+    if data.get("stream"):
+        return stream_chat(turn)
 
-    prompt = f"Use this context if relevant:\n{context}\n\nUser question:\n{query}"
-    reply = ollama_generate(prompt, model=model)
+    reply = turn["cached"]
+    if reply is None:
+        with stage("generate"):
+            reply = ollama_generate(turn["prompt"], model=model, turn=turn)
+    return jsonify(finish_chat(turn, reply, fresh=turn["cached"] is None))
 
-    if lang == "te":
-        # translate back to Telugu if needed (optional, here assume Ollama responded in english)
+# ----------------------------
+# Streaming chat (NDJSON)
+# POST /api/chat {..., "stream": true}
+# lines: {"token": "..."}* then {"done": true, "reply", "id", "ts", "cached"[, "session_id", "retrieval_ms", "sources"]}
+# ----------------------------
+def stream_chat(turn):
+    cached = turn["cached"]
+    # take the generation slot before the response starts so a full queue is still a plain 503
+    stream = None
+    if cached is None:
         try:
-            reply = translate_text(reply, "te")
-        except Exception:
-            pass
+            stream = ollama_client.generate_stream(turn["prompt"], model=turn["model"], context=turn["ollama_context"])
+        except OllamaBusy:
+            raise
+        except Exception as e:
+            dlog("Ollama stream error:", e)
 
-    log_chat("user", message, reply, model=model)
-    return jsonify({"reply": reply, "ts": int(time.time())})
+    def generate():
+        parts = []
+        failed = False
+        # time to the last token, as the client sees it
+        with stage("generate"):
+            try:
+                if cached is not None:
+                    parts.append(cached)
+                    yield json.dumps({"token": cached}, ensure_ascii=False) + "\n"
+                elif stream is None:
+                    raise RuntimeError("Ollama not responding")
+                else:
+                    for chunk in stream:
+                        token = chunk.get("response", "")
+                        if token:
+                            parts.append(token)
+                            yield json.dumps({"token": token}, ensure_ascii=False) + "\n"
+                        if chunk.get("done"):
+                            turn["reply_context"] = chunk.get("context")
+            except Exception as e:
+                dlog("Ollama stream error:", e)
+                failed = True
+                if not parts:
+                    parts.append("⚠️ Ollama not responding.")
+                yield json.dumps({"error": "stream interrupted"}) + "\n"
+            finally:
+                if stream is not None:
+                    stream.close()
+
+        # tokens were streamed in English; the final line carries the translated reply, logged once complete
+        done = {"done": True}
+        done.update(finish_chat(turn, "".join(parts), fresh=cached is None and not failed))
+        yield json.dumps(done, ensure_ascii=False) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # ----------------------------
 # Transcription endpoint
 # ----------------------------
+def answer_voice(text, lang):
+    """Run a transcript through the usual context + ollama_generate path; returns the response fields."""
+    turn = prepare_chat(text, lang, MODEL_NAME, context_model="gemma2")
+    reply = turn["cached"]
+    if reply is None:
+        with stage("generate"):
+            reply = ollama_generate(turn["prompt"], model=MODEL_NAME)
+    return finish_chat(turn, reply, fresh=turn["cached"] is None, user="voice", translate_reply=False)
+
 @app.route("/api/transcribe", methods=["POST"])
 def api_transcribe():
-    global whisper_model
-    if whisper_model is None:
-        return jsonify({"error": "⚠️ Whisper model is loading. Try again shortly."}), 503
-
     if "file" not in request.files:
         return jsonify({"error": "❌ No audio file uploaded."}), 400
 
     file = request.files["file"]
     lang = request.form.get("lang", "auto")
-    temp_path = os.path.join(DATA_DIR, f"temp_{int(time.time())}.wav")
-    file.save(temp_path)
 
     try:
-        result = whisper_model.transcribe(temp_path, language="te" if lang == "te" else None)
-        text = result.get("text", "").strip()
+        # decoded in memory; inference runs on the transcriber worker, not this request thread
+        with stage("transcribe"):
+            result = transcriber.transcribe(file.read(), language="te" if lang == "te" else None)
+        text = result["text"]
+        dlog("transcribe:", result["audio_seconds"], "s audio in", result["inference_seconds"], "s, rtf", result["rtf"])
         if not text:
             return jsonify({"text": "", "reply": "⚠️ Couldn't understand the audio clearly."})
-        query = text if lang != "te" else translate_text(text, "en")
-        # Get context from active version for default model
-        versions = load_versions()
-        active = next((v for v in versions if v.get("model") == "gemma2" and v.get("active")), None)
-        context = ""
-        if active:
-            ctx_path = os.path.join(PDF_STORE, active["model"], active["version"], "context.txt")
-            if os.path.exists(ctx_path):
-                with open(ctx_path, "r", encoding="utf-8") as f:
-                    context = f.read()[:4000]
-        prompt = f"Use this context if relevant:\n{context}\n\nUser question:\n{query}"
-        reply = ollama_generate(prompt, model=MODEL_NAME)
-        log_chat("voice", text, reply, model=MODEL_NAME)
-        return jsonify({"text": text, "reply": reply})
+        resp = {"text": text, "audio_seconds": result["audio_seconds"], "rtf": result["rtf"]}
+        resp.update(answer_voice(text, lang))
+        return jsonify(resp)
+    except (OllamaBusy, TranscriberBusy):
+        raise
+    except TranscribeTimeout as e:
+        return jsonify({"error": f"⚠️ {e}"}), 504
+    except ValueError as e:
+        # undecodable upload
+        return jsonify({"error": f"❌ {e}"}), 400
     except Exception as e:
         dlog("transcribe error:", e)
         return jsonify({"error": str(e)}), 500
-    finally:
-        try:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        except:
-            pass
+
+# ----------------------------
+# Batch translation (UI phrases, several strings in one call)
+# body: {"texts": [...], "target": "te", "source": "auto"}
+# ----------------------------
+@app.route("/api/translate", methods=["POST"])
+def api_translate():
+    data = request.get_json(silent=True) or {}
+    texts = data.get("texts")
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({"error": "texts must be a list of strings"}), 400
+    target = data.get("target", "te")
+    return jsonify({"texts": translator.translate_many(texts, target, data.get("source", "auto"))})
+
+# ----------------------------
+# Chunked voice: the client posts each recorded segment as soon as it is captured
+# form: file (standalone audio file), seq (0, 1, ...), session (omit on seq 0), final=1 on the last, lang
+# each response carries this segment's transcript ("partial") and the transcript so far ("text");
+# the final one also has the LLM reply, as /api/transcribe does
+# ----------------------------
+@app.route("/api/transcribe/stream", methods=["POST"])
+def api_transcribe_stream():
+    lang = request.form.get("lang", "auto")
+    final = request.form.get("final") == "1"
+    try:
+        seq = int(request.form.get("seq", "0"))
+        sid = request.form.get("session")
+        if sid:
+            sess = voice_sessions.get(sid)
+            if sess is None:
+                return jsonify({"error": "❌ Unknown or expired voice session."}), 404
+        else:
+            sess = voice_sessions.create(language="te" if lang == "te" else None)
+        file = request.files.get("file")
+        with stage("transcribe"):
+            partial = sess.feed(file.read() if file else b"", seq, final)
+        resp = {"session": sess.id, "seq": seq, "partial": partial, "text": sess.text(), "final": final}
+        if not final:
+            return jsonify(resp)
+
+        voice_sessions.close(sess.id)
+        if sess.audio_seconds:
+            resp.update(audio_seconds=round(sess.audio_seconds, 2), rtf=round(sess.inference_seconds / sess.audio_seconds, 3))
+        dlog("transcribe stream:", seq + 1, "segments,", resp.get("audio_seconds"), "s audio, rtf", resp.get("rtf"))
+        if not resp["text"]:
+            resp["reply"] = "⚠️ Couldn't understand the audio clearly."
+            return jsonify(resp)
+        resp.update(answer_voice(resp["text"], lang))
+        return jsonify(resp)
+    except (OllamaBusy, TranscriberBusy):
+        raise
+    except TranscribeTimeout as e:
+        return jsonify({"error": f"⚠️ {e}"}), 504
+    except ValueError as e:
+        # bad seq / undecodable segment
+        return jsonify({"error": f"❌ {e}"}), 400
+    except Exception as e:
+        dlog("transcribe stream error:", e)
+        return jsonify({"error": str(e)}), 500
+
+# ----------------------------
+# Prometheus scrape endpoint (stage / request latency histograms, Ollama token counts and speed)
+# ----------------------------
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    if not metrics.METRICS_ENABLED:
+        return jsonify({"error": "metrics disabled"}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# ----------------------------
+# Ollama saturated → 503 + Retry-After
+# ----------------------------
+@app.errorhandler(OllamaBusy)
+def handle_ollama_busy(e):
+    resp = jsonify({"reply": "⚠️ Server is busy, please try again shortly.", "error": str(e)})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+@app.errorhandler(TranscriberBusy)
+def handle_transcriber_busy(e):
+    resp = jsonify({"error": f"⚠️ {e}. Try again shortly."})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+# ----------------------------
+# Admin: Ollama queue stats
+# GET /api/admin/ollama/stats
+# ----------------------------
+@app.route("/api/admin/ollama/stats", methods=["GET"])
+def admin_ollama_stats():
+    if not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+    # one queue for the thread handlers and the async ones (uvicorn asgi_app:app)
+    stats = ollama_client.limiter.stats()
+    # identical prompts answered by a generation already in flight (see coalesce.py)
+    stats["coalescing"] = ollama_client.flight.stats()
+    stats["async"] = {"coalescing": ollama_client.async_flight.stats()}
+    # per-host health, circuit state and load (see ollama_router.py)
+    stats["backends"] = ollama_client.router.stats()
+    stats["warm_up"] = last_warm_up
+    return jsonify(stats)
+
+# ----------------------------
+# Admin: transcription queue stats (RTF, queue depth, rejections)
+# GET /api/admin/transcribe/stats
+# ----------------------------
+@app.route("/api/admin/transcribe/stats", methods=["GET"])
+def admin_transcribe_stats():
+    if not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(transcriber.stats())
+
+# ----------------------------
+# Admin: translation cache stats
+# GET /api/admin/translate/stats
+# ----------------------------
+@app.route("/api/admin/translate/stats", methods=["GET"])
+def admin_translate_stats():
+    if not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(translator.stats())
+
+# ----------------------------
+# Admin: answer cache stats
+# GET /api/admin/cache/stats
+# ----------------------------
+@app.route("/api/admin/cache/stats", methods=["GET"])
+def admin_cache_stats():
+    if not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(answer_cache.stats())
+
+# ----------------------------
+# Admin: conversation memory stats
+# GET /api/admin/conversations/stats
+# ----------------------------
+@app.route("/api/admin/conversations/stats", methods=["GET"])
+def admin_conversation_stats():
+    if not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(conversations.stats())
 
 # ----------------------------
 # Admin: login / check / logout
@@ -294,7 +663,35 @@ def admin_logout():
 # Admin: Train (upload PDFs, create version)
 # POST /api/admin/train
 # form fields: model_key, version, description (optional), files[]
+# Saves the PDFs and returns 202 {job_id}; extraction, chunking and indexing run in the
+# background and the version is activated only when the job succeeds.
 # ----------------------------
+def activate_trained_version(job):
+    versions = load_versions()
+    # deactivate existing actives for this model; retraining a version replaces its entry
+    versions = [v for v in versions if not (v.get("model") == job.model and v.get("version") == job.version)]
+    for v in versions:
+        if v.get("model") == job.model:
+            v["active"] = False
+
+    new_entry = {
+        "model": job.model,
+        "version": job.version,
+        "description": job.description,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "files": [f["name"] for f in job.files if f["status"] == "done"],
+        "indexed": job.chunks > 0,
+        "active": True
+    }
+    versions.append(new_entry)
+    version_registry.save(versions)
+    forget_version_retriever(job.model, job.version)
+    answer_cache.invalidate(job.model)
+    dlog("Trained new version:", new_entry)
+    warm_up_chat_models(job.model)
+
+train_jobs = TrainJobManager(on_success=activate_trained_version, log=dlog)
+
 @app.route("/api/admin/train", methods=["POST"])
 def admin_train():
     if not session.get("logged_in"):
@@ -306,56 +703,53 @@ def admin_train():
     if not model_key or not version:
         return jsonify({"message": "Missing model or version"}), 400
 
-    # Save PDFs under data/pdfs/<model>/<version>/
-    model_version_dir = os.path.join(PDF_STORE, model_key, version)
-    os.makedirs(model_version_dir, exist_ok=True)
-
     files = request.files.getlist("files")
     if not files:
         return jsonify({"message": "No PDF files uploaded."}), 400
 
+    # Save PDFs under data/pdfs/<model>/<version>/
+    model_version_dir = os.path.join(PDF_STORE, model_key, version)
+    os.makedirs(model_version_dir, exist_ok=True)
+
     saved_files = []
-    combined_text = ""
     for f in files:
         filename = secure_filename(f.filename)
-        save_path = os.path.join(model_version_dir, filename)
-        f.save(save_path)
+        f.save(os.path.join(model_version_dir, filename))
         saved_files.append(filename)
-        # extract text
-        try:
-            text = extract_pdf_text(save_path)
-            combined_text += text + "\n\n"
-        except Exception as e:
-            dlog("pdf extract error:", e)
 
-    # Save context.txt for RAG usage
-    ctx_path = os.path.join(model_version_dir, "context.txt")
-    try:
-        with open(ctx_path, "w", encoding="utf-8") as cf:
-            cf.write(combined_text)
-    except Exception as e:
-        dlog("write context error:", e)
+    job = train_jobs.submit(model_key, version, description, model_version_dir, saved_files)
+    dlog("Queued training job", job.id, model_key, version)
+    return jsonify({"success": True, "job_id": job.id, "message": f"Training {model_key}:{version} queued."}), 202
 
-    # Update versions.json
-    versions = load_versions()
-    # deactivate existing actives for this model
-    for v in versions:
-        if v.get("model") == model_key:
-            v["active"] = False
+# ----------------------------
+# Admin: training jobs
+# GET  /api/admin/train/jobs
+# GET  /api/admin/train/jobs/<job_id>
+# POST /api/admin/train/jobs/<job_id>/cancel
+# ----------------------------
+@app.route("/api/admin/train/jobs", methods=["GET"])
+def admin_train_jobs():
+    if not session.get("logged_in"):
+        return jsonify({"message": "Unauthorized"}), 401
+    return jsonify({"jobs": [j.to_dict() for j in train_jobs.list()]})
 
-    new_entry = {
-        "model": model_key,
-        "version": version,
-        "description": description,
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "files": saved_files,
-        "active": True
-    }
-    versions.append(new_entry)
-    save_versions(versions)
+@app.route("/api/admin/train/jobs/<job_id>", methods=["GET"])
+def admin_train_job(job_id):
+    if not session.get("logged_in"):
+        return jsonify({"message": "Unauthorized"}), 401
+    job = train_jobs.get(job_id)
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+    return jsonify(job.to_dict())
 
-    dlog("Trained new version:", new_entry)
-    return jsonify({"success": True, "message": f"Trained {model_key}:{version}."})
+@app.route("/api/admin/train/jobs/<job_id>/cancel", methods=["POST"])
+def admin_train_job_cancel(job_id):
+    if not session.get("logged_in"):
+        return jsonify({"message": "Unauthorized"}), 401
+    job = train_jobs.cancel(job_id)
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
 
 # ----------------------------
 # Admin: get active version info for a model
@@ -408,8 +802,10 @@ def admin_activate():
         return jsonify({"success": False, "message": "Version not found"}), 404
 
     save_versions(versions)
+    answer_cache.invalidate(model_key)
     dlog("Activated version", model_key, version)
-    return jsonify({"success": True})
+    warmed = warm_up_chat_models(model_key)
+    return jsonify({"success": True, "warming": warmed})
 
 # ----------------------------
 # Admin: delete a version (history or active)
@@ -431,13 +827,16 @@ def admin_delete_version():
     if not entry:
         return jsonify({"success": False, "message": "Version not found"}), 404
 
-    # remove context file
-    ctx_path = os.path.join(PDF_STORE, model_key, version, "context.txt")
-    try:
-        if os.path.exists(ctx_path):
-            os.remove(ctx_path)
-    except Exception as e:
-        dlog("remove context error:", e)
+    # remove context file and version index
+    for artifact in VERSION_ARTIFACTS:
+        ctx_path = os.path.join(PDF_STORE, model_key, version, artifact)
+        try:
+            if os.path.exists(ctx_path):
+                os.remove(ctx_path)
+        except Exception as e:
+            dlog("remove context error:", e)
+
+    forget_version_retriever(model_key, version)
 
     # optionally delete PDFs
     if DELETE_PDFS_ON_DELETE:
@@ -461,6 +860,7 @@ def admin_delete_version():
     # remove entry from versions list
     versions = [v for v in versions if not (v.get("model") == model_key and v.get("version") == version)]
     save_versions(versions)
+    answer_cache.invalidate(model_key)
     dlog("Deleted version", model_key, version)
     return jsonify({"success": True})
 
@@ -486,12 +886,14 @@ def admin_delete_active():
     if not entry:
         return jsonify({"success": False, "message": "Version not found"}), 404
 
-    ctx_path = os.path.join(PDF_STORE, model_key, version, "context.txt")
-    try:
-        if os.path.exists(ctx_path):
-            os.remove(ctx_path)
-    except Exception as e:
-        dlog("remove context error:", e)
+    for artifact in VERSION_ARTIFACTS:
+        ctx_path = os.path.join(PDF_STORE, model_key, version, artifact)
+        try:
+            if os.path.exists(ctx_path):
+                os.remove(ctx_path)
+        except Exception as e:
+            dlog("remove context error:", e)
+    forget_version_retriever(model_key, version)
 
     if DELETE_PDFS_ON_DELETE:
         try:
@@ -512,26 +914,129 @@ def admin_delete_active():
 
     versions = [v for v in versions if not (v.get("model") == model_key and v.get("version") == version)]
     save_versions(versions)
+    answer_cache.invalidate(model_key)
     dlog("Deleted active version", model_key, version)
     return jsonify({"success": True})
 
 # ----------------------------
 # Admin: get all chat logs (protected)
-# GET /api/admin/chat/logs
+# GET /api/admin/chat/logs?cursor=&limit=&from=&to=&model=&feedback=&lang=&q=
+# newest first; pass next_cursor back as cursor for the next page (summary only on the first page)
 # ----------------------------
+def log_filters(args):
+    """chat_store filters from query args; from/to are unix seconds or YYYY-MM-DD (to is inclusive)."""
+    def when(value, end=False):
+        if not value:
+            return None
+        if value.isdigit():
+            return int(value)
+        day = int(time.mktime(time.strptime(value, "%Y-%m-%d")))
+        return day + 86400 if end else day
+
+    return {
+        "since": when(args.get("from")),
+        "until": when(args.get("to"), end=True),
+        "model": args.get("model") if args.get("model") != "all" else None,
+        "feedback": args.get("feedback") if args.get("feedback") != "all" else None,
+        "lang": args.get("lang") if args.get("lang") != "all" else None,
+        "q": (args.get("q") or "").strip() or None,
+    }
+
 @app.route("/api/admin/chat/logs", methods=["GET"])
 def admin_get_logs():
     if not session.get("logged_in"):
         return jsonify({"error": "Unauthorized"}), 401
 
-    if not os.path.exists(CHAT_LOG):
-        return jsonify({"logs": []})
     try:
-        with open(CHAT_LOG, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except Exception:
-        logs = []
-    return jsonify({"logs": logs})
+        filters = log_filters(request.args)
+        cursor = int(request.args["cursor"]) if request.args.get("cursor") else None
+        limit = int(request.args.get("limit", 50))
+    except ValueError:
+        return jsonify({"error": "Invalid filter"}), 400
+    try:
+        logs, next_cursor = chat_store.page(filters, cursor, limit)
+        resp = {"logs": logs, "next_cursor": next_cursor}
+        if cursor is None:
+            resp["summary"] = chat_store.summary(filters)
+    except Exception as e:
+        dlog("read chat logs error:", e)
+        resp = {"logs": [], "next_cursor": None}
+    return jsonify(resp)
+
+# ----------------------------
+# Admin: bulk export, streamed in batches (never the whole log in memory)
+# GET /api/admin/chat/logs/export?format=ndjson|csv (+ the same filters as above)
+# ----------------------------
+EXPORT_FIELDS = ("id", "ts", "user", "lang", "model", "version", "latency_ms", "feedback", "question", "answer")
+
+@app.route("/api/admin/chat/logs/export", methods=["GET"])
+def admin_export_logs():
+    if not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    try:
+        filters = log_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid filter"}), 400
+
+    def rows():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if fmt == "csv":
+            writer.writerow(EXPORT_FIELDS)
+        for entry in chat_store.iter_entries(filters):
+            if fmt == "csv":
+                writer.writerow([entry.get(k) for k in EXPORT_FIELDS])
+            else:
+                buf.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            # send ~64 KB pieces rather than one write per row
+            if buf.tell() > 64 * 1024:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+    return Response(stream_with_context(rows()), mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename=chat_logs.{fmt}",
+        "Cache-Control": "no-cache",
+    })
+
+# ----------------------------
+# Admin: analytics from the precomputed rollups (cost depends on the number of buckets, not log size)
+# GET /api/admin/analytics?grain=hour|day&from=&to=&group_by=model,version,lang,feedback
+#     (+ model / version / lang / feedback filters, exact match; bucket starts are UTC)
+# ----------------------------
+ANALYTICS_DEFAULT_SPAN = {"hour": 48 * 3600, "day": 30 * 86400}
+
+@app.route("/api/admin/analytics", methods=["GET"])
+def admin_analytics():
+    if not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    grain = request.args.get("grain", "day")
+    try:
+        window = log_filters(request.args)
+        since = window["since"] if window["since"] is not None else int(time.time()) - ANALYTICS_DEFAULT_SPAN.get(grain, 0)
+        filters = {k: request.args.get(k) for k in ("model", "version", "lang", "feedback")
+                   if request.args.get(k) not in (None, "", "all")}
+        group_by = [g.strip() for g in request.args.get("group_by", "").split(",") if g.strip()]
+        query = dict(grain=grain, since=since, until=window["until"], filters=filters)
+        resp = {
+            "grain": grain,
+            "from": since,
+            "to": window["until"],
+            "totals": (chat_store.rollup(**query, per_bucket=False) or [{"count": 0}])[0],
+            "series": chat_store.rollup(**query, group_by=group_by),
+            "by_model": chat_store.rollup(**query, group_by=["model"], per_bucket=False),
+            "by_version": chat_store.rollup(**query, group_by=["version"], per_bucket=False),
+            "by_lang": chat_store.rollup(**query, group_by=["lang"], per_bucket=False),
+        }
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(resp)
 
 # ----------------------------
 # Admin: get log details
@@ -541,72 +1046,43 @@ def admin_get_logs():
 def admin_get_log_details(ts):
     if not session.get("logged_in"):
         return jsonify({"error": "Unauthorized"}), 401
-    if not os.path.exists(CHAT_LOG):
-        return jsonify({"error": "No logs found"}), 404
     try:
-        with open(CHAT_LOG, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except Exception:
-        logs = []
-    for entry in logs:
-        if str(entry.get("ts")) == str(ts):
-            return jsonify({"log": entry})
+        entry = chat_store.find_by_ts(ts)
+    except (TypeError, ValueError):
+        entry = None  # a ts that is not a number matches no log, as before the SQLite store
+    if entry:
+        return jsonify({"log": entry})
     return jsonify({"error": "Log not found"}), 404
 
-# ----------------------------
-# Chat feedback endpoint
-# POST /api/chat/feedback {ts, feedback}
-# ----------------------------
 # ----------------------------------------
 # Chat Feedback API
 # POST /api/chat/feedback
-# Body: { "ts": 1234567890, "feedback": "positive" | "negative" | "none" }
+# Body: { "id": 42, "feedback": "positive" | "negative" | "none" }
+# ("ts" is still accepted and targets the latest entry with that timestamp)
 # ----------------------------------------
 @app.route("/api/chat/feedback", methods=["POST"])
 def chat_feedback():
     data = request.get_json(silent=True) or {}
 
+    log_id = data.get("id")
     ts = data.get("ts")
     feedback = data.get("feedback")  # "positive", "negative", "none"
 
-    if ts is None:
-        return jsonify({"error": "ts missing"}), 400
-
-    # Ensure log file exists
-    if not os.path.exists(CHAT_LOG):
-        # Create empty log file automatically
-        with open(CHAT_LOG, "w", encoding="utf-8") as f:
-            json.dump([], f, indent=2, ensure_ascii=False)
-
-    # Load logs
-    try:
-        with open(CHAT_LOG, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except Exception as e:
-        print("❌ Failed to read chat logs:", e)
-        return jsonify({"error": "Failed to read chat logs"}), 500
-
-    updated = False
-
-    # Update the right log entry
-    for entry in logs:
-        if str(entry.get("ts")) == str(ts):
-            # Convert "none" → remove feedback
-            entry["feedback"] = None if feedback == "none" else feedback
-            updated = True
-            break
-
-    if not updated:
-        return jsonify({"error": "Timestamp not found"}), 404
+    if log_id is None and ts is None:
+        return jsonify({"error": "id or ts missing"}), 400
 
-    # Save updates back to file
     try:
-        with open(CHAT_LOG, "w", encoding="utf-8") as f:
-            json.dump(logs, f, indent=2, ensure_ascii=False)
+        # Convert "none" → remove feedback
+        updated = chat_store.update_feedback(None if feedback == "none" else feedback, log_id=log_id, ts=ts)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid id or ts"}), 400
     except Exception as e:
         print("❌ Failed to save feedback:", e)
         return jsonify({"error": "Failed to save"}), 500
 
+    if not updated:
+        return jsonify({"error": "Log not found"}), 404
+
     return jsonify({"success": True})
 
 
@@ -619,11 +1095,6 @@ if not os.path.exists(VERSIONS_PATH):
     with open(VERSIONS_PATH, "w", encoding="utf-8") as f:
         json.dump([], f, indent=2, ensure_ascii=False)
 
-# chat_logs.json (chat history)
-if not os.path.exists(CHAT_LOG):
-    with open(CHAT_LOG, "w", encoding="utf-8") as f:
-        json.dump([], f, indent=2, ensure_ascii=False)
-
 # Ensure PDF directory structure exists
 if not os.path.exists(PDF_STORE):
     os.makedirs(PDF_STORE, exist_ok=True)
@@ -636,6 +1107,33 @@ if not os.path.exists(PDF_STORE):
 def ping():
     return "pong"
 
+# ----------------------------
+# Startup report + optional model warm-up (models otherwise load on first use)
+# ----------------------------
+STARTUP_SECONDS = round(time.perf_counter() - _BOOT_T0, 2)
+STARTUP_RSS_MB = process_rss_mb()
+print(f"⏱️ app.py loaded in {STARTUP_SECONDS}s, RSS {STARTUP_RSS_MB} MB")
+_warming = model_registry.warm_up()
+if "ollama" in WARMUP_MODELS:
+    _warming += warm_up_chat_models()
+if _warming:
+    print("🔥 Warming up models in the background:", ", ".join(_warming))
+
+# ----------------------------
+# Admin: model registry (load state, load time, memory)
+# GET /api/admin/models
+# ----------------------------
+@app.route("/api/admin/models", methods=["GET"])
+def admin_models():
+    if not session.get("logged_in"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify({
+        "startup_seconds": STARTUP_SECONDS,
+        "startup_rss_mb": STARTUP_RSS_MB,
+        "rss_mb": process_rss_mb(),
+        "models": model_registry.stats(),
+    })
+
 # ----------------------------
 # Run
 # ----------------------------
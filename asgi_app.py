@@ -0,0 +1,308 @@
+# asgi_app.py — asyncio serving mode. /api/chat, /api/transcribe(/stream) and /api/chat/feedback run as async
+# handlers (Ollama over non-blocking HTTP, retrieval / translation / SQLite / audio decoding on executor
+# threads); every other route is the Flask app from app.py, served through a WSGI adapter.
+#
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+#
+# Requests and responses are the same as with `python app.py`; benchmarks/bench_concurrency.py compares both.
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import app as backend
+import metrics
+import ollama_client
+from ollama_client import OllamaBusy
+from transcriber import TranscriberBusy, TranscribeTimeout
+
+# threads for the blocking parts of the async handlers (retrieval, translation, SQLite, audio decoding)
+ASGI_EXECUTOR_THREADS = int(os.getenv("ASGI_EXECUTOR_THREADS", "32"))
+# threads serving the Flask routes (admin, training, uploads, ...)
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "8"))
+
+stage = backend.stage
+dlog = backend.dlog
+
+
+def busy(e, body):
+    return JSONResponse(body, status_code=503, headers={"Retry-After": str(e.retry_after)})
+
+
+def endpoint(name):
+    """Route wrapper: metrics label + request timing (as app.py's before/after_request) and the 503 handlers."""
+    def wrap(handler):
+        async def run(request):
+            metrics.current_endpoint.set(name)
+            t0 = time.perf_counter()
+            try:
+                resp = await handler(request)
+            except OllamaBusy as e:
+                resp = busy(e, {"reply": "⚠️ Server is busy, please try again shortly.", "error": str(e)})
+            except TranscriberBusy as e:
+                resp = busy(e, {"error": f"⚠️ {e}. Try again shortly."})
+            if metrics.METRICS_ENABLED:
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - t0, name, request.method, str(resp.status_code))
+            return resp
+        return run
+    return wrap
+
+
+async def request_json(request):
+    try:
+        return json.loads(await request.body() or b"{}")
+    except ValueError:
+        return None
+
+
+async def ollama_generate(prompt, model, turn=None):
+    # async twin of app.ollama_generate: failures become the usual warning reply, a full queue stays a 503
+    try:
+        data = await ollama_client.agenerate(prompt, model=model, context=turn and turn["ollama_context"])
+        if turn is not None and isinstance(data, dict):
+            turn["reply_context"] = data.get("context")
+        return backend.reply_text(data)
+    except OllamaBusy:
+        raise
+    except Exception as e:
+        dlog("Ollama generate error:", e)
+        return "⚠️ Ollama not responding."
+
+
+# ----------------------------
+# Chat
+# ----------------------------
+@endpoint("api_chat")
+async def api_chat(request):
+    t0 = time.perf_counter()
+    data = await request_json(request)
+    if not isinstance(data, dict):
+        return JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+    message = data.get("message", "").strip()
+    lang = data.get("lang", "auto")
+    model = data.get("model", backend.MODEL_NAME)
+    session_id = data.get("session_id")
+
+    if not message:
+        return JSONResponse({"reply": "⚠️ Please enter a message."}, status_code=400)
+    if not backend.valid_session_id(session_id):
+        return JSONResponse({"error": "Invalid session_id"}, status_code=400)
+
+    turn = await asyncio.to_thread(backend.prepare_chat, message, lang, model, None, t0, session_id)
+
+    if data.get("stream"):
+        return await stream_chat(turn)
+
+    reply = turn["cached"]
+    if reply is None:
+        with stage("generate"):
+            reply = await ollama_generate(turn["prompt"], model, turn)
+    return JSONResponse(await asyncio.to_thread(backend.finish_chat, turn, reply, turn["cached"] is None))
+
+
+async def stream_chat(turn):
+    cached = turn["cached"]
+    # take the generation slot before the response starts so a full queue is still a plain 503
+    stream = None
+    if cached is None:
+        try:
+            stream = await ollama_client.agenerate_stream(turn["prompt"], model=turn["model"],
+                                                          context=turn["ollama_context"])
+        except OllamaBusy:
+            raise
+        except Exception as e:
+            dlog("Ollama stream error:", e)
+
+    async def generate():
+        parts = []
+        failed = False
+        with stage("generate"):
+            try:
+                if cached is not None:
+                    parts.append(cached)
+                    yield json.dumps({"token": cached}, ensure_ascii=False) + "\n"
+                elif stream is None:
+                    raise RuntimeError("Ollama not responding")
+                else:
+                    async for chunk in stream:
+                        token = chunk.get("response", "")
+                        if token:
+                            parts.append(token)
+                            yield json.dumps({"token": token}, ensure_ascii=False) + "\n"
+                        if chunk.get("done"):
+                            turn["reply_context"] = chunk.get("context")
+            except Exception as e:
+                dlog("Ollama stream error:", e)
+                failed = True
+                if not parts:
+                    parts.append("⚠️ Ollama not responding.")
+                yield json.dumps({"error": "stream interrupted"}) + "\n"
+            finally:
+                if stream is not None:
+                    await stream.aclose()
+
+        done = {"done": True}
+        done.update(await asyncio.to_thread(backend.finish_chat, turn, "".join(parts), cached is None and not failed))
+        yield json.dumps(done, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ----------------------------
+# Voice
+# ----------------------------
+async def answer_voice(text, lang):
+    turn = await asyncio.to_thread(backend.prepare_chat, text, lang, backend.MODEL_NAME, "gemma2")
+    reply = turn["cached"]
+    if reply is None:
+        with stage("generate"):
+            reply = await ollama_generate(turn["prompt"], backend.MODEL_NAME)
+    return await asyncio.to_thread(backend.finish_chat, turn, reply, turn["cached"] is None, "voice", False)
+
+
+@endpoint("api_transcribe")
+async def api_transcribe(request):
+    form = await request.form()
+    file = form.get("file")
+    if file is None or isinstance(file, str):
+        return JSONResponse({"error": "❌ No audio file uploaded."}, status_code=400)
+    lang = form.get("lang", "auto")
+
+    try:
+        with stage("transcribe"):
+            result = await backend.transcriber.transcribe_async(await file.read(), language="te" if lang == "te" else None)
+        text = result["text"]
+        dlog("transcribe:", result["audio_seconds"], "s audio in", result["inference_seconds"], "s, rtf", result["rtf"])
+        if not text:
+            return JSONResponse({"text": "", "reply": "⚠️ Couldn't understand the audio clearly."})
+        resp = {"text": text, "audio_seconds": result["audio_seconds"], "rtf": result["rtf"]}
+        resp.update(await answer_voice(text, lang))
+        return JSONResponse(resp)
+    except (OllamaBusy, TranscriberBusy):
+        raise
+    except TranscribeTimeout as e:
+        return JSONResponse({"error": f"⚠️ {e}"}, status_code=504)
+    except ValueError as e:
+        return JSONResponse({"error": f"❌ {e}"}, status_code=400)
+    except Exception as e:
+        dlog("transcribe error:", e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@endpoint("api_transcribe_stream")
+async def api_transcribe_stream(request):
+    form = await request.form()
+    lang = form.get("lang", "auto")
+    final = form.get("final") == "1"
+    try:
+        seq = int(form.get("seq", "0"))
+        sid = form.get("session")
+        if sid:
+            sess = backend.voice_sessions.get(sid)
+            if sess is None:
+                return JSONResponse({"error": "❌ Unknown or expired voice session."}, status_code=404)
+        else:
+            sess = backend.voice_sessions.create(language="te" if lang == "te" else None)
+        file = form.get("file")
+        data = await file.read() if file is not None and not isinstance(file, str) else b""
+        # a session feeds its segments in order under its own lock, so it gets a thread for the call
+        with stage("transcribe"):
+            partial = await asyncio.to_thread(sess.feed, data, seq, final)
+        resp = {"session": sess.id, "seq": seq, "partial": partial, "text": sess.text(), "final": final}
+        if not final:
+            return JSONResponse(resp)
+
+        backend.voice_sessions.close(sess.id)
+        if sess.audio_seconds:
+            resp.update(audio_seconds=round(sess.audio_seconds, 2), rtf=round(sess.inference_seconds / sess.audio_seconds, 3))
+        dlog("transcribe stream:", seq + 1, "segments,", resp.get("audio_seconds"), "s audio, rtf", resp.get("rtf"))
+        if not resp["text"]:
+            resp["reply"] = "⚠️ Couldn't understand the audio clearly."
+            return JSONResponse(resp)
+        resp.update(await answer_voice(resp["text"], lang))
+        return JSONResponse(resp)
+    except (OllamaBusy, TranscriberBusy):
+        raise
+    except TranscribeTimeout as e:
+        return JSONResponse({"error": f"⚠️ {e}"}, status_code=504)
+    except ValueError as e:
+        return JSONResponse({"error": f"❌ {e}"}, status_code=400)
+    except Exception as e:
+        dlog("transcribe stream error:", e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# ----------------------------
+# Feedback
+# ----------------------------
+@endpoint("chat_feedback")
+async def chat_feedback(request):
+    data = await request_json(request)
+    if not isinstance(data, dict):
+        data = {}
+    log_id = data.get("id")
+    ts = data.get("ts")
+    feedback = data.get("feedback")
+
+    if log_id is None and ts is None:
+        return JSONResponse({"error": "id or ts missing"}, status_code=400)
+
+    try:
+        updated = await asyncio.to_thread(backend.chat_store.update_feedback,
+                                          None if feedback == "none" else feedback, log_id, ts)
+    except (TypeError, ValueError):
+        return JSONResponse({"error": "Invalid id or ts"}, status_code=400)
+    except Exception as e:
+        print("❌ Failed to save feedback:", e)
+        return JSONResponse({"error": "Failed to save"}, status_code=500)
+
+    if not updated:
+        return JSONResponse({"error": "Log not found"}, status_code=404)
+    return JSONResponse({"success": True})
+
+
+# ----------------------------
+# App
+# ----------------------------
+@asynccontextmanager
+async def lifespan(_app):
+    # asyncio.to_thread() runs on the loop's default executor
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(ASGI_EXECUTOR_THREADS, thread_name_prefix="asgi-worker"))
+    yield
+    await ollama_client.aclose()
+
+
+async_routes = Starlette(
+    routes=[
+        Route("/api/chat", api_chat, methods=["POST"]),
+        Route("/api/transcribe", api_transcribe, methods=["POST"]),
+        Route("/api/transcribe/stream", api_transcribe_stream, methods=["POST"]),
+        Route("/api/chat/feedback", chat_feedback, methods=["POST"]),
+    ],
+    # same policy as CORS(app, supports_credentials=True) on the Flask side
+    middleware=[Middleware(CORSMiddleware, allow_origin_regex=".*", allow_credentials=True,
+                           allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+ASYNC_PATHS = {r.path for r in async_routes.routes}
+
+flask_routes = WSGIMiddleware(backend.app, workers=ASGI_WSGI_THREADS)
+
+
+async def app(scope, receive, send):
+    # the async handlers get their paths (and the lifespan events); everything else goes to Flask
+    if scope["type"] == "lifespan" or scope.get("path") in ASYNC_PATHS:
+        await async_routes(scope, receive, send)
+    else:
+        await flask_routes(scope, receive, send)
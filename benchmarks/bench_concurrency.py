@@ -0,0 +1,216 @@
+# bench_concurrency.py — /api/chat under load: thread-per-request (Flask/WSGI) vs the asyncio mode (asgi_app.py)
+#
+#   python benchmarks/bench_concurrency.py [--delay 2] [--threads 8] [--levels 8,32,128] [--rounds 2] [--stream]
+#
+# Both servers talk to a fake Ollama that answers every generation after --delay seconds, so the numbers show
+# how many chats each serving model keeps in flight, not how fast a real model is. The WSGI side gets a fixed
+# pool of --threads request threads (what a gunicorn / waitress deployment would be configured with).
+# Needs the async extras from requirements.txt (starlette, uvicorn, a2wsgi, aiohttp, python-multipart).
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ----------------------------
+# Fake Ollama: keep-alive HTTP/1.1, fixed latency, plain or streamed (chunked) replies, empty model lists
+# ----------------------------
+async def _fake_ollama_conn(reader, writer, delay):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            if head.startswith(b"GET "):
+                # health probes (/api/ps, /api/tags)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 14\r\n\r\n"
+                             b'{"models": []}')
+                await writer.drain()
+                continue
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            payload = json.loads(await reader.readexactly(length) or b"{}")
+            tokens = ["This ", "is ", "a ", "benchmark ", "reply."]
+            final = {"done": True, "eval_count": len(tokens), "eval_duration": int(delay * 1e9),
+                     "total_duration": int(delay * 1e9)}
+            if not payload.get("stream"):
+                await asyncio.sleep(delay)
+                body = json.dumps(dict(final, response="".join(tokens))).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+                             % len(body) + body)
+                await writer.drain()
+                continue
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for i, token in enumerate(tokens):
+                await asyncio.sleep(delay / len(tokens))
+                chunk = dict(final, response=token) if i == len(tokens) - 1 else {"response": token, "done": False}
+                line = json.dumps(chunk).encode() + b"\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def serve_fake_ollama(port, delay):
+    async def serve():
+        server = await asyncio.start_server(lambda r, w: _fake_ollama_conn(r, w, delay), "127.0.0.1", port, backlog=2048)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(serve())
+
+
+# ----------------------------
+# Thread-per-request WSGI server with a fixed pool
+# ----------------------------
+def serve_wsgi(port, threads):
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import BaseWSGIServer
+    from app import app
+
+    class PooledWSGIServer(BaseWSGIServer):
+        request_queue_size = 2048
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledWSGIServer("127.0.0.1", port, app).serve_forever()
+
+
+# ----------------------------
+# Orchestration
+# ----------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"server exited early (code {proc.returncode})")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    sys.exit(f"nothing listening on port {port} after {timeout}s")
+
+
+def spawn(args, env, cwd):
+    return subprocess.Popen(args, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def load(url, concurrency, total, stream):
+    import aiohttp
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency),
+                                     timeout=aiohttp.ClientTimeout(total=300)) as client:
+        async def one(i):
+            nonlocal errors
+            body = {"message": f"benchmark question {i} {time.time_ns()}", "stream": stream}
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    async with client.post(url, json=body) as res:
+                        content = await res.read()
+                    ok = res.status == 200 and (b'"done": true' in content if stream else b'"reply"' in content)
+                except aiohttp.ClientError:
+                    ok = False
+                latencies.append(time.perf_counter() - t0)
+                errors += not ok
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        wall = time.perf_counter() - t0
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000  # noqa: E731
+    return wall, pick(0.5), pick(0.95), errors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--delay", type=float, default=2.0, help="fake Ollama seconds per generation")
+    ap.add_argument("--threads", type=int, default=8, help="request threads for the WSGI server")
+    ap.add_argument("--levels", default="8,32,128", help="concurrent clients to test")
+    ap.add_argument("--rounds", type=int, default=2, help="requests per client at each level")
+    ap.add_argument("--stream", action="store_true", help="use the NDJSON streaming variant of /api/chat")
+    ap.add_argument("--role", choices=("ollama", "wsgi"), help=argparse.SUPPRESS)
+    ap.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.role == "ollama":
+        return serve_fake_ollama(args.port, args.delay)
+    if args.role == "wsgi":
+        return serve_wsgi(args.port, args.threads)
+
+    levels = [int(x) for x in args.levels.split(",")]
+    me = os.path.abspath(__file__)
+    ollama_port = free_port()
+    env = dict(os.environ,
+               PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               OLLAMA_URL=f"http://127.0.0.1:{ollama_port}/api/generate",
+               # take the app's own generation limiter out of the picture; the serving model is what is measured
+               OLLAMA_MAX_CONCURRENCY="100000", OLLAMA_MAX_QUEUE="100000", OLLAMA_POOL_SIZE=str(max(levels)),
+               ANSWER_CACHE_ENABLED="0", TRANSLATOR_BACKEND="none", ASGI_EXECUTOR_THREADS="64")
+    procs = [spawn([sys.executable, me, "--role", "ollama", "--port", str(ollama_port), "--delay", str(args.delay)],
+                   env, ROOT)]
+    try:
+        wait_for_port(ollama_port, procs[0])
+        servers = {
+            "wsgi": lambda port: [sys.executable, me, "--role", "wsgi", "--port", str(port), "--threads", str(args.threads)],
+            "asgi": lambda port: [sys.executable, "-m", "uvicorn", "asgi_app:app", "--port", str(port),
+                                  "--log-level", "warning", "--no-access-log"],
+        }
+        print(f"fake Ollama delay {args.delay}s, WSGI threads {args.threads}, {args.rounds} requests per client"
+              f"{', streaming' if args.stream else ''}")
+        print(f"{'mode':<6}{'clients':>8}{'requests':>10}{'seconds':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+        for mode, cmd in servers.items():
+            port = free_port()
+            workdir = tempfile.mkdtemp(prefix=f"bench_{mode}_")  # own data/ (chat log DB) per server
+            proc = spawn(cmd(port), env, workdir)
+            procs.append(proc)
+            wait_for_port(port, proc)
+            url = f"http://127.0.0.1:{port}/api/chat"
+            asyncio.run(load(url, 2, 4, args.stream))  # warm-up (imports, first DB writes)
+            for c in levels:
+                total = c * args.rounds
+                wall, p50, p95, errors = asyncio.run(load(url, c, total, args.stream))
+                print(f"{mode:<6}{c:>8}{total:>10}{wall:>9.2f}{total / wall:>8.1f}{p50:>9.0f}{p95:>9.0f}{errors:>8}")
+            proc.terminate()
+            proc.wait()
+    finally:
+        for p in procs:
+            if p.poll() is None:
+                p.terminate()
+
+
+if __name__ == "__main__":
+    main()
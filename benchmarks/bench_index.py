@@ -0,0 +1,82 @@
+# bench_index.py — recall@k / latency / memory of the ANN index types vs the exact flat index
+#
+#   python benchmarks/bench_index.py [--n 100000] [--dim 384] [--queries 500] [--k 5]
+#
+# Uses a synthetic clustered corpus (normalized, like MiniLM embeddings) so no model or PDFs are needed.
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import faiss  # noqa: E402
+import ingest_dataset  # noqa: E402
+from retriever import search_params  # noqa: E402
+
+
+def synthetic_corpus(n, dim, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, n // 500), dim)).astype("float32")
+    x = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    q = x[rng.integers(0, n, n_queries)] + 0.2 * rng.standard_normal((n_queries, dim)).astype("float32")
+    faiss.normalize_L2(x)
+    faiss.normalize_L2(q)
+    return x, q
+
+
+def measure(index, queries, k, params):
+    lat = []
+    ids = np.empty((len(queries), k), dtype="int64")
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        if params is None:
+            _, ids[i] = index.search(queries[i:i + 1], k)
+        else:
+            _, ids[i] = index.search(queries[i:i + 1], k, params=params)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return ids, np.percentile(lat, 50), np.percentile(lat, 99)
+
+
+def recall(ids, truth):
+    k = truth.shape[1]
+    return np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, truth)])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=100_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"corpus n={args.n} dim={args.dim}, {args.queries} queries, k={args.k}")
+    x, q = synthetic_corpus(args.n, args.dim, args.queries)
+
+    # build_index reads its input like the embeddings memmap, in batches
+    built = {}
+    for kind in ("flat", "hnsw", "ivf", "ivfpq"):
+        t0 = time.perf_counter()
+        built[kind] = ingest_dataset.build_index(x, kind)
+        mem_mb = len(faiss.serialize_index(built[kind])) / 2**20
+        print(f"built {kind:<6} in {time.perf_counter() - t0:6.1f}s, {mem_mb:8.1f} MB")
+
+    truth, p50, p99 = measure(built["flat"], q, args.k, None)
+    print()
+    print(f"{'index':<8}{'param':>14}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    print(f"{'flat':<8}{'-':>14}{1.0:>10.3f}{p50:>9.3f}{p99:>9.3f}")
+    sweeps = {
+        "hnsw": [("efSearch", v, dict(ef_search=v)) for v in (16, 32, 64, 128, 256)],
+        "ivf": [("nprobe", v, dict(nprobe=v)) for v in (1, 4, 16, 64)],
+        "ivfpq": [("nprobe", v, dict(nprobe=v)) for v in (1, 4, 16, 64)],
+    }
+    for kind, settings in sweeps.items():
+        for name, value, kw in settings:
+            ids, p50, p99 = measure(built[kind], q, args.k, search_params(built[kind], **kw))
+            print(f"{kind:<8}{f'{name}={value}':>14}{recall(ids, truth):>10.3f}{p50:>9.3f}{p99:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# bench_ingest.py — threaded vs process-pool PDF extraction in ingest_dataset.py
+#
+#   python benchmarks/bench_ingest.py [pdf_dir] [--workers N] [--repeat R]
+#
+# pdf_dir defaults to the repo root (the sample maths PDFs). Both paths must produce identical chunks.
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ingest_dataset  # noqa: E402
+
+
+def run(files, mode, workers, repeat):
+    best, chunks = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        chunks = ingest_dataset.extract_files(files, mode=mode, workers=workers)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, chunks
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pdf_dir", nargs="?", default=root)
+    ap.add_argument("--workers", type=int, default=ingest_dataset.INGEST_WORKERS)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    files = sorted(os.path.join(r, f) for r, _, fs in os.walk(args.pdf_dir) for f in fs if f.lower().endswith(".pdf"))
+    if not files:
+        sys.exit(f"no PDFs under {args.pdf_dir}")
+    print(f"{len(files)} PDFs, workers={args.workers}, best of {args.repeat}")
+
+    t_thread, c_thread = run(files, "thread", args.workers, args.repeat)
+    t_proc, c_proc = run(files, "process", args.workers, args.repeat)
+
+    n = sum(len(c) for c in c_thread)
+    print(f"{'mode':<10}{'seconds':>10}{'chunks':>10}")
+    print(f"{'thread':<10}{t_thread:>10.2f}{n:>10}")
+    print(f"{'process':<10}{t_proc:>10.2f}{sum(len(c) for c in c_proc):>10}")
+    print(f"speedup: {t_thread / t_proc:.2f}x")
+    if c_thread != c_proc:
+        print("WARNING: chunk output differs between modes")
+
+
+if __name__ == "__main__":
+    main()
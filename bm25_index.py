@@ -0,0 +1,120 @@
+# bm25_index.py — lexical (BM25) inverted index over the chunk store, fused with FAISS hits in retriever.py
+#
+# <prefix>.vocab.json   list of terms; position = term id
+# <prefix>.ptr.npy      int64 (V+1,): postings of term t are docs[ptr[t]:ptr[t+1]]
+# <prefix>.docs.npy     int32 (nnz,): chunk ids, ascending within a term
+# <prefix>.tf.npy       uint16 (nnz,): term frequency in that chunk
+# <prefix>.doclen.npy   int32 (n,): tokens per chunk id, 0 = removed / empty
+#
+# Exact scheme names, acronyms and numbers are what MiniLM embeddings tend to blur, so tokens keep
+# digits and are only lowercased (no stemming).
+import os
+import re
+import json
+from array import array
+
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+SUFFIXES = (".vocab.json", ".ptr.npy", ".docs.npy", ".tf.npy", ".doclen.npy")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# very common words only bloat postings; BM25 idf would give them ~0 weight anyway
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+""".split())
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def index_files(prefix):
+    return [prefix + s for s in SUFFIXES]
+
+
+def index_exists(prefix):
+    return all(os.path.exists(p) for p in index_files(prefix))
+
+
+def build_bm25(prefix, docs):
+    """Write an index for `docs`, an iterable of (chunk_id, text). Returns the number of terms."""
+    vocab = {}
+    term_ids, doc_ids, tfs = array("i"), array("i"), array("H")
+    lengths = {}
+    for cid, text in docs:
+        counts = {}
+        for t in tokenize(text):
+            counts[t] = counts.get(t, 0) + 1
+        lengths[cid] = sum(counts.values())
+        for t, c in counts.items():
+            term_ids.append(vocab.setdefault(t, len(vocab)))
+            doc_ids.append(cid)
+            tfs.append(min(c, 65535))
+
+    term_ids = np.frombuffer(term_ids, dtype="int32") if term_ids else np.zeros(0, dtype="int32")
+    order = np.argsort(term_ids, kind="stable")  # docs were added in id order, so each list stays sorted
+    ptr = np.zeros(len(vocab) + 1, dtype="int64")
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=ptr[1:])
+    doclen = np.zeros(max(lengths, default=-1) + 1, dtype="int32")
+    for cid, n in lengths.items():
+        doclen[cid] = n
+
+    arrays = {
+        ".ptr.npy": ptr,
+        ".docs.npy": np.frombuffer(doc_ids, dtype="int32")[order] if doc_ids else np.zeros(0, dtype="int32"),
+        ".tf.npy": np.frombuffer(tfs, dtype="uint16")[order] if tfs else np.zeros(0, dtype="uint16"),
+        ".doclen.npy": doclen,
+    }
+    for name, arr in arrays.items():
+        tmp = prefix + ".tmp" + name
+        np.save(tmp, arr)
+        os.replace(tmp, prefix + name)
+    with open(prefix + ".vocab.json.tmp", "w", encoding="utf-8") as f:
+        json.dump(sorted(vocab, key=vocab.get), f, ensure_ascii=False)
+    os.replace(prefix + ".vocab.json.tmp", prefix + ".vocab.json")
+    return len(vocab)
+
+
+class BM25Index:
+    """Read side. Postings are memory-mapped; per-chunk length norms are precomputed at load."""
+
+    def __init__(self, prefix, k1=BM25_K1, b=BM25_B):
+        with open(prefix + ".vocab.json", "r", encoding="utf-8") as f:
+            self.vocab = {t: i for i, t in enumerate(json.load(f))}
+        self.ptr = np.load(prefix + ".ptr.npy")
+        self.docs = np.load(prefix + ".docs.npy", mmap_mode="r")
+        self.tf = np.load(prefix + ".tf.npy", mmap_mode="r")
+        doclen = np.load(prefix + ".doclen.npy")
+        live = doclen > 0
+        self.n_docs = int(live.sum())
+        avgdl = doclen[live].mean() if self.n_docs else 1.0
+        self.k1 = k1
+        # k1 * (1 - b + b * dl / avgdl), the tf saturation term of each chunk
+        self.norm = (k1 * (1 - b + b * doclen / avgdl)).astype("float32")
+
+    def search(self, query, k):
+        """Top-k (chunk_id, score) pairs by BM25, best first."""
+        ids, weights = [], []
+        for t in set(tokenize(query)):
+            tid = self.vocab.get(t)
+            if tid is None:
+                continue
+            start, end = self.ptr[tid], self.ptr[tid + 1]
+            docs = np.asarray(self.docs[start:end])
+            tf = np.asarray(self.tf[start:end], dtype="float32")
+            df = end - start
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            ids.append(docs)
+            weights.append(idf * tf * (self.k1 + 1) / (tf + self.norm[docs]))
+        if not ids:
+            return []
+        scores = np.bincount(np.concatenate(ids), weights=np.concatenate(weights))
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
@@ -0,0 +1,370 @@
+# chat_store.py — append-only chat log storage (SQLite) with id/ts indexes and analytics rollups
+import os
+import json
+import sqlite3
+import threading
+
+# columns stored natively; anything else on an entry is kept in `extra` (JSON)
+COLUMNS = ("ts", "user", "question", "answer", "model", "feedback", "lang", "version", "latency_ms")
+# added after the first release; _migrate_schema() adds them to older databases
+ADDED_COLUMNS = (("lang", "TEXT"), ("version", "TEXT"), ("latency_ms", "INTEGER"))
+INSERT_SQL = "INSERT INTO chat_logs (%s, extra) VALUES (%s)" % (", ".join(COLUMNS), ", ".join("?" * (len(COLUMNS) + 1)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_logs (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts       INTEGER NOT NULL,
+    user     TEXT,
+    question TEXT,
+    answer   TEXT,
+    model    TEXT,
+    feedback TEXT,
+    extra    TEXT,
+    lang     TEXT,
+    version  TEXT,
+    latency_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_chat_logs_ts ON chat_logs(ts);
+"""
+
+# filter columns for the admin log browser; each index ends in id so keyset pagination stays indexed
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_chat_logs_model ON chat_logs(model, id);
+CREATE INDEX IF NOT EXISTS idx_chat_logs_feedback ON chat_logs(feedback, id);
+CREATE INDEX IF NOT EXISTS idx_chat_logs_lang ON chat_logs(lang, id);
+"""
+
+# full-text search over question/answer (external content: the text is not stored twice)
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_logs_fts USING fts5(question, answer, content='chat_logs', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS chat_logs_fts_ai AFTER INSERT ON chat_logs BEGIN
+    INSERT INTO chat_logs_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS chat_logs_fts_ad AFTER DELETE ON chat_logs BEGIN
+    INSERT INTO chat_logs_fts(chat_logs_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS chat_logs_fts_au AFTER UPDATE OF question, answer ON chat_logs BEGIN
+    INSERT INTO chat_logs_fts(chat_logs_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+    INSERT INTO chat_logs_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+END;
+"""
+
+# per hour / per day counters for the admin analytics view, one row per
+# (bucket, model, version, lang, feedback); kept current by append() and update_feedback()
+# so dashboard queries scan buckets, never the log itself. '' stands for "not set".
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_rollups (
+    grain       TEXT NOT NULL,
+    bucket      INTEGER NOT NULL,
+    model       TEXT NOT NULL,
+    version     TEXT NOT NULL,
+    lang        TEXT NOT NULL,
+    feedback    TEXT NOT NULL,
+    n           INTEGER NOT NULL DEFAULT 0,
+    latency_n   INTEGER NOT NULL DEFAULT 0,
+    latency_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (grain, bucket, model, version, lang, feedback)
+) WITHOUT ROWID;
+"""
+
+GRAINS = {"hour": 3600, "day": 86400}
+ROLLUP_DIMS = ("model", "version", "lang", "feedback")
+
+PAGE_SIZE_MAX = 500
+
+
+class ChatLogStore:
+    def __init__(self, db_path, legacy_json_path=None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        # WAL keeps appends cheap and lets readers run alongside a writer
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate_schema()
+        self.fts = self._setup_fts()
+        self._setup_rollups()
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self.migrate_json(legacy_json_path)
+
+    def _migrate_schema(self):
+        # databases created before these columns existed
+        cols = {r["name"] for r in self._conn.execute("PRAGMA table_info(chat_logs)")}
+        for name, kind in ADDED_COLUMNS:
+            if name not in cols:
+                self._conn.execute(f"ALTER TABLE chat_logs ADD COLUMN {name} {kind}")
+        self._conn.executescript(INDEXES)
+
+    def _setup_fts(self):
+        exists = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chat_logs_fts'").fetchone()
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            # sqlite built without FTS5: search falls back to LIKE scans
+            print("chat log search: FTS5 unavailable,", e)
+            return False
+        if not exists:
+            with self._conn:
+                self._conn.execute("INSERT INTO chat_logs_fts(chat_logs_fts) VALUES ('rebuild')")
+        return True
+
+    def _setup_rollups(self):
+        exists = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chat_rollups'").fetchone()
+        self._conn.executescript(ROLLUP_SCHEMA)
+        if not exists:
+            # first start with rollups: one pass over the existing log, incremental from then on
+            fb = "CASE WHEN feedback IN ('positive', 'negative') THEN feedback ELSE '' END"
+            with self._conn:
+                for grain, size in GRAINS.items():
+                    self._conn.execute(
+                        "INSERT INTO chat_rollups SELECT ?, ts - ts % ?, COALESCE(model, ''), COALESCE(version, ''), "
+                        f"COALESCE(lang, ''), {fb}, COUNT(*), COUNT(latency_ms), COALESCE(SUM(latency_ms), 0) "
+                        f"FROM chat_logs GROUP BY 2, 3, 4, 5, 6", (grain, size))
+
+    # ----------------------------
+    # Row <-> dict
+    # ----------------------------
+    @staticmethod
+    def _to_row(entry):
+        extra = {k: v for k, v in entry.items() if k not in COLUMNS and k != "id"}
+        # logs written by the old node server used "reply" instead of "answer"
+        answer = entry.get("answer", extra.pop("reply", None))
+        row = dict(entry, ts=int(entry.get("ts") or 0), answer=answer)
+        return tuple(row.get(k) for k in COLUMNS) + (json.dumps(extra, ensure_ascii=False) if extra else None,)
+
+    @staticmethod
+    def _to_entry(row):
+        entry = {k: row[k] for k in ("id",) + COLUMNS}
+        if row["extra"]:
+            try:
+                entry.update(json.loads(row["extra"]))
+            except ValueError:
+                pass
+        return entry
+
+    # ----------------------------
+    # One-time migration from the old chat_logs.json array
+    # ----------------------------
+    def migrate_json(self, path):
+        # claim the file first: with several workers starting together only the one whose rename succeeds
+        # imports, the others find it gone
+        claimed = path + ".migrating"
+        try:
+            os.replace(path, claimed)
+        except OSError:
+            return 0
+        try:
+            with open(claimed, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # accept both a bare list and the {"seq": n, "logs": [...]} shape
+            logs = data.get("logs", []) if isinstance(data, dict) else data
+            rows = [self._to_row(e) for e in logs if isinstance(e, dict)]
+            with self._lock, self._conn:
+                self._conn.executemany(INSERT_SQL, rows)
+                for row in rows:
+                    self._bump(dict(zip(COLUMNS, row)), 1)
+        except Exception as e:
+            # nothing was imported (one transaction): put the file back for the next start
+            print("chat log migration: cannot import", path, e)
+            os.replace(claimed, path)
+            return 0
+        # a *.migrating file left behind means a worker died mid-import; it is left for a look rather than
+        # risking a second import
+        os.replace(claimed, path + ".migrated")
+        print(f"chat log migration: imported {len(rows)} entries from {path}")
+        return len(rows)
+
+    # ----------------------------
+    # Rollups
+    # ----------------------------
+    def _bump(self, row, delta):
+        """Add `delta` (+1 / -1) for one log row to its hour and day buckets; call inside the write transaction."""
+        fb = row.get("feedback") if row.get("feedback") in ("positive", "negative") else ""
+        dims = tuple(row.get(k) or "" for k in ("model", "version", "lang")) + (fb,)
+        latency = row.get("latency_ms")
+        lat_n, lat_sum = (delta, delta * int(latency)) if latency is not None else (0, 0)
+        ts = int(row.get("ts") or 0)
+        for grain, size in GRAINS.items():
+            self._conn.execute(
+                "INSERT INTO chat_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (grain, bucket, model, version, lang, feedback) DO UPDATE SET n = n + excluded.n, latency_n = latency_n + excluded.latency_n, "
+                "latency_sum = latency_sum + excluded.latency_sum",
+                (grain, ts - ts % size) + dims + (delta, lat_n, lat_sum),
+            )
+
+    # ----------------------------
+    # Writes
+    # ----------------------------
+    def append(self, entry):
+        row = self._to_row(entry)
+        with self._lock, self._conn:
+            cur = self._conn.execute(INSERT_SQL, row)
+            self._bump(dict(zip(COLUMNS, row)), 1)
+            return cur.lastrowid
+
+    def update_feedback(self, feedback, log_id=None, ts=None):
+        """Set feedback on the entry with `log_id` (or the latest one at `ts`). Returns True if found."""
+        with self._lock, self._conn:
+            if log_id is not None:
+                old = self._conn.execute("SELECT * FROM chat_logs WHERE id = ?", (int(log_id),)).fetchone()
+            else:
+                old = self._conn.execute(
+                    "SELECT * FROM chat_logs WHERE ts = ? ORDER BY id DESC LIMIT 1", (int(ts),)).fetchone()
+            if old is None:
+                return False
+            self._conn.execute("UPDATE chat_logs SET feedback = ? WHERE id = ?", (feedback, old["id"]))
+            # move the entry from its old feedback bucket to the new one
+            self._bump(dict(old), -1)
+            self._bump(dict(old, feedback=feedback), 1)
+            return True
+
+    # ----------------------------
+    # Reads
+    # ----------------------------
+    def get(self, log_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM chat_logs WHERE id = ?", (int(log_id),)).fetchone()
+        return self._to_entry(row) if row else None
+
+    def find_by_ts(self, ts):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM chat_logs WHERE ts = ? ORDER BY id DESC LIMIT 1", (int(ts),)
+            ).fetchone()
+        return self._to_entry(row) if row else None
+
+    def all(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM chat_logs ORDER BY id").fetchall()
+        return [self._to_entry(r) for r in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chat_logs").fetchone()[0]
+
+    # ----------------------------
+    # Filtered reads (admin log browser)
+    # filters: since / until (unix ts, until exclusive), model (prefix), feedback ("none" = unset),
+    #          lang, q (free text over question + answer)
+    # ----------------------------
+    def _where(self, filters):
+        clauses, params = [], []
+        if filters.get("since") is not None:
+            clauses.append("ts >= ?")
+            params.append(int(filters["since"]))
+        if filters.get("until") is not None:
+            clauses.append("ts < ?")
+            params.append(int(filters["until"]))
+        if filters.get("model"):
+            # "gemma2" matches "gemma2:2b"; the range keeps the (model, id) index usable
+            clauses.append("model >= ? AND model < ?")
+            params += [filters["model"], filters["model"] + "\uffff"]
+        if filters.get("feedback"):
+            if filters["feedback"] == "none":
+                clauses.append("(feedback IS NULL OR feedback = '' OR feedback = 'none')")
+            else:
+                clauses.append("feedback = ?")
+                params.append(filters["feedback"])
+        if filters.get("lang"):
+            clauses.append("lang = ?")
+            params.append(filters["lang"])
+        if filters.get("q") and filters["q"].split():
+            if self.fts:
+                # each word as a quoted term: no FTS syntax errors from user input, all words must match
+                terms = " ".join('"' + w.replace('"', '""') + '"' for w in filters["q"].split())
+                clauses.append("id IN (SELECT rowid FROM chat_logs_fts WHERE chat_logs_fts MATCH ?)")
+                params.append(terms)
+            else:
+                clauses.append("(question LIKE ? OR answer LIKE ?)")
+                params += ["%" + filters["q"] + "%"] * 2
+        return clauses, params
+
+    def page(self, filters=None, cursor=None, limit=50):
+        """Newest first. `cursor` is the last id of the previous page; returns (entries, next_cursor or None)."""
+        clauses, params = self._where(filters or {})
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(int(cursor))
+        limit = max(1, min(int(limit), PAGE_SIZE_MAX))
+        sql = "SELECT * FROM chat_logs" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit + 1]).fetchall()
+        more = len(rows) > limit
+        entries = [self._to_entry(r) for r in rows[:limit]]
+        return entries, (entries[-1]["id"] if more else None)
+
+    def summary(self, filters=None):
+        """Totals per feedback value for the filtered set (the dashboard's stat cards)."""
+        clauses, params = self._where(filters or {})
+        sql = ("SELECT COUNT(*) AS total, "
+               "SUM(feedback = 'positive') AS positive, SUM(feedback = 'negative') AS negative, "
+               "SUM(feedback IS NULL OR feedback = '' OR feedback = 'none') AS none FROM chat_logs")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        return {k: row[k] or 0 for k in ("total", "positive", "negative", "none")}
+
+    def rollup(self, grain="day", since=None, until=None, group_by=(), per_bucket=True, filters=None):
+        """Aggregates from chat_rollups: one dict per (bucket, *group_by) with count, feedback split and latency.
+
+        since / until are unix seconds (until exclusive) and are matched against bucket starts;
+        filters may pin model / version / lang / feedback ("none" = unset).
+        """
+        if grain not in GRAINS:
+            raise ValueError(f"grain must be one of {', '.join(GRAINS)}")
+        group_by = [g for g in group_by if g]
+        if any(g not in ROLLUP_DIMS for g in group_by):
+            raise ValueError(f"group_by must be a subset of {', '.join(ROLLUP_DIMS)}")
+        clauses, params = ["grain = ?"], [grain]
+        if since is not None:
+            clauses.append("bucket >= ?")
+            params.append(int(since) - int(since) % GRAINS[grain])
+        if until is not None:
+            clauses.append("bucket < ?")
+            params.append(int(until))
+        for dim in ROLLUP_DIMS:
+            value = (filters or {}).get(dim)
+            if value:
+                clauses.append(f"{dim} = ?")
+                params.append("" if value == "none" else value)
+        keys = (["bucket"] if per_bucket else []) + group_by
+        sql = ("SELECT " + "".join(k + ", " for k in keys) +
+               "SUM(n) AS count, SUM(CASE WHEN feedback = 'positive' THEN n ELSE 0 END) AS positive, "
+               "SUM(CASE WHEN feedback = 'negative' THEN n ELSE 0 END) AS negative, "
+               "SUM(latency_n) AS latency_n, SUM(latency_sum) AS latency_sum "
+               "FROM chat_rollups WHERE " + " AND ".join(clauses))
+        if keys:
+            sql += " GROUP BY " + ", ".join(keys) + " ORDER BY " + ", ".join(keys)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        out = []
+        for r in rows:
+            if not r["count"]:
+                continue
+            item = {k: r[k] for k in keys}
+            rated = r["positive"] + r["negative"]
+            item.update(
+                count=r["count"], positive=r["positive"], negative=r["negative"],
+                none=r["count"] - rated,
+                positive_ratio=round(r["positive"] / rated, 3) if rated else None,
+                avg_latency_ms=round(r["latency_sum"] / r["latency_n"]) if r["latency_n"] else None,
+            )
+            out.append(item)
+        return out
+
+    def iter_entries(self, filters=None, batch=1000):
+        """Oldest first, `batch` rows per query; the lock is never held while the caller consumes rows."""
+        clauses, params = self._where(filters or {})
+        last = 0
+        while True:
+            sql = "SELECT * FROM chat_logs WHERE " + " AND ".join(clauses + ["id > ?"]) + " ORDER BY id LIMIT ?"
+            with self._lock:
+                rows = self._conn.execute(sql, params + [last, batch]).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield self._to_entry(r)
+            last = rows[-1]["id"]
@@ -0,0 +1,150 @@
+# chunk_store.py — compact chunk text store: one UTF-8 blob + id-indexed arrays, read through mmap
+#
+# <prefix>.bin            chunk text, UTF-8, each chunk stored once (no overlap copy)
+# <prefix>.offsets.npy    int64 (n, 2): byte start, byte length per chunk id
+# <prefix>.sources.npy    int32 (n,): index into <prefix>.sources.json, -1 = removed
+# <prefix>.prev.npy       int64 (n,): id of the preceding chunk in the same document, -1 = none
+# <prefix>.sources.json   list of source file names
+#
+# ingest_dataset.chunk_text() embeds each chunk together with its predecessor; get() rebuilds that
+# text from the two stored pieces instead of storing it twice.
+import os
+import json
+import mmap
+
+import numpy as np
+
+SUFFIXES = (".bin", ".offsets.npy", ".sources.npy", ".prev.npy", ".sources.json")
+
+
+def store_files(prefix):
+    return [prefix + s for s in SUFFIXES]
+
+
+def store_exists(prefix):
+    return all(os.path.exists(p) for p in store_files(prefix))
+
+
+class ChunkStore:
+    """Read side. Arrays are small and loaded whole; text is sliced straight out of the mapped blob."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.offsets = np.load(prefix + ".offsets.npy")
+        self.source_ids = np.load(prefix + ".sources.npy")
+        self.prev = np.load(prefix + ".prev.npy")
+        with open(prefix + ".sources.json", "r", encoding="utf-8") as f:
+            self.sources = json.load(f)
+        self._file = open(prefix + ".bin", "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b"")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _text(self, cid):
+        start, length = self.offsets[cid]
+        # decodes directly from the mapped pages; no intermediate bytes copy
+        return str(self._view[start:start + length], "utf-8")
+
+    def base_text(self, cid):
+        """The chunk's own text, without its predecessor."""
+        return self._text(cid)
+
+    def get(self, cid):
+        """{"source", "text"} for a chunk id, or None if it does not exist / was removed."""
+        if cid < 0 or cid >= len(self.offsets) or self.source_ids[cid] < 0:
+            return None
+        text = self._text(cid)
+        prev = self.prev[cid]
+        if prev >= 0:
+            text = self._text(prev) + " " + text
+        return {"source": self.sources[self.source_ids[cid]], "text": text}
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+class ChunkStoreWriter:
+    """Write side. Files are staged under "<prefix>.tmp" and swapped in by commit() (close() does it by default);
+    append=True extends an existing store (text is appended in place, arrays rewritten)."""
+
+    def __init__(self, prefix, append=False):
+        self.prefix = prefix
+        self.staging = prefix + ".tmp"
+        self.append = append and store_exists(prefix)
+        if self.append:
+            self.offsets = np.load(prefix + ".offsets.npy")
+            self.source_ids = np.load(prefix + ".sources.npy")
+            self.prev = np.load(prefix + ".prev.npy")
+            with open(prefix + ".sources.json", "r", encoding="utf-8") as f:
+                self.sources = json.load(f)
+            self.n = len(self.offsets)
+            self._blob = open(prefix + ".bin", "ab")
+        else:
+            self.offsets = np.zeros((1024, 2), dtype="int64")
+            self.source_ids = np.full(1024, -1, dtype="int32")
+            self.prev = np.full(1024, -1, dtype="int64")
+            self.sources = []
+            self.n = 0
+            self._blob = open(self.staging + ".bin", "wb")
+        self._pos = self._blob.seek(0, os.SEEK_END)
+        self._source_ix = {s: i for i, s in enumerate(self.sources)}
+
+    def _grow(self, n):
+        if n <= len(self.offsets):
+            return
+        size = max(n, 2 * len(self.offsets))
+        self.offsets = np.concatenate([self.offsets, np.zeros((size - len(self.offsets), 2), dtype="int64")])
+        self.source_ids = np.concatenate([self.source_ids, np.full(size - len(self.source_ids), -1, dtype="int32")])
+        self.prev = np.concatenate([self.prev, np.full(size - len(self.prev), -1, dtype="int64")])
+
+    def put(self, cid, text, source, prev=-1):
+        self._grow(cid + 1)
+        data = text.encode("utf-8")
+        self._blob.write(data)
+        self.offsets[cid] = (self._pos, len(data))
+        self._pos += len(data)
+        if source not in self._source_ix:
+            self._source_ix[source] = len(self.sources)
+            self.sources.append(source)
+        self.source_ids[cid] = self._source_ix[source]
+        self.prev[cid] = prev
+        self.n = max(self.n, cid + 1)
+
+    def set_prev(self, cid, prev):
+        self.prev[cid] = prev
+
+    def remove(self, cid):
+        # the text stays in the blob until the next full rebuild
+        if cid < self.n:
+            self.source_ids[cid] = -1
+            self.prev[cid] = -1
+
+    def abort(self):
+        """Drop a store that will not be completed (staged files removed; an appended store keeps its old arrays)."""
+        self._blob.close()
+        for path in store_files(self.staging):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self, commit=True):
+        """Finish writing. commit=False keeps the files staged: a fresh store can then be read as
+        ChunkStore(writer.staging) while the live one stays untouched until commit()."""
+        self._blob.close()
+        for name, arr in ((".offsets.npy", self.offsets), (".sources.npy", self.source_ids), (".prev.npy", self.prev)):
+            np.save(self.staging + name, arr[:self.n])
+        with open(self.staging + ".sources.json", "w", encoding="utf-8") as f:
+            json.dump(self.sources, f, ensure_ascii=False)
+        if commit:
+            self.commit()
+
+    def commit(self):
+        for path, live in zip(store_files(self.staging), store_files(self.prefix)):
+            # an appended store has no staged blob: its text went straight into the live one
+            if os.path.exists(path):
+                os.replace(path, live)
@@ -0,0 +1,234 @@
+# coalesce.py — single-flight: identical concurrent calls share one upstream call (plain result or stream)
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """Chunks of one upstream stream, kept so a subscriber that joins late replays from the start."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.error = None
+
+    def push(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def subscribe(self):
+        i = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: i < len(self.chunks) or self.done)
+                batch = self.chunks[i:]
+                i = len(self.chunks)
+                if not batch:
+                    if self.error is not None:
+                        raise self.error
+                    return
+            yield from batch
+
+
+class SingleFlight:
+    """Thread flavour (Flask handlers). Keys must be hashable; results are shared, so treat them as read-only."""
+
+    def __init__(self, on_coalesced=None):
+        self.on_coalesced = on_coalesced  # called with "call" / "stream" each time a caller joins
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        # metrics
+        self.calls = 0
+        self.streams = 0
+        self.coalesced_calls = 0
+        self.coalesced_streams = 0
+
+    def _joined(self, kind):
+        if self.on_coalesced:
+            self.on_coalesced(kind)
+
+    def do(self, key, fn):
+        """Return fn(), or the result of the identical call already in flight (its exception is re-raised)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced_calls += 1
+        if not leader:
+            self._joined("call")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stream(self, key, start):
+        """Iterator over the chunks of `start()` (an iterator), shared with identical streams in flight.
+
+        The first caller runs start() itself, so its errors (e.g. a full queue) surface right here; a
+        background thread then drains the upstream so one slow or vanished client never stalls the rest.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._streams[key] = _Broadcast()
+                self.streams += 1
+            else:
+                self.coalesced_streams += 1
+        if not leader:
+            self._joined("stream")
+            return broadcast.subscribe()
+        try:
+            upstream = start()
+        except BaseException as e:
+            self._end_stream(key, broadcast, e)
+            raise
+        threading.Thread(target=self._pump, args=(key, broadcast, upstream), name="coalesce-pump", daemon=True).start()
+        return broadcast.subscribe()
+
+    def _pump(self, key, broadcast, upstream):
+        error = None
+        try:
+            for chunk in upstream:
+                broadcast.push(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(upstream, "close", None)
+            if close:
+                close()
+            self._end_stream(key, broadcast, error)
+
+    def _end_stream(self, key, broadcast, error):
+        # callers arriving from now on start a fresh upstream
+        with self._lock:
+            self._streams.pop(key, None)
+        broadcast.finish(error)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "streams_in_flight": len(self._streams),
+                "calls": self.calls,
+                "coalesced_calls": self.coalesced_calls,
+                "streams": self.streams,
+                "coalesced_streams": self.coalesced_streams,
+            }
+
+
+# ----------------------------
+# asyncio flavour (asgi_app.py); only used from the event loop thread
+# ----------------------------
+class _AsyncBroadcast:
+    def __init__(self):
+        self.cond = asyncio.Condition()
+        self.chunks = []
+        self.done = False
+        self.error = None
+
+    async def push(self, chunk):
+        async with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    async def finish(self, error=None):
+        async with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    async def subscribe(self):
+        i = 0
+        while True:
+            async with self.cond:
+                await self.cond.wait_for(lambda: i < len(self.chunks) or self.done)
+                batch = self.chunks[i:]
+                i = len(self.chunks)
+                if not batch:
+                    if self.error is not None:
+                        raise self.error
+                    return
+            for chunk in batch:
+                yield chunk
+
+
+class AsyncSingleFlight(SingleFlight):
+    """Same contract with coroutines: `await do(key, coro_fn)`, `await stream(key, start)` -> async iterator."""
+
+    def __init__(self, on_coalesced=None):
+        super().__init__(on_coalesced)
+        self._tasks = set()
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            # a task of its own: a caller that goes away (client disconnect) does not cancel it for the others
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: (self._calls.pop(key, None), t.cancelled() or t.exception()))
+            self.calls += 1
+        else:
+            self.coalesced_calls += 1
+            self._joined("call")
+        return await asyncio.shield(task)
+
+    async def stream(self, key, start):
+        broadcast = self._streams.get(key)
+        if broadcast is not None:
+            self.coalesced_streams += 1
+            self._joined("stream")
+            return broadcast.subscribe()
+        broadcast = self._streams[key] = _AsyncBroadcast()
+        self.streams += 1
+        try:
+            upstream = await start()
+        except BaseException as e:
+            self._streams.pop(key, None)
+            await broadcast.finish(e)
+            raise
+        task = asyncio.ensure_future(self._apump(key, broadcast, upstream))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return broadcast.subscribe()
+
+    async def _apump(self, key, broadcast, upstream):
+        error = None
+        try:
+            async for chunk in upstream:
+                await broadcast.push(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            await upstream.aclose()
+            self._streams.pop(key, None)
+            await broadcast.finish(error)
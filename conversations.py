@@ -0,0 +1,222 @@
+# conversations.py — per-session chat history for /api/chat: a token-budgeted window of recent turns, older turns
+# rolled into a running summary, and Ollama's `context` token array kept so a follow-up skips re-encoding the prefix
+import os
+import time
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from retriever import CHARS_PER_TOKEN
+
+# ----------------------------
+# Config
+# ----------------------------
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "800"))  # recent turns kept word for word
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "250"))  # running summary of everything older
+# a follow-up continues from Ollama's context array until it holds this many tokens, then the prompt is rebuilt
+# from summary + window (keep it under the model's num_ctx)
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "3072"))
+CHAT_SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", "1800"))  # idle seconds before a session is dropped
+CHAT_SESSIONS_MAX_MB = float(os.getenv("CHAT_SESSIONS_MAX_MB", "64"))  # least recently used go first beyond this
+
+SUMMARY_PROMPT = ("Summarize this conversation between a user and an assistant in at most {words} words. "
+                  "Keep names, numbers and open questions.\n\n{summary}{turns}\n\nSummary:")
+
+
+def tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def format_turns(turns):
+    return "\n".join(f"User: {q}\nAssistant: {a}" for q, a in turns)
+
+
+class Conversation:
+    def __init__(self, sid):
+        self.id = sid
+        self.turns = []  # (question, answer) in English, oldest first
+        self.folding = []  # turns pushed out of the window, on their way into the summary
+        self.summary = ""
+        self.context = None  # Ollama token array after the last turn (array('l'): a quarter of a list's memory)
+        self.context_model = None
+        self.created = self.last_used = time.time()
+        self.lock = threading.Lock()
+        self.size = 0  # nbytes() as last counted in the store's running total
+
+    def history(self):
+        """Summary + turns not yet summarized, as prompt text ("" for a new session)."""
+        with self.lock:
+            parts = [f"Summary of earlier conversation: {self.summary}"] if self.summary else []
+            if self.folding or self.turns:
+                parts.append(format_turns(self.folding + self.turns))
+            return "\n".join(parts)
+
+    def reusable_context(self, model):
+        """Ollama context to continue from, or None when the prompt has to carry the history itself."""
+        with self.lock:
+            if self.context is not None and self.context_model == model and len(self.context) < CHAT_CONTEXT_TOKENS:
+                return self.context
+            return None
+
+    def nbytes(self):
+        chars = len(self.summary) + sum(len(q) + len(a) for q, a in self.folding + self.turns)
+        return 512 + chars * 2 + (self.context.itemsize * len(self.context) if self.context is not None else 0)
+
+    def stats(self):
+        with self.lock:
+            return {"id": self.id, "turns": len(self.folding) + len(self.turns), "summary_chars": len(self.summary),
+                    "context_tokens": len(self.context) if self.context is not None else 0,
+                    "idle_s": int(time.time() - self.last_used), "bytes": self.nbytes()}
+
+
+class ConversationStore:
+    """Sessions keyed by a client-chosen id, least recently used first. Thread-safe.
+
+    summarize(summary, turns) -> new summary text is called on a background thread when the window overflows;
+    if it raises, the oldest questions are kept as a terse list instead.
+    """
+
+    def __init__(self, summarize=None, history_tokens=CHAT_HISTORY_TOKENS, summary_tokens=CHAT_SUMMARY_TOKENS,
+                 ttl=CHAT_SESSION_TTL, max_bytes=int(CHAT_SESSIONS_MAX_MB * 2**20), log=print):
+        self.summarize = summarize
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.log = log
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0  # sum of the sessions' sizes, kept up to date so the cap check does not walk them all
+        self._pool = ThreadPoolExecutor(1, thread_name_prefix="conversation-summary")
+        # metrics
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.summaries = 0
+        self.summary_errors = 0
+        self.context_reuse = 0
+
+    def get(self, sid):
+        """The session for `sid`, created on first use."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            conv = self._sessions.get(sid)
+            if conv is None:
+                conv = self._sessions[sid] = Conversation(sid)
+                conv.size = conv.nbytes()
+                self.bytes += conv.size
+                self.created += 1
+            self._sessions.move_to_end(sid)
+            conv.last_used = now
+            return conv
+
+    def drop(self, sid):
+        with self._lock:
+            conv = self._sessions.pop(sid, None)
+            if conv is None:
+                return False
+            self.bytes -= conv.size
+            return True
+
+    def _expire(self, now):
+        # call with the lock held; the dict is in last-used order, so idle sessions sit at the front
+        while self._sessions:
+            conv = next(iter(self._sessions.values()))
+            if now - conv.last_used < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.bytes -= conv.size
+            self.expired += 1
+
+    def _resize(self, conv):
+        # after conv changed; a session dropped meanwhile is no longer counted
+        with self._lock:
+            if self._sessions.get(conv.id) is conv:
+                size = conv.nbytes()
+                self.bytes += size - conv.size
+                conv.size = size
+
+    def _enforce_cap(self, keep):
+        with self._lock:
+            while self.bytes > self.max_bytes and len(self._sessions) > 1:
+                sid, conv = next(iter(self._sessions.items()))
+                if conv is keep:
+                    break
+                self._sessions.popitem(last=False)
+                self.bytes -= conv.size
+                self.evicted += 1
+
+    def record(self, conv, question, answer, model=None, context=None, used_context=None):
+        """Append a finished turn (English text).
+
+        context: the token array Ollama returned for it. used_context: the one the turn was sent with; if another
+        turn updated the session meanwhile the returned array no longer matches the history, so it is dropped.
+        """
+        fold = False
+        with conv.lock:
+            conv.turns.append((question, answer))
+            if context and (used_context is None or used_context is conv.context):
+                conv.context = array("l", context)
+                conv.context_model = model
+            else:
+                conv.context = None
+            budget = self.history_tokens
+            while len(conv.turns) > 1 and tokens(format_turns(conv.turns)) > budget:
+                conv.folding.append(conv.turns.pop(0))
+                fold = True
+            # an Ollama context still holds the folded turns word for word; it is used until CHAT_CONTEXT_TOKENS
+        if used_context is not None:
+            with self._lock:
+                self.context_reuse += 1
+        self._resize(conv)
+        if fold:
+            self._pool.submit(self._fold, conv)
+        self._enforce_cap(conv)
+
+    def _fold(self, conv):
+        with conv.lock:
+            turns = list(conv.folding)
+            summary = conv.summary
+        if not turns:
+            return
+        try:
+            if self.summarize is None:
+                raise RuntimeError("no summarizer configured")
+            new = (self.summarize(summary, turns) or "").strip()
+            if not new:
+                raise RuntimeError("empty summary")
+            with self._lock:
+                self.summaries += 1
+        except Exception as e:
+            self.log("conversation summary error:", e)
+            with self._lock:
+                self.summary_errors += 1
+            new = " ".join([summary] + [f"User asked: {q}" for q, _ in turns]).strip()
+        # the summary has a budget of its own; keep its most recent end
+        new = new[-self.summary_tokens * CHARS_PER_TOKEN:]
+        with conv.lock:
+            conv.summary = new
+            del conv.folding[:len(turns)]
+        self._resize(conv)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "summaries": self.summaries,
+                "summary_errors": self.summary_errors,
+                "context_reuse": self.context_reuse,
+            }
+
+
+def summary_prompt(summary, turns, words=None):
+    words = words or CHAT_SUMMARY_TOKENS * 3 // 4
+    prior = f"Earlier summary: {summary}\n\n" if summary else ""
+    return SUMMARY_PROMPT.format(words=words, summary=prior, turns=format_turns(turns))
@@ -3,35 +3,59 @@ import os
 import zipfile
 import json
 import re
+import shutil
+import hashlib
 import warnings
 import logging
-from concurrent.futures import ThreadPoolExecutor
-import pdfplumber
-import nltk
-from nltk.tokenize import sent_tokenize
-from sentence_transformers import SentenceTransformer
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import numpy as np
-import faiss
+# pdfplumber, nltk, sentence_transformers and faiss are imported where they are used, so that
+# importing this module for its chunking helpers (train_jobs.py, app.py) stays cheap
+from chunk_store import ChunkStore, ChunkStoreWriter, store_exists
+from bm25_index import build_bm25
 
 # ----------------- Setup -----------------
 warnings.filterwarnings("ignore")
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
-nltk.download("punkt", quiet=True)
 
 # ----------------- Config -----------------
 
 ZIP_PATH = os.environ.get("ZIP_PATH_OVERRIDE") or r"D:\project1\backend\Guidelines.zip"
  # change to your zip path
 EXTRACTION_DIR = "data/extracted"
-CORPUS_PATH = "data/pdf_corpus.txt"
-METADATA_PATH = "data/metadata.json"
+CHUNKS_PATH = "data/chunks"  # chunk_store.py prefix: chunks.bin + offset/source arrays
+BM25_PATH = "data/bm25"  # bm25_index.py prefix: lexical postings over the same chunk ids
 EMBEDDINGS_PATH = "data/embeddings.npy"
 INDEX_PATH = "data/faiss.index"
+MANIFEST_PATH = "data/manifest.json"
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
 
 CHUNK_SIZE = 1000   # characters per chunk (smaller is safer on low RAM)
 CHUNK_OVERLAP = 200
 MAX_THREADS = 4
 
+# Parallel extraction: "process" (default, CPU-bound parsing scales past the GIL) or "thread"
+INGEST_MODE = os.environ.get("INGEST_MODE", "process")
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "0")) or os.cpu_count() or MAX_THREADS
+# large PDFs are split into page ranges of this size so one file can use several workers
+PAGES_PER_TASK = int(os.environ.get("PAGES_PER_TASK", "40"))
+# re-embed only new/changed PDFs when a manifest from a previous run exists (INCREMENTAL=0 forces a full rebuild)
+INCREMENTAL = os.environ.get("INCREMENTAL", "1") == "1"
+# approximate working-set cap for the streaming build: sizes each embedding step (chunks held plus the model's
+# activations) and each vector copy step; extraction holds one window of files (INGEST_WORKERS * 2) at a time,
+# and the FAISS index itself still holds every vector (n_chunks * dim * 4 bytes for a flat index)
+INGEST_MEMORY_MB = int(os.environ.get("INGEST_MEMORY_MB", "256"))
+# outputs of older builds, replaced by the chunk store
+LEGACY_OUTPUTS = ("data/pdf_corpus.txt", "data/metadata.json")
+
+# ANN index: "flat" (exact), "hnsw", "ivf" or "ivfpq"; search-time efSearch/nprobe are set in retriever.py
+INDEX_TYPE = os.environ.get("INDEX_TYPE", "flat")
+HNSW_M = int(os.environ.get("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", "200"))
+IVF_NLIST = int(os.environ.get("IVF_NLIST", "0"))  # 0 = about 4 * sqrt(n_chunks)
+PQ_M = int(os.environ.get("PQ_M", "48"))  # sub-quantizers (must divide the embedding dim); 8 bits each
+INDEX_TRAIN_SAMPLE = int(os.environ.get("INDEX_TRAIN_SAMPLE", "50000"))
+
 os.makedirs("data", exist_ok=True)
 os.makedirs(EXTRACTION_DIR, exist_ok=True)
 
@@ -39,11 +63,26 @@ os.makedirs(EXTRACTION_DIR, exist_ok=True)
 def extract_zip(zip_path, out_dir):
     if not os.path.exists(zip_path):
         raise FileNotFoundError(f"ZIP not found: {zip_path}")
+    # start clean so PDFs removed from the ZIP are detected as deleted
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir, exist_ok=True)
     with zipfile.ZipFile(zip_path, "r") as z:
         z.extractall(out_dir)
     print(f"Extracted to {out_dir}")
 
+_punkt_ready = False
+
+def sent_tokenize(text):
+    global _punkt_ready
+    import nltk
+    if not _punkt_ready:
+        # no-op when punkt is already installed; only the first call pays for the check
+        nltk.download("punkt", quiet=True)
+        _punkt_ready = True
+    return nltk.tokenize.sent_tokenize(text)
+
 def read_pdf(path):
+    import pdfplumber
     try:
         with pdfplumber.open(path) as pdf:
             return "\n".join(page.extract_text() or "" for page in pdf.pages)
@@ -58,7 +97,8 @@ def clean_text(text):
     text = re.sub(r"[^A-Za-z0-9.,;:?!@()\-\n ]", " ", text)
     return text.strip()
 
-def chunk_text(text):
+def split_chunks(text):
+    """Sentence-packed chunks of up to CHUNK_SIZE characters, without overlap."""
     if not text:
         return []
     sentences = sent_tokenize(text)
@@ -68,19 +108,20 @@ def chunk_text(text):
         if len(cur) + len(s) <= CHUNK_SIZE:
             cur += " " + s
         else:
-            chunks.append(cur.strip())
-            # start new chunk with overlap of last sentences (simple)
+            if cur.strip():
+                chunks.append(cur.strip())
             cur = s
-    if cur:
+    if cur.strip():
         chunks.append(cur.strip())
+    return chunks
+
+def with_overlap(chunks):
+    # each chunk is embedded together with the one before it; the chunk store keeps
+    # only the base chunks plus a predecessor id and rebuilds this text on read
+    return [" ".join(chunks[max(0, i - 1):i + 1]) for i in range(len(chunks))]
 
-    # optionally add overlaps
-    final = []
-    for i, c in enumerate(chunks):
-        start = max(0, i - 1)
-        ov = " ".join(chunks[start:i+1])
-        final.append(ov.strip())
-    return final
+def chunk_text(text):
+    return with_overlap(split_chunks(text))
 
 def process_file(path):
     if not path.lower().endswith(".pdf"):
@@ -89,57 +130,388 @@ def process_file(path):
     if not text.strip():
         return []
     text = clean_text(text)
-    return chunk_text(text)
+    return split_chunks(text)
+
+# ----------------- Process-pool extraction -----------------
+def count_pages(path):
+    import pdfplumber
+    try:
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+    except Exception as e:
+        print(f"PDF read error {path}: {e}")
+        return 0
+
+def extract_page_range(task):
+    # runs in a worker process: parse + clean pages [start, end) of one PDF
+    path, start, end = task
+    import pdfplumber
+    try:
+        with pdfplumber.open(path) as pdf:
+            text = "\n".join(pdf.pages[i].extract_text() or "" for i in range(start, end))
+    except Exception as e:
+        print(f"PDF read error {path} pages {start}-{end}: {e}")
+        return ""
+    return clean_text(text)
+
+def chunk_cleaned(text):
+    return split_chunks(text) if text else []
+
+def extract_window(files, ex, pages_per_task=PAGES_PER_TASK):
+    """Chunk lists for `files` (in order) using process pool `ex`; large PDFs are split by page range."""
+    pdfs = [f if f.lower().endswith(".pdf") else None for f in files]
+    page_counts = list(ex.map(count_pages, [f for f in pdfs if f]))
+    tasks, owners = [], []
+    counts = iter(page_counts)
+    for i, f in enumerate(pdfs):
+        if not f:
+            continue
+        n = next(counts)
+        for start in range(0, n, pages_per_task):
+            tasks.append((f, start, min(start + pages_per_task, n)))
+            owners.append(i)
+
+    # ex.map keeps submission order, so page ranges merge back deterministically
+    texts = [[] for _ in files]
+    for owner, text in zip(owners, ex.map(extract_page_range, tasks, chunksize=1)):
+        if text:
+            texts[owner].append(text)
+
+    # sentence tokenization is CPU-bound too; chunk each file in the pool
+    return list(ex.map(chunk_cleaned, [" ".join(t).strip() for t in texts]))
+
+def make_pool(mode=INGEST_MODE, workers=INGEST_WORKERS):
+    return ProcessPoolExecutor(max_workers=workers) if mode == "process" else ThreadPoolExecutor(max_workers=workers)
+
+def iter_extracted(files, ex, mode=INGEST_MODE, window=None):
+    """Yield (path, base chunks) in `files` order, a window of files at a time so results never pile up."""
+    window = window or max(1, INGEST_WORKERS * 2)
+    for i in range(0, len(files), window):
+        part = files[i:i + window]
+        results = extract_window(part, ex) if mode == "process" else ex.map(process_file, part)
+        yield from zip(part, results)
+
+def extract_files(files, mode=INGEST_MODE, workers=INGEST_WORKERS):
+    """Base chunk lists (see split_chunks) for `files`, in order."""
+    with make_pool(mode, workers) as ex:
+        return [chunks for _, chunks in iter_extracted(files, ex, mode)]
+
+# ----------------- Manifest (content hashes per file and per chunk) -----------------
+# {"settings": {...}, "next_id": n, "files": {relpath: {"sha256": h, "chunks": [[id, chunk_sha1], ...]}}}
+# Chunk ids are FAISS ids (IndexIDMap2) and ids in the chunk store (removed chunks keep their id unused).
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_sha1(base, text):
+    # hashes the embedded (overlapped) text; the base length pins where the chunk's own text starts
+    return hashlib.sha1(f"{len(base)}:{text}".encode("utf-8")).hexdigest()
+
+def index_settings():
+    # anything that changes chunk text, vectors or index layout invalidates the whole index
+    return {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "embed_model": EMBED_MODEL_NAME,
+            "index_type": INDEX_TYPE, "pq_m": PQ_M if INDEX_TYPE == "ivfpq" else None}
+
+def load_manifest():
+    if not all(os.path.exists(p) for p in (MANIFEST_PATH, INDEX_PATH, EMBEDDINGS_PATH)) or not store_exists(CHUNKS_PATH):
+        return None
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        print(f"Manifest unreadable ({e}), rebuilding from scratch")
+        return None
+    if manifest.get("settings") != index_settings():
+        print("Chunking/embedding settings changed, rebuilding from scratch")
+        return None
+    return manifest
+
+def embed_batch_size(dim=384, max_tokens=256, heads=12):
+    """(chunks per encode() call, encode()'s own batch_size) for INGEST_MEMORY_MB; defaults fit all-MiniLM-L6-v2.
+
+    An estimate, not a hard limit: half the budget is for the model's activations on one internal batch
+    (float32 attention scores of every head plus hidden states, one layer at a time), half for what a call
+    holds per chunk until it returns (text and its overlap copy, token ids and mask, raw and normalized
+    vectors). A call is also capped at 16 internal batches.
+    """
+    budget = INGEST_MEMORY_MB * 1024 * 1024 // 2
+    per_sequence = 4 * (heads * max_tokens * max_tokens + 6 * max_tokens * dim)
+    model_batch = max(1, min(64, budget // per_sequence))
+    per_chunk = 4 * CHUNK_SIZE + 2 * 8 * max_tokens + 2 * 4 * dim
+    return max(model_batch, min(budget // per_chunk, 16 * model_batch)), model_batch
+
+def vector_batch_size(dim=384):
+    # rows per step when only vectors move (copies, index adds): raw + normalized float32
+    return max(1024, INGEST_MEMORY_MB * 1024 * 1024 // (2 * 4 * dim))
+
+def load_embedder():
+    from sentence_transformers import SentenceTransformer
+    print(f"Loading embedding model (sentence-transformers/{EMBED_MODEL_NAME})...")
+    return SentenceTransformer(EMBED_MODEL_NAME)  # small and fast on CPU
+
+def encode(model, texts, batch_size=64):
+    return model.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True).astype("float32")
+
+def iter_batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def open_embeddings(n, dim):
+    # preallocated, memory-mapped .npy; written under a temp name and renamed when complete
+    return np.lib.format.open_memmap(EMBEDDINGS_PATH + ".tmp.npy", mode="w+", dtype="float32", shape=(n, dim))
+
+def build_lexical_index(chunks_path=CHUNKS_PATH):
+    # rebuilt from the chunk store on every run (tokenizing is cheap next to embedding);
+    # indexes each chunk's own text, without the overlap copy of its predecessor
+    store = ChunkStore(chunks_path)
+    terms = build_bm25(BM25_PATH, ((i, store.base_text(i)) for i in range(len(store)) if store.source_ids[i] >= 0))
+    store.close()
+    print(f"Saved BM25 index → {BM25_PATH}.* ({terms} terms)")
+
+def finish_outputs(index, manifest, store):
+    """Swap in everything a build produced; until here the live outputs are untouched. `store` is the
+    ChunkStoreWriter, closed without commit."""
+    import faiss
+    # callers flush and drop their memmap first (Windows cannot rename a mapped file)
+    os.replace(EMBEDDINGS_PATH + ".tmp.npy", EMBEDDINGS_PATH)
+    print(f"Saved embeddings → {EMBEDDINGS_PATH}")
+    store.commit()
+    print(f"Saved chunk store → {CHUNKS_PATH}.bin")
+    # before the FAISS index: retrievers reload everything when the index file changes
+    build_lexical_index()
+    faiss.write_index(index, INDEX_PATH + ".tmp")
+    os.replace(INDEX_PATH + ".tmp", INDEX_PATH)
+    print(f"Saved FAISS index → {INDEX_PATH}")
+    # last: a manifest always describes outputs that are complete (an interrupted build reruns in full or
+    # incrementally against the previous state)
+    with open(MANIFEST_PATH + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(MANIFEST_PATH + ".tmp", MANIFEST_PATH)
+    for path in LEGACY_OUTPUTS:
+        if os.path.exists(path):
+            os.remove(path)
+
+# ----------------- Index factory -----------------
+def make_index(dim, n, index_type=INDEX_TYPE):
+    """Empty (possibly untrained) index for n vectors, wrapped in IndexIDMap2 so chunk ids stay stable."""
+    import faiss
+    metric = faiss.METRIC_INNER_PRODUCT  # inner product on normalized vectors = cosine
+    if index_type == "flat":
+        base = faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, HNSW_M, metric)
+        base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type in ("ivf", "ivfpq"):
+        # faiss wants roughly 39 training points per centroid
+        nlist = max(1, min(IVF_NLIST or int(4 * np.sqrt(n)), n // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivfpq" and n >= 256 * 39 and dim % PQ_M == 0:
+            base = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, 8, metric)
+        else:
+            if index_type == "ivfpq":
+                print(f"ivfpq needs >= {256 * 39} chunks and PQ_M dividing {dim}; using ivf")
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+    else:
+        raise ValueError(f"Unknown INDEX_TYPE: {index_type}")
+    return faiss.IndexIDMap2(base)
+
+def supports_remove(index):
+    import faiss
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    return not isinstance(inner, faiss.IndexHNSW)
+
+def build_index(embeddings, index_type=INDEX_TYPE):
+    """Build the index from an (n, dim) raw-embedding memmap, training on a strided sample if needed."""
+    import faiss
+    n, dim = embeddings.shape
+    index = make_index(dim, n, index_type)
+    if not index.is_trained:
+        sample = np.ascontiguousarray(embeddings[np.unique(np.linspace(0, n - 1, min(n, INDEX_TRAIN_SAMPLE)).astype("int64"))])
+        faiss.normalize_L2(sample)
+        print(f"Training {index_type} index on {len(sample)} sampled vectors...")
+        index.train(sample)
+    step = vector_batch_size(dim)
+    for i in range(0, n, step):
+        end = min(i + step, n)
+        vectors = np.array(embeddings[i:end], dtype="float32")
+        faiss.normalize_L2(vectors)
+        index.add_with_ids(vectors, np.arange(i, end, dtype="int64"))
+    return index
 
 # ----------------- Main building -----------------
+def build_full(files):
+    """Streaming build: extract → chunk store on disk → embed batch by batch into a memmap + index."""
+    manifest = {"settings": index_settings(), "files": {}}
+    n = 0
+
+    store = ChunkStoreWriter(CHUNKS_PATH)
+    try:
+        with make_pool() as ex:
+            for path, chunks in iter_extracted(files, ex):
+                entry = manifest["files"][os.path.relpath(path, EXTRACTION_DIR)] = {"sha256": file_sha256(path), "chunks": []}
+                prev = -1
+                for base, text in zip(chunks, with_overlap(chunks)):
+                    entry["chunks"].append([n, chunk_sha1(base, text)])
+                    store.put(n, base, os.path.basename(path), prev)
+                    prev, n = n, n + 1
+        # staged: the live store keeps matching the live index until finish_outputs swaps both
+        store.close(commit=False)
+        manifest["next_id"] = n
+
+        print(f"Total chunks: {n}")
+        if not n:
+            raise RuntimeError("No text chunks extracted; nothing to index")
+
+        # ----------------- Embeddings, batch by batch into the memmap -----------------
+        model = load_embedder()
+        dim = model.get_sentence_embedding_dimension()
+        embeddings = open_embeddings(n, dim)
+        chunks = ChunkStore(store.staging)
+        step, model_batch = embed_batch_size(dim, model.max_seq_length or 256)
+        for batch in iter_batches(range(n), step):
+            embeddings[batch[0]:batch[-1] + 1] = encode(model, [chunks.get(i)["text"] for i in batch], model_batch)
+            print(f"Embedded {batch[-1] + 1}/{n} chunks")
+        chunks.close()
+        embeddings.flush()
+
+        # ----------------- FAISS index (trained on a sample when the type needs it) -----------------
+        index = build_index(embeddings)
+        del embeddings
+        finish_outputs(index, manifest, store)
+    except BaseException:
+        # staged files only; the live outputs are untouched until finish_outputs
+        store.abort()
+        raise
+
+def update_incremental(files, manifest):
+    import faiss
+    index = faiss.read_index(INDEX_PATH)
+
+    hashes = {os.path.relpath(p, EXTRACTION_DIR): file_sha256(p) for p in files}
+    changed = [p for p in files if manifest["files"].get(os.path.relpath(p, EXTRACTION_DIR), {}).get("sha256") != hashes[os.path.relpath(p, EXTRACTION_DIR)]]
+    deleted = [rel for rel in manifest["files"] if rel not in hashes]
+    print(f"Incremental update: {len(changed)} new/changed, {len(deleted)} deleted, {len(files) - len(changed)} unchanged")
+    if not changed and not deleted:
+        print("Index is up to date.")
+        return
+    # a changed file almost always drops some of its old chunks, so decide before any work is done
+    if not supports_remove(index) and (deleted or any(os.path.relpath(p, EXTRACTION_DIR) in manifest["files"] for p in changed)):
+        print(f"{INDEX_TYPE} index cannot drop vectors; rebuilding from scratch")
+        return build_full(files)
+
+    dim = index.d
+    first_new = next_id = manifest["next_id"]
+    remove_ids = []
+    step, model_batch = embed_batch_size(dim)
+    model = None
+    pending = []  # (chunk id, embedded text) for the next encode() call
+    # new ids are handed out in order, so their vectors are rows first_new.. of the new embeddings file;
+    # they are spooled to disk here and copied in once the final row count is known
+    spool_path = EMBEDDINGS_PATH + ".new.tmp"
+    spool = open(spool_path, "wb")
+    # appended text goes straight into the live blob (unreferenced until the arrays are swapped in)
+    store = ChunkStoreWriter(CHUNKS_PATH, append=True)
+
+    def embed_pending():
+        nonlocal model
+        if model is None:
+            model = load_embedder()
+        vectors = encode(model, [text for _, text in pending], model_batch)
+        spool.write(vectors.tobytes())
+        faiss.normalize_L2(vectors)
+        index.add_with_ids(vectors, np.array([cid for cid, _ in pending], dtype="int64"))
+        pending.clear()
+
+    try:
+        with make_pool() as ex:
+            for path, chunks in iter_extracted(changed, ex):
+                rel = os.path.relpath(path, EXTRACTION_DIR)
+                # chunks whose text is unchanged keep their id and vector
+                old = {}
+                for cid, h in manifest["files"].get(rel, {}).get("chunks", []):
+                    old.setdefault(h, []).append(cid)
+                entry = {"sha256": hashes[rel], "chunks": []}
+                prev = -1
+                for base, text in zip(chunks, with_overlap(chunks)):
+                    h = chunk_sha1(base, text)
+                    if old.get(h):
+                        cid = old[h].pop()
+                        store.set_prev(cid, prev)
+                    else:
+                        cid, next_id = next_id, next_id + 1
+                        store.put(cid, base, os.path.basename(path), prev)
+                        pending.append((cid, text))
+                        if len(pending) >= step:
+                            embed_pending()
+                    entry["chunks"].append([cid, h])
+                    prev = cid
+                remove_ids.extend(cid for ids in old.values() for cid in ids)
+                manifest["files"][rel] = entry
+        if pending:
+            embed_pending()
+        spool.close()
+
+        for rel in deleted:
+            remove_ids.extend(cid for cid, _ in manifest["files"].pop(rel)["chunks"])
+        if remove_ids:
+            index.remove_ids(np.array(remove_ids, dtype="int64"))
+        for cid in remove_ids:
+            store.remove(cid)
+        store.close(commit=False)
+        print(f"Removed {len(remove_ids)} chunks, embedded {next_id - first_new} new chunks")
+
+        # old rows, then the spooled new ones, block by block instead of loading either array
+        old_embeddings = np.load(EMBEDDINGS_PATH, mmap_mode="r")
+        embeddings = open_embeddings(next_id, dim)
+        rows = vector_batch_size(dim)
+        for i in range(0, len(old_embeddings), rows):
+            end = min(i + rows, len(old_embeddings))
+            embeddings[i:end] = old_embeddings[i:end]
+        embeddings[len(old_embeddings):first_new] = 0
+        del old_embeddings
+        if next_id > first_new:
+            added = np.memmap(spool_path, dtype="float32", mode="r", shape=(next_id - first_new, dim))
+            for i in range(0, len(added), rows):
+                end = min(i + rows, len(added))
+                embeddings[first_new + i:first_new + end] = added[i:end]
+            del added
+        embeddings[remove_ids] = 0
+
+        manifest["next_id"] = next_id
+        print(f"Total chunks: {index.ntotal}")
+        embeddings.flush()
+        del embeddings
+        finish_outputs(index, manifest, store)
+    except BaseException:
+        store.abort()
+        raise
+    finally:
+        spool.close()
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+
 def main():
     print("Starting ingestion and index build...")
     extract_zip(ZIP_PATH, EXTRACTION_DIR)
 
     # find pdfs
-    files = [os.path.join(r, f) for r, _, fs in os.walk(EXTRACTION_DIR) for f in fs if f.lower().endswith(".pdf")]
-    print(f"Found {len(files)} PDFs")
-
-    all_chunks = []
-    metadata = []
-
-    with ThreadPoolExecutor(max_workers=MAX_THREADS) as ex:
-        for i, chunks in enumerate(ex.map(process_file, files)):
-            if not chunks:
-                continue
-            for c in chunks:
-                all_chunks.append(c)
-                metadata.append({"source": os.path.basename(files[i]), "text": c})
-
-    print(f"Total chunks: {len(all_chunks)}")
-
-    # save corpus
-    with open(CORPUS_PATH, "w", encoding="utf-8") as f:
-        f.write("\n\n".join(all_chunks))
-
-    with open(METADATA_PATH, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
-
-    # ----------------- Embeddings -----------------
-    print("Loading embedding model (sentence-transformers/all-MiniLM-L6-v2)...")
-    model = SentenceTransformer("all-MiniLM-L6-v2")  # small and fast on CPU
-    batch_size = 64
-    embeddings = []
-    for i in range(0, len(all_chunks), batch_size):
-        batch = all_chunks[i:i+batch_size]
-        emb = model.encode(batch, show_progress_bar=False, convert_to_numpy=True)
-        embeddings.append(emb)
-    embeddings = np.vstack(embeddings).astype("float32")
-    np.save(EMBEDDINGS_PATH, embeddings)
-    print(f"Saved embeddings → {EMBEDDINGS_PATH}")
+    files = sorted(os.path.join(r, f) for r, _, fs in os.walk(EXTRACTION_DIR) for f in fs if f.lower().endswith(".pdf"))
+    print(f"Found {len(files)} PDFs (mode={INGEST_MODE}, workers={INGEST_WORKERS})")
 
-    # ----------------- FAISS index -----------------
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)  # inner product (use normalized vectors for cosine)
-    faiss.normalize_L2(embeddings)
-    index.add(embeddings)
-    faiss.write_index(index, INDEX_PATH)
-    print(f"Saved FAISS index → {INDEX_PATH}")
+    manifest = load_manifest() if INCREMENTAL else None
+    if manifest is None:
+        build_full(files)
+    else:
+        update_incremental(files, manifest)
 
     print("Done. You can now run the backend server (app.py).")
 
@@ -0,0 +1,169 @@
+# metrics.py — in-process counters / histograms rendered in the Prometheus text format (/metrics)
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+# METRICS_ENABLED=0 turns every span / observe into a no-op (and /metrics into a 404)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# seconds; request stages range from sub-millisecond cache hits to minute-long generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300)
+
+_NULL_SPAN = nullcontext()
+
+# endpoint label for stage spans; a context variable so it follows work handed to executor threads
+current_endpoint = ContextVar("current_endpoint", default="-")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *values):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (+ overflow), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            running = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                running += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {running}")
+        return lines
+
+
+class _Span:
+    __slots__ = ("hist", "values", "t0")
+
+    def __init__(self, hist, values):
+        self.hist, self.values = hist, values
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, *self.values)
+        return False
+
+
+# ----------------------------
+# Registry
+# ----------------------------
+_metrics = {}
+
+
+def counter(name, help, labels=()):
+    return _metrics.setdefault(name, Counter(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    return _metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+
+def span(hist, *values):
+    """`with span(hist, label, ...):` records the block's wall time; a shared no-op when metrics are off."""
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    return _Span(hist, values)
+
+
+def render():
+    out = []
+    for m in _metrics.values():
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(m.render())
+    return "\n".join(out) + "\n"
+
+
+# ----------------------------
+# Shared metrics
+# ----------------------------
+REQUEST_SECONDS = histogram("http_request_duration_seconds", "Request handling time (streamed bodies excluded).",
+                            ("endpoint", "method", "status"))
+STAGE_SECONDS = histogram("request_stage_duration_seconds", "Time spent per stage of a request.",
+                          ("endpoint", "stage"))
+OLLAMA_PROMPT_TOKENS = counter("ollama_prompt_tokens_total", "Prompt tokens evaluated by Ollama.", ("model",))
+OLLAMA_COMPLETION_TOKENS = counter("ollama_completion_tokens_total", "Tokens generated by Ollama.", ("model",))
+OLLAMA_TOKENS_PER_SECOND = histogram("ollama_tokens_per_second", "Generation speed (eval_count / eval_duration).",
+                                     ("model",), TOKEN_RATE_BUCKETS)
+OLLAMA_GENERATION_SECONDS = histogram("ollama_generation_duration_seconds",
+                                      "Ollama's own total_duration per generation (model load included).", ("model",))
+OLLAMA_PROMPT_EVAL_SECONDS = histogram("ollama_prompt_eval_duration_seconds",
+                                       "Ollama's prompt evaluation time per generation (low when a cached prefix was reused).",
+                                       ("model",))
+OLLAMA_LOAD_SECONDS = histogram("ollama_load_duration_seconds", "Model load time per generation (cold starts).",
+                                ("model",))
+OLLAMA_COALESCED = counter("ollama_coalesced_total", "Generation calls that joined an identical one already in flight.",
+                           ("kind",))
+OLLAMA_BACKEND_REQUESTS = counter("ollama_backend_requests_total",
+                                  "Generation attempts per Ollama host by outcome (ok, error, missing_model, cancelled).",
+                                  ("backend", "outcome"))
+
+
+def record_generation(model, data):
+    """Token counts and speed from the fields Ollama puts on its final response (durations are in ns)."""
+    if not METRICS_ENABLED or not isinstance(data, dict):
+        return
+    if data.get("prompt_eval_count"):
+        OLLAMA_PROMPT_TOKENS.inc(data["prompt_eval_count"], model)
+    if data.get("eval_count"):
+        OLLAMA_COMPLETION_TOKENS.inc(data["eval_count"], model)
+        if data.get("eval_duration"):
+            OLLAMA_TOKENS_PER_SECOND.observe(data["eval_count"] / (data["eval_duration"] / 1e9), model)
+    if data.get("total_duration"):
+        OLLAMA_GENERATION_SECONDS.observe(data["total_duration"] / 1e9, model)
+    if data.get("prompt_eval_duration"):
+        OLLAMA_PROMPT_EVAL_SECONDS.observe(data["prompt_eval_duration"] / 1e9, model)
+    if data.get("load_duration"):
+        OLLAMA_LOAD_SECONDS.observe(data["load_duration"] / 1e9, model)
@@ -0,0 +1,137 @@
+# model_registry.py — heavy models (embedder, Whisper, ...) loaded on first use, unloaded when idle
+import gc
+import os
+import time
+import threading
+
+# seconds a model may sit unused before it is dropped (0 = keep forever)
+MODEL_IDLE_TTL = int(os.getenv("MODEL_IDLE_TTL", "0"))
+# comma-separated names to load in the background at boot, e.g. "embedder,whisper"
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", "").split(",") if m.strip()]
+
+
+def process_rss_mb():
+    """Resident memory of this process in MB, or None if it cannot be read here."""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / 2**20, 1)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _Entry:
+    def __init__(self, loader, idle_ttl):
+        self.loader = loader
+        self.idle_ttl = idle_ttl
+        self.model = None
+        self.lock = threading.Lock()
+        self.last_used = None
+        self.loads = 0
+        self.load_seconds = None
+        self.rss_delta_mb = None
+        self.error = None
+
+
+class ModelRegistry:
+    def __init__(self, idle_ttl=MODEL_IDLE_TTL, log=print):
+        self.idle_ttl = idle_ttl
+        self.log = log
+        self._entries = {}
+        self._reaper = None
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, idle_ttl=None):
+        """`loader()` builds the model; it runs on the first get() (imports belong inside it)."""
+        self._entries[name] = _Entry(loader, self.idle_ttl if idle_ttl is None else idle_ttl)
+
+    def get(self, name):
+        entry = self._entries[name]
+        entry.last_used = time.monotonic()
+        model = entry.model
+        if model is not None:
+            return model
+        with entry.lock:
+            if entry.model is None:
+                rss0 = process_rss_mb()
+                t0 = time.perf_counter()
+                try:
+                    entry.model = entry.loader()
+                except Exception as e:
+                    entry.error = str(e)
+                    raise
+                entry.error = None
+                entry.loads += 1
+                entry.load_seconds = round(time.perf_counter() - t0, 2)
+                rss1 = process_rss_mb()
+                entry.rss_delta_mb = round(rss1 - rss0, 1) if rss0 is not None and rss1 is not None else None
+                self.log(f"model {name} loaded in {entry.load_seconds}s (+{entry.rss_delta_mb} MB)")
+                self._start_reaper()
+            entry.last_used = time.monotonic()
+            return entry.model
+
+    def loaded(self, name):
+        return self._entries[name].model is not None
+
+    def unload(self, name):
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.model is None:
+                return False
+            # callers that already hold the model keep it alive until they are done
+            entry.model = None
+        gc.collect()
+        self.log(f"model {name} unloaded")
+        return True
+
+    def warm_up(self, names=None):
+        """Load `names` (default WARMUP_MODELS) on a background thread; failures are only logged."""
+        names = [n for n in (WARMUP_MODELS if names is None else names) if n in self._entries]
+
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    self.log(f"model {name} warm-up failed:", e)
+        if names:
+            threading.Thread(target=run, name="model-warmup", daemon=True).start()
+        return names
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None or not any(e.idle_ttl for e in self._entries.values()):
+                return
+            self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(max(5, min(e.idle_ttl for e in self._entries.values() if e.idle_ttl) / 4))
+            now = time.monotonic()
+            for name, entry in self._entries.items():
+                if entry.idle_ttl and entry.model is not None and now - entry.last_used > entry.idle_ttl:
+                    self.unload(name)
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            name: {
+                "loaded": e.model is not None,
+                "loads": e.loads,
+                "load_seconds": e.load_seconds,
+                "rss_delta_mb": e.rss_delta_mb,
+                "idle_seconds": round(now - e.last_used, 1) if e.last_used is not None else None,
+                "idle_ttl": e.idle_ttl or None,
+                "error": e.error,
+            }
+            for name, e in self._entries.items()
+        }
+
+
+# process-wide registry; modules register their models at import time (cheap: nothing is loaded)
+registry = ModelRegistry()
@@ -0,0 +1,574 @@
+# ollama_client.py — pooled keep-alive HTTP client for Ollama with a bounded generation queue; requests are placed
+# on one of the configured hosts by ollama_router.py
+import os
+import json
+import asyncio
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from coalesce import AsyncSingleFlight, SingleFlight
+from metrics import record_generation
+from ollama_router import OLLAMA_MAX_CONCURRENCY, OLLAMA_RETRIES, OllamaUnavailable, router
+
+# ----------------------------
+# Config
+# ----------------------------
+# hosts: OLLAMA_URLS / OLLAMA_URL, see ollama_router.py
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "16"))  # connections per host
+# generations per host: OLLAMA_MAX_CONCURRENCY (ollama_router.py); the rest wait in a bounded queue
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", "16"))
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "30"))
+OLLAMA_RETRY_AFTER = int(os.getenv("OLLAMA_RETRY_AFTER", "5"))
+# identical prompts (same model, same text) already being generated are joined instead of sent again
+OLLAMA_COALESCE = os.getenv("OLLAMA_COALESCE", "1") == "1"
+# how long Ollama keeps a model loaded after a request ("30m", "-1" = forever, "" = Ollama's own 5 min default)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# model options sent with every generation; empty = Ollama's default. num_ctx must stay the same between
+# requests, a change makes Ollama reload the model
+OLLAMA_NUM_CTX = os.getenv("OLLAMA_NUM_CTX", "")
+OLLAMA_NUM_THREAD = os.getenv("OLLAMA_NUM_THREAD", "")
+
+
+def parse_model_options(raw, log=logging.getLogger(__name__).warning):
+    """{model: {option: value}} from OLLAMA_MODEL_OPTIONS; a malformed value is reported through `log` and ignored.
+
+    Parsed at import, before app.py's dlog exists, so the default goes through logging (shown without any setup).
+    """
+    try:
+        options = json.loads(raw or "{}")
+        if not isinstance(options, dict) or not all(isinstance(o, dict) for o in options.values()):
+            raise ValueError("expected a JSON object of objects, one per model")
+        return options
+    except ValueError as e:
+        log(f"OLLAMA_MODEL_OPTIONS ignored: {e}")
+        return {}
+
+
+# per-model overrides, JSON: {"gemma2:2b": {"num_ctx": 8192, "keep_alive": "1h"}, "phi3": {"num_thread": 8}}
+OLLAMA_MODEL_OPTIONS = parse_model_options(os.getenv("OLLAMA_MODEL_OPTIONS", ""))
+
+
+class OllamaBusy(Exception):
+    """Raised when no generation slot is available; callers should answer 503 + Retry-After."""
+
+    def __init__(self, message, retry_after=OLLAMA_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ----------------------------
+# Concurrency limiter with a bounded wait queue
+# ----------------------------
+class GenerationLimiter:
+    """Generation slots with a bounded wait queue, shared by the thread handlers and the coroutines of
+    asgi_app.py: both kinds of waiter queue here, and every release() / wake() reaches both."""
+
+    def __init__(self, max_concurrency=OLLAMA_MAX_CONCURRENCY, max_queue=OLLAMA_MAX_QUEUE,
+                 queue_timeout=OLLAMA_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._async_waiters = []  # (loop, asyncio.Event) of coroutines waiting for their next check
+        self.inflight = 0
+        self.waiting = 0
+        # metrics
+        self.peak_waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # the helpers below: call with the lock held
+    def _ready(self, reserve, got):
+        if self.inflight >= self.max_concurrency:
+            return False
+        if reserve is None:
+            return True
+        got[:] = [reserve()]
+        return got[0] is not None
+
+    def _enqueue(self):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise OllamaBusy("generation queue is full")
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+    def _admit(self, got, t0):
+        self.inflight += 1
+        waited = time.perf_counter() - t0
+        self.acquired += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return got[0] if got else None
+
+    def _notify(self):
+        # waiters may be after different models (hosts), so each one re-checks
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def acquire(self, reserve=None):
+        """Take a slot, queueing while none is free.
+
+        reserve: called under the queue lock once a slot is free, until it returns something other than None (the
+        router's pick of a host with room); that value is returned, so slot and host are taken together.
+        """
+        t0 = time.perf_counter()
+        got = []
+        with self._cond:
+            if not self._ready(reserve, got):
+                self._enqueue()
+                try:
+                    ok = self._cond.wait_for(lambda: self._ready(reserve, got), timeout=self.queue_timeout)
+                finally:
+                    self.waiting -= 1
+                if not ok:
+                    self.timed_out += 1
+                    raise OllamaBusy("timed out waiting for a generation slot")
+            return self._admit(got, t0)
+
+    async def acquire_async(self, reserve=None):
+        """acquire() for coroutines: a queued request waits on the event loop without holding a thread."""
+        t0 = time.perf_counter()
+        got = []
+        with self._cond:
+            if self._ready(reserve, got):
+                return self._admit(got, t0)
+            self._enqueue()
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.queue_timeout
+        event = None
+        try:
+            while True:
+                with self._cond:
+                    if self._ready(reserve, got):
+                        return self._admit(got, t0)
+                    event = asyncio.Event()
+                    self._async_waiters.append((loop, event))
+                try:
+                    await asyncio.wait_for(event.wait(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    with self._cond:
+                        self.timed_out += 1
+                    raise OllamaBusy("timed out waiting for a generation slot")
+        finally:
+            with self._cond:
+                self.waiting -= 1
+                self._async_waiters = [w for w in self._async_waiters if w[1] is not event]
+
+    def release(self):
+        # only holds the lock briefly, so coroutines call it directly
+        with self._cond:
+            self.inflight -= 1
+            self._notify()
+
+    def wake(self):
+        """Let every waiter re-check: a host got room without a slot being released (see Router.on_change)."""
+        with self._cond:
+            self._notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "inflight": self.inflight,
+                "queue_depth": self.waiting,
+                "peak_queue_depth": self.peak_waiting,
+                "acquired": self.acquired,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_ms": round(self.wait_total / self.acquired * 1000, 2) if self.acquired else 0.0,
+                "max_wait_ms": round(self.wait_max * 1000, 2),
+            }
+
+
+# ----------------------------
+# Shared session (connection pool, keep-alive)
+# ----------------------------
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=max(4, len(router.backends)), pool_maxsize=OLLAMA_POOL_SIZE)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+# one queue for all hosts and for both the sync and the async client; a request leaves it once a slot is free
+# *and* a host for its model is below OLLAMA_MAX_CONCURRENCY, so the total width only bounds the sum
+limiter = GenerationLimiter(OLLAMA_MAX_CONCURRENCY * len(router.backends))
+router.on_change(limiter.wake)
+
+
+def _outcome(status):
+    # only the host's own failures (no response, 5xx) count towards its circuit; other 4xx are about the request
+    if status == 404:
+        return "missing_model"
+    if status is None or status >= 500:
+        return "error"
+    return "rejected"
+
+
+def _retry_on(model, tried, retry):
+    """Next host after a failed attempt, or None to give up (not retryable, retries used up, no host with room)."""
+    if not retry or len(tried) > OLLAMA_RETRIES:
+        return None
+    try:
+        return router.pick(model, tried)
+    except OllamaUnavailable:
+        return None
+
+
+def _post(payload, model, timeout, backend, stream=False):
+    """POST /api/generate to `backend` (reserved by the limiter); returns (backend, response), still reserved.
+
+    Connection errors, 5xx and a model missing on that host are retried on another host with room
+    (OLLAMA_RETRIES times).
+    """
+    tried = []
+    while True:
+        res = None
+        try:
+            res = session.post(backend.url + "/api/generate", json=payload, timeout=timeout, stream=stream)
+            res.raise_for_status()
+            return backend, res
+        except requests.RequestException as e:
+            status = res.status_code if res is not None else None
+            if res is not None:
+                res.close()
+            router.release(backend, _outcome(status), model)
+            tried.append(backend)
+            retry = status == 404 or (status or 0) >= 500 or isinstance(e, requests.ConnectionError)
+            backend = _retry_on(model, tried, retry)
+            if backend is None:
+                raise
+        except BaseException:
+            if res is not None:
+                res.close()
+            router.release(backend, "cancelled")
+            raise
+
+
+def _coalesced(kind):
+    if metrics.METRICS_ENABLED:
+        metrics.OLLAMA_COALESCED.inc(1, kind)
+
+
+# followers share the leader's generation and never take a slot of their own
+flight = SingleFlight(on_coalesced=_coalesced)
+
+
+_model_settings = {}
+
+
+def model_settings(model):
+    """(keep_alive, options) for `model`: the env defaults, then OLLAMA_MODEL_OPTIONS[model] (or its untagged name)."""
+    if model not in _model_settings:
+        options = {}
+        if OLLAMA_NUM_CTX:
+            options["num_ctx"] = int(OLLAMA_NUM_CTX)
+        if OLLAMA_NUM_THREAD:
+            options["num_thread"] = int(OLLAMA_NUM_THREAD)
+        override = dict(OLLAMA_MODEL_OPTIONS.get(model) or OLLAMA_MODEL_OPTIONS.get(model.split(":")[0]) or {})
+        keep_alive = override.pop("keep_alive", OLLAMA_KEEP_ALIVE)
+        options.update(override)
+        _model_settings[model] = (keep_alive, options)
+    return _model_settings[model]
+
+
+def _payload(model, prompt, stream, context):
+    payload = {"model": model, "prompt": prompt, "stream": stream}
+    keep_alive, options = model_settings(model)
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    if options:
+        payload["options"] = options
+    if context:
+        # token array from an earlier response: Ollama continues from it instead of re-encoding that prefix
+        payload["context"] = list(context)
+    return payload
+
+
+def _key(model, prompt, context):
+    return model, prompt, tuple(context) if context else None
+
+
+def generate(prompt, model, timeout=60, context=None):
+    """Blocking generation; returns Ollama's JSON response (shared with identical calls in flight, don't mutate).
+
+    Raises OllamaBusy when saturated.
+    """
+    if OLLAMA_COALESCE:
+        return flight.do(_key(model, prompt, context), lambda: _generate(prompt, model, timeout, context))
+    return _generate(prompt, model, timeout, context)
+
+
+def _generate(prompt, model, timeout, context=None):
+    payload = _payload(model, prompt, False, context)
+    backend = limiter.acquire(lambda: router.pick(model))
+    try:
+        backend, res = _post(payload, model, timeout, backend)
+        try:
+            data = res.json()
+        except ValueError:
+            router.release(backend, "error")
+            raise
+        router.release(backend, "ok", model)
+    finally:
+        limiter.release()
+    record_generation(model, data)
+    return data
+
+
+class OllamaStream:
+    """Iterator over Ollama's streamed chunks; holds a generation slot until exhausted or closed."""
+
+    def __init__(self, res, model=None, backend=None):
+        self._res = res
+        self._model = model
+        self._backend = backend
+        self._lines = res.iter_lines()
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        try:
+            for line in self._lines:
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                if chunk.get("done"):
+                    # the last chunk carries eval_count / eval_duration for the whole generation
+                    record_generation(self._model, chunk)
+                    self.close("ok")
+                return chunk
+        except BaseException:
+            self.close("error")
+            raise
+        self.close("error")  # connection ended without a done chunk
+        raise StopIteration
+
+    def close(self, outcome="cancelled"):
+        if not self._closed:
+            self._closed = True
+            self._res.close()
+            if self._backend is not None:
+                router.release(self._backend, outcome, self._model)
+            limiter.release()
+
+    def __del__(self):
+        # safety net if a response is dropped before it is iterated
+        if hasattr(self, "_closed"):
+            self.close()
+
+
+def generate_stream(prompt, model, timeout=60, context=None):
+    """Start a streamed generation. The slot is taken here, so OllamaBusy is raised before any bytes are sent.
+
+    A stream that joins an identical one in flight replays the chunks sent so far, then follows it live.
+    """
+    if OLLAMA_COALESCE:
+        return flight.stream(_key(model, prompt, context), lambda: _generate_stream(prompt, model, timeout, context))
+    return _generate_stream(prompt, model, timeout, context)
+
+
+def _generate_stream(prompt, model, timeout, context=None):
+    payload = _payload(model, prompt, True, context)
+    backend = limiter.acquire(lambda: router.pick(model))
+    try:
+        # timeout applies between chunks, so long generations are fine as long as tokens keep coming
+        backend, res = _post(payload, model, timeout, backend, stream=True)
+    except BaseException:
+        limiter.release()
+        raise
+    return OllamaStream(res, model, backend)
+
+
+def warm_up(model, prompt="", timeout=120):
+    """Load `model` on every healthy host and evaluate `prompt` there (one token generated), so the first real
+    request neither waits for the model load nor re-evaluates a shared prompt prefix. Returns per-host timings;
+    bypasses the queue (one request per host), errors are returned, not raised.
+    """
+    payload = _payload(model, prompt, False, None)
+    payload["options"] = dict(payload.get("options") or {}, num_predict=1)
+    results = []
+    for backend in router.backends:
+        if not backend.healthy:
+            continue
+        result = {"backend": backend.url}
+        try:
+            res = session.post(backend.url + "/api/generate", json=payload, timeout=timeout)
+            res.raise_for_status()
+            data = res.json()
+            record_generation(model, data)
+            result.update(load_ms=round(data.get("load_duration", 0) / 1e6, 1),
+                          prompt_eval_ms=round(data.get("prompt_eval_duration", 0) / 1e6, 1),
+                          prompt_tokens=data.get("prompt_eval_count"))
+        except (requests.RequestException, ValueError) as e:
+            result["error"] = str(e)
+        results.append(result)
+    return results
+
+
+# ----------------------------
+# Async client (ASGI mode): same contract as generate / generate_stream, non-blocking HTTP via aiohttp
+# ----------------------------
+async_flight = AsyncSingleFlight(on_coalesced=_coalesced)
+_async_session = None
+
+
+def async_session():
+    # created on first use so it binds to the serving loop
+    global _async_session
+    if _async_session is None:
+        import aiohttp
+        _async_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+            limit=OLLAMA_POOL_SIZE * len(router.backends), limit_per_host=OLLAMA_POOL_SIZE))
+    return _async_session
+
+
+async def aclose():
+    global _async_session
+    if _async_session is not None:
+        await _async_session.close()
+        _async_session = None
+
+
+async def agenerate(prompt, model, timeout=60, context=None):
+    if OLLAMA_COALESCE:
+        return await async_flight.do(_key(model, prompt, context), lambda: _agenerate(prompt, model, timeout, context))
+    return await _agenerate(prompt, model, timeout, context)
+
+
+async def _apost(payload, model, timeout, backend):
+    """Async _post(): same outcomes and retries; returns (backend, aiohttp response)."""
+    import aiohttp
+    tried = []
+    while True:
+        res = None
+        try:
+            res = await async_session().post(backend.url + "/api/generate", json=payload, timeout=timeout)
+            res.raise_for_status()
+            return backend, res
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = res.status if res is not None else None
+            if res is not None:
+                res.release()
+            router.release(backend, _outcome(status), model)
+            tried.append(backend)
+            retry = status == 404 or (status or 0) >= 500 or isinstance(e, aiohttp.ClientConnectionError)
+            backend = _retry_on(model, tried, retry)
+            if backend is None:
+                raise
+        except BaseException:
+            if res is not None:
+                res.release()
+            router.release(backend, "cancelled")
+            raise
+
+
+async def _agenerate(prompt, model, timeout, context=None):
+    import aiohttp
+    payload = _payload(model, prompt, False, context)
+    backend = await limiter.acquire_async(lambda: router.pick(model))
+    try:
+        backend, res = await _apost(payload, model, aiohttp.ClientTimeout(total=timeout), backend)
+        try:
+            data = await res.json(content_type=None)
+        except BaseException:
+            router.release(backend, "error")
+            raise
+        finally:
+            res.release()
+        router.release(backend, "ok", model)
+    finally:
+        limiter.release()
+    record_generation(model, data)
+    return data
+
+
+class AsyncOllamaStream:
+    """`async for` over Ollama's streamed chunks; holds a generation slot until exhausted or closed."""
+
+    def __init__(self, res, model=None, backend=None):
+        self._res = res
+        self._model = model
+        self._backend = backend
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            async for line in self._res.content:
+                line = line.strip()
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                if chunk.get("done"):
+                    record_generation(self._model, chunk)
+                    await self.aclose("ok")
+                return chunk
+        except BaseException:
+            await self.aclose("error")
+            raise
+        await self.aclose("error")
+        raise StopAsyncIteration
+
+    async def aclose(self, outcome="cancelled"):
+        if not self._closed:
+            self._closed = True
+            self._res.release()
+            if self._backend is not None:
+                router.release(self._backend, outcome, self._model)
+            limiter.release()
+
+
+async def agenerate_stream(prompt, model, timeout=60, context=None):
+    """Async generate_stream(): the slot and the response headers are awaited here, before any bytes go out."""
+    if OLLAMA_COALESCE:
+        return await async_flight.stream(_key(model, prompt, context),
+                                         lambda: _agenerate_stream(prompt, model, timeout, context))
+    return await _agenerate_stream(prompt, model, timeout, context)
+
+
+async def _agenerate_stream(prompt, model, timeout, context=None):
+    import aiohttp
+    payload = _payload(model, prompt, True, context)
+    backend = await limiter.acquire_async(lambda: router.pick(model))
+    try:
+        # as in generate_stream, the timeout applies between chunks
+        backend, res = await _apost(payload, model, aiohttp.ClientTimeout(sock_read=timeout), backend)
+    except BaseException:
+        limiter.release()
+        raise
+    return AsyncOllamaStream(res, model, backend)
@@ -0,0 +1,241 @@
+# ollama_router.py — spreads generations over several Ollama hosts: least outstanding requests, model-aware
+# placement, background health probes and a per-host circuit breaker
+import os
+import time
+import threading
+
+import requests
+
+import metrics
+
+# ----------------------------
+# Config
+# ----------------------------
+# comma-separated base URLs (http://host:11434); falls back to OLLAMA_URL for a single host
+OLLAMA_URLS = os.getenv("OLLAMA_URLS", "") or os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))  # seconds between probes (0 = off)
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2"))
+# consecutive failures that open a host's circuit, and how long it stays open before one trial request
+OLLAMA_BREAKER_FAILURES = int(os.getenv("OLLAMA_BREAKER_FAILURES", "3"))
+OLLAMA_BREAKER_COOLDOWN = float(os.getenv("OLLAMA_BREAKER_COOLDOWN", "30"))
+# generations one host runs at once (the per-Ollama cap); more wait in ollama_client's queue
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+# generations in flight on a host that has the model loaded before hosts that only have it pulled get a share
+OLLAMA_SPILL_AT = int(os.getenv("OLLAMA_SPILL_AT", str(OLLAMA_MAX_CONCURRENCY)))
+# extra attempts on another host after a connection error, a 5xx or a missing model
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", "1"))
+
+
+class OllamaUnavailable(Exception):
+    """No host can take the request right now (all unhealthy or circuit open)."""
+
+
+def base_url(url):
+    # older configs point OLLAMA_URL at the generate endpoint itself
+    url = url.strip().rstrip("/")
+    for suffix in ("/api/generate", "/api"):
+        if url.endswith(suffix):
+            url = url[: -len(suffix)]
+    return url
+
+
+def model_key(name):
+    # Ollama reports "llama3" as "llama3:latest"
+    return name if ":" in name else name + ":latest"
+
+
+class Backend:
+    def __init__(self, url):
+        self.url = base_url(url)
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0  # consecutive
+        self.opened_at = None  # circuit open since (monotonic); None = closed
+        self.trial = False  # half-open: the single trial request is out
+        self.loaded = set()  # models resident in memory (/api/ps)
+        self.available = None  # models pulled on the host (/api/tags); None = not probed yet
+        self.probed_at = None
+        # metrics
+        self.requests = 0
+        self.errors = 0
+
+    def state(self, now, cooldown):
+        if self.opened_at is None:
+            return "closed"
+        return "open" if now - self.opened_at < cooldown else "half_open"
+
+
+class Router:
+    def __init__(self, urls, probe_interval=OLLAMA_HEALTH_INTERVAL, probe_timeout=OLLAMA_HEALTH_TIMEOUT,
+                 failure_threshold=OLLAMA_BREAKER_FAILURES, cooldown=OLLAMA_BREAKER_COOLDOWN, spill_at=OLLAMA_SPILL_AT,
+                 max_per_host=OLLAMA_MAX_CONCURRENCY, log=print):
+        if isinstance(urls, str):
+            urls = urls.split(",")
+        self.backends = [Backend(u) for u in urls if u.strip()]
+        if not self.backends:
+            raise ValueError("no Ollama backends configured")
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.spill_at = spill_at
+        self.max_per_host = max_per_host
+        self.log = log
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._prober = None
+        self._stop = threading.Event()
+        self._http = requests.Session()
+
+    def on_change(self, fn):
+        """Call fn() whenever a host may have gained room: a release, a probe result, a breaker transition.
+
+        ollama_client's queue subscribes its wake(), so waiting requests re-check whichever client freed the host.
+        """
+        self._listeners.append(fn)
+
+    def _changed(self):
+        # outside the lock: listeners take their own
+        for fn in self._listeners:
+            fn()
+
+    # ----------------------------
+    # Placement
+    # ----------------------------
+    def _candidates(self, model, exclude, now):
+        # call with the lock held
+        closed = [b for b in self.backends if b not in exclude and b.state(now, self.cooldown) != "open" and not b.trial]
+        # a probe can be wrong (slow host, transient error); with every host marked down, let the breaker decide
+        up = [b for b in closed if b.healthy] or closed
+        name = model_key(model)
+        # hosts known to have the model (or not probed yet), else anyone up and let Ollama answer
+        return [b for b in up if name in b.loaded or b.available is None or name in b.available] or up
+
+    def pick(self, model, exclude=()):
+        """Reserve the least busy eligible host for `model`; pair every pick with release().
+
+        Returns None while every eligible host already runs max_per_host generations (the caller waits and asks
+        again); raises OllamaUnavailable when no host is eligible at all.
+        """
+        self.start()
+        with self._lock:
+            now = time.monotonic()
+            candidates = self._candidates(model, exclude, now)
+            if not candidates:
+                raise OllamaUnavailable(f"no healthy Ollama backend for {model}")
+            candidates = [b for b in candidates if b.outstanding < self.max_per_host]
+            if not candidates:
+                return None
+            # a host with the model in memory while it has room, then fewest in flight, then fewest served
+            name = model_key(model)
+            backend = min(candidates, key=lambda b: (
+                not (name in b.loaded and b.outstanding < self.spill_at), b.outstanding, b.requests))
+            if backend.state(now, self.cooldown) == "half_open":
+                backend.trial = True
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend, outcome, model=None):
+        """outcome: "ok", "error" (5xx / connection / timeout: counts towards the breaker), "missing_model",
+        "rejected" (any other 4xx: the host is fine, the request was not) or "cancelled"."""
+        with self._lock:
+            backend.outstanding -= 1
+            backend.trial = False
+            if outcome == "ok":
+                backend.failures = 0
+                backend.opened_at = None
+                if model:
+                    backend.loaded.add(model_key(model))
+            elif outcome == "missing_model":
+                if model:
+                    backend.loaded.discard(model_key(model))
+                    if backend.available is not None:
+                        backend.available.discard(model_key(model))
+            elif outcome == "error":
+                backend.errors += 1
+                backend.failures += 1
+                # a failed half-open trial re-opens straight away
+                if backend.failures >= self.failure_threshold or backend.opened_at is not None:
+                    if backend.opened_at is None:
+                        self.log("Ollama backend circuit open:", backend.url)
+                    backend.opened_at = time.monotonic()
+        if metrics.METRICS_ENABLED:
+            metrics.OLLAMA_BACKEND_REQUESTS.inc(1, backend.url, outcome)
+        self._changed()
+
+    # ----------------------------
+    # Health probes
+    # ----------------------------
+    def _models(self, backend, path):
+        res = self._http.get(backend.url + path, timeout=self.probe_timeout)
+        res.raise_for_status()
+        return {m.get("name") or m.get("model") for m in res.json().get("models") or []}
+
+    def probe(self, backend):
+        # /api/tags is the health check; /api/ps (missing on older Ollama) only refines placement
+        try:
+            available = self._models(backend, "/api/tags")
+        except (requests.RequestException, ValueError) as e:
+            with self._lock:
+                if backend.healthy:
+                    self.log("Ollama backend unhealthy:", backend.url, e)
+                backend.healthy = False
+                backend.probed_at = time.time()
+            self._changed()
+            return False
+        try:
+            loaded = self._models(backend, "/api/ps")
+        except (requests.RequestException, ValueError):
+            loaded = set()  # unknown
+        with self._lock:
+            backend.healthy = True
+            backend.loaded = loaded
+            backend.available = available
+            backend.probed_at = time.time()
+            # host answers again: let one trial request through rather than waiting out the cooldown
+            if backend.state(time.monotonic(), self.cooldown) == "open":
+                backend.opened_at = time.monotonic() - self.cooldown
+        # also covers a cooldown that ran out since the last event: probes are the clock that wakes the queue
+        self._changed()
+        return True
+
+    def probe_all(self):
+        for backend in self.backends:
+            self.probe(backend)
+
+    def _probe_loop(self):
+        while not self._stop.is_set():
+            self.probe_all()
+            self._stop.wait(self.probe_interval)
+
+    def start(self):
+        # probes start with the first request, so importing the module stays side-effect free
+        if self._prober is not None or self.probe_interval <= 0:
+            return
+        with self._lock:
+            if self._prober is None:
+                self._prober = threading.Thread(target=self._probe_loop, name="ollama-health", daemon=True)
+                self._prober.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return [{
+                "url": b.url,
+                "healthy": b.healthy,
+                "circuit": b.state(now, self.cooldown),
+                "outstanding": b.outstanding,
+                "requests": b.requests,
+                "errors": b.errors,
+                "consecutive_failures": b.failures,
+                "loaded_models": sorted(b.loaded),
+                "available_models": None if b.available is None else len(b.available),
+                "probed_at": b.probed_at,
+            } for b in self.backends]
+
+
+router = Router(OLLAMA_URLS)
@@ -0,0 +1,40 @@
+# prompt_builder.py — chat prompts laid out from most to least stable, so consecutive requests share a long
+# prefix and Ollama (llama.cpp) can reuse the KV cache for it instead of evaluating it again:
+#
+#   system prompt                      same for every request
+#   version reference material         same for every request on the active version (context.txt fallback)
+#   conversation history               same for every turn of a session
+#   retrieved context + question       changes per request
+import os
+
+CHAT_SYSTEM_PROMPT = os.getenv(
+    "CHAT_SYSTEM_PROMPT",
+    "You are MSME ONE Assistant. Answer the user's question clearly and concisely, "
+    "using the reference material and context below when they are relevant.")
+
+
+def version_prefix(reference=""):
+    """Stable head of the prompt: the system prompt, plus the active version's standing reference text if any.
+
+    Byte-identical for a given version, which is what lets Ollama match it against the cached prefix.
+    """
+    reference = reference.strip()
+    if not reference:
+        return CHAT_SYSTEM_PROMPT + "\n\n"
+    return f"{CHAT_SYSTEM_PROMPT}\n\nReference material:\n{reference}\n\n"
+
+
+def build_prompt(query, context="", history="", reference="", continuation=False):
+    """Full prompt for one chat turn.
+
+    context: text retrieved for this query. reference: the version's fixed material (goes into the prefix).
+    continuation: the request carries Ollama's context array from the previous turn, which already holds the
+    prefix and history, so only the new part is sent.
+    """
+    parts = [] if continuation else [version_prefix(reference)]
+    if history and not continuation:
+        parts.append(f"Conversation so far:\n{history}\n\n")
+    if context:
+        parts.append(f"Use this context if relevant:\n{context}\n\n")
+    parts.append(f"User question:\n{query}")
+    return "".join(parts)
@@ -0,0 +1,211 @@
+# retriever.py — top-k retrieval over the FAISS (+ BM25) index built by ingest_dataset.py
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+from chunk_store import ChunkStore, store_exists
+from bm25_index import BM25Index, index_exists
+from model_registry import registry
+
+# ----------------------------
+# Config
+# ----------------------------
+FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "data/faiss.index")
+CHUNKS_PATH = os.getenv("CHUNKS_PATH", "data/chunks")
+# metadata.json from older ingest runs, read only when no chunk store exists
+METADATA_PATH = os.getenv("METADATA_PATH", "data/metadata.json")
+EMBED_MODEL_NAME = os.getenv("SENTENCE_TRANSFORMER_MODEL", "all-MiniLM-L6-v2")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+# query-time ANN knobs (see INDEX_TYPE in ingest_dataset.py); ignored by flat indexes
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+# hybrid retrieval: BM25 over the same chunk ids, fused with the vector hits by reciprocal rank
+BM25_PATH = os.getenv("BM25_PATH", "data/bm25")
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # hits taken from each side before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+# how often (seconds) the hot path may stat the index files to pick up a rebuild (cf. VERSIONS_RELOAD_INTERVAL)
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "2"))
+
+# rough chars-per-token for English text; good enough for budgeting prompt size
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+# ----------------------------
+# Shared embedding model (one per process, loaded on first use via model_registry)
+# ----------------------------
+def _load_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBED_MODEL_NAME)
+
+
+registry.register("embedder", _load_embedder)
+
+
+def get_embedder():
+    return registry.get("embedder")
+
+
+def embed_query(text):
+    import faiss
+    vec = get_embedder().encode([text], show_progress_bar=False, convert_to_numpy=True)
+    vec = np.ascontiguousarray(vec, dtype="float32")
+    # the index stores L2-normalized vectors (inner product == cosine)
+    faiss.normalize_L2(vec)
+    return vec
+
+
+def search_params(index, ef_search=FAISS_EF_SEARCH, nprobe=FAISS_NPROBE):
+    """faiss SearchParameters for the index type (HNSW efSearch / IVF nprobe), or None for flat."""
+    import faiss
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    return None
+
+
+def rrf_fuse(rankings, k=RRF_K):
+    """Reciprocal-rank fusion of several best-first id lists -> [(id, score)], best first."""
+    fused = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking):
+            fused[cid] = fused.get(cid, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+
+class JsonChunks:
+    """Legacy metadata.json list ({"source", "text"} per chunk id, null = removed) behind the ChunkStore API."""
+
+    def __init__(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            self.items = json.load(f)
+
+    def get(self, cid):
+        return self.items[cid] if 0 <= cid < len(self.items) else None
+
+
+# ----------------------------
+# Retriever
+# ----------------------------
+class Retriever:
+    def __init__(self, index_path=FAISS_INDEX_PATH, chunks_path=CHUNKS_PATH, metadata_path=METADATA_PATH,
+                 bm25_path=BM25_PATH):
+        self.index_path = index_path
+        self.chunks_path = chunks_path
+        self.metadata_path = metadata_path
+        self.bm25_path = bm25_path
+        self._loaded = None  # (faiss index, chunk store, bm25 index or None), swapped as one on reload
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._files = None  # (available, index mtime) as of the last stat
+        self._checked = 0.0
+
+    def _stat(self):
+        now = time.monotonic()
+        if self._files is None or now - self._checked >= INDEX_RELOAD_INTERVAL:
+            try:
+                mtime = os.path.getmtime(self.index_path)
+            except OSError:
+                mtime = None
+            available = mtime is not None and (
+                store_exists(self.chunks_path) or bool(self.metadata_path and os.path.exists(self.metadata_path)))
+            self._files, self._checked = (available, mtime), now
+        return self._files
+
+    def refresh(self):
+        """Stat the files on the next call instead of waiting out INDEX_RELOAD_INTERVAL."""
+        self._files = None
+
+    def available(self):
+        return self._stat()[0]
+
+    def version(self):
+        """Index mtime, used to tag caches so a rebuilt index never serves stale answers."""
+        return self._stat()[1]
+
+    def _ensure_loaded(self):
+        mtime = self._stat()[1]
+        if mtime is None:
+            raise FileNotFoundError(self.index_path)
+        if self._loaded is not None and mtime == self._mtime:
+            return
+        with self._lock:
+            if self._loaded is not None and mtime == self._mtime:
+                return
+            import faiss
+            index = faiss.read_index(self.index_path)
+            # the old store is not closed here: a search may still be reading it, it is freed with its last reference
+            chunks = ChunkStore(self.chunks_path) if store_exists(self.chunks_path) else JsonChunks(self.metadata_path)
+            bm25 = BM25Index(self.bm25_path) if self.bm25_path and index_exists(self.bm25_path) else None
+            self._loaded, self._mtime = (index, chunks, bm25), mtime
+
+    def search(self, query, k=RETRIEVAL_TOP_K, token_budget=CONTEXT_TOKEN_BUDGET, vec=None,
+               ef_search=FAISS_EF_SEARCH, nprobe=FAISS_NPROBE):
+        """Return the top-k chunks for `query`, trimmed to `token_budget` tokens.
+
+        With a BM25 index next to the FAISS one (and HYBRID_SEARCH on), `score` is the fused RRF score.
+
+        `vec` is an already computed embed_query(query) result, if the caller has one.
+        """
+        t0 = time.perf_counter()
+        self._ensure_loaded()
+        index, store, bm25 = self._loaded
+        hybrid = HYBRID_SEARCH and bm25 is not None
+        n = max(k, HYBRID_CANDIDATES) if hybrid else k
+        if vec is None:
+            vec = embed_query(query)
+        params = search_params(index, ef_search, nprobe)
+        if params is None:
+            scores, ids = index.search(vec, n)
+        else:
+            scores, ids = index.search(vec, n, params=params)
+
+        lexical_ms = None
+        hits = [(int(i), float(s)) for s, i in zip(scores[0], ids[0]) if i >= 0]
+        if hybrid:
+            t1 = time.perf_counter()
+            lexical = bm25.search(query, n)
+            lexical_ms = round((time.perf_counter() - t1) * 1000, 2)
+            hits = rrf_fuse([[i for i, _ in hits], [i for i, _ in lexical]])
+        hits = hits[:k]
+
+        chunks = []
+        used = 0
+        for idx, score in hits:
+            meta = store.get(idx)
+            if meta is None:
+                # padding id, or chunk removed by an incremental re-index
+                continue
+            text = meta.get("text", "")
+            remaining = token_budget - used
+            if remaining <= 0:
+                break
+            if estimate_tokens(text) > remaining:
+                # only the best hit gets truncated; lower-ranked ones are skipped
+                if chunks:
+                    break
+                text = text[:remaining * CHARS_PER_TOKEN]
+            used += estimate_tokens(text)
+            chunks.append({"id": idx, "source": meta.get("source"), "text": text, "score": score})
+
+        return {
+            "chunks": chunks,
+            "context": "\n\n".join(c["text"] for c in chunks),
+            "tokens": used,
+            "latency_ms": round((time.perf_counter() - t0) * 1000, 2),
+            "lexical_ms": lexical_ms,
+        }
+
+
+# process-wide default retriever over the ingest_dataset.py output
+default_retriever = Retriever()
@@ -3,69 +3,70 @@ import axios from "axios";
 import "./ChatLogs.css";
 import { useNavigate } from "react-router-dom";
 
+const PAGE_SIZE = 50;
+
 export default function AdminChatLogs() {
   const navigate = useNavigate();
   const [logs, setLogs] = useState([]);
-  const [filtered, setFiltered] = useState([]);
+  const [summary, setSummary] = useState({ total: 0, positive: 0, negative: 0, none: 0 });
+  const [cursor, setCursor] = useState(null);
   const [modeFilter, setModeFilter] = useState("all");
   const [fbFilter, setFbFilter] = useState("all");
+  const [langFilter, setLangFilter] = useState("all");
+  const [fromDate, setFromDate] = useState("");
+  const [toDate, setToDate] = useState("");
+  const [search, setSearch] = useState("");
+  const [query, setQuery] = useState("");
   const [loading, setLoading] = useState(false);
 
   // No bearer token (backend uses session cookie)
   const authHeader = useMemo(() => ({}), []);
 
-  const loadLogs = useCallback(async () => {
+  // filtering happens on the server; only one page is held here at a time (plus pages appended by "Load more")
+  const filters = useMemo(() => {
+    const f = { model: modeFilter, feedback: fbFilter, lang: langFilter };
+    if (fromDate) f.from = fromDate;
+    if (toDate) f.to = toDate;
+    if (query) f.q = query;
+    return f;
+  }, [modeFilter, fbFilter, langFilter, fromDate, toDate, query]);
+
+  const loadLogs = useCallback(async (after = null) => {
     setLoading(true);
     try {
+      const params = { ...filters, limit: PAGE_SIZE };
+      if (after) params.cursor = after;
       const res = await axios.get("/api/admin/chat/logs", {
+        params,
         withCredentials: true,
         headers: authHeader
       });
 
-      setLogs(res.data.logs || []);
-      setFiltered(res.data.logs || []);
+      const page = res.data.logs || [];
+      setLogs(prev => (after ? [...prev, ...page] : page));
+      setCursor(res.data.next_cursor || null);
+      if (res.data.summary) setSummary(res.data.summary);
     } catch (e) {
       console.error("Load logs error", e);
       if (e.response && e.response.status === 401) navigate("/admin");
     } finally {
       setLoading(false);
     }
-  }, [authHeader, navigate]);
+  }, [authHeader, navigate, filters]);
 
   useEffect(() => { loadLogs(); }, [loadLogs]);
 
-  // Filtering
- useEffect(() => {
-  let d = [...logs];
-
-  // -------- MODEL FILTER --------
-  if (modeFilter !== "all") {
-    d = d.filter(l => {
-      const m = (l.model || "").toLowerCase();
-      const sel = modeFilter.toLowerCase();
-
-      // match by prefix or substring
-      return m.includes(sel) || sel.includes(m);
-    });
-  }
-
-  // -------- FEEDBACK FILTER --------
-  if (fbFilter !== "all") {
-    if (fbFilter === "none") d = d.filter(l => !l.feedback);
-    else d = d.filter(l => l.feedback === fbFilter);
-  }
+  const exportUrl = (format) =>
+    `/api/admin/chat/logs/export?${new URLSearchParams({ ...filters, format }).toString()}`;
 
-  setFiltered(d);
-}, [modeFilter, fbFilter, logs]);
-
-
-  const setFeedback = async (ts, fb) => {
+  const setFeedback = async (id, fb) => {
     try {
       await axios.post("/api/chat/feedback", 
-        { ts, feedback: fb }, 
+        { id, feedback: fb }, 
         { withCredentials: true }
       );
-      await loadLogs();
+      // update in place so pages fetched with "Load more" stay on screen
+      setLogs(prev => prev.map(l => (l.id === id ? { ...l, feedback: fb === "none" ? null : fb } : l)));
     } catch (e) {
       console.error("Feedback error", e);
       alert("Failed to set feedback");
@@ -80,16 +81,18 @@ export default function AdminChatLogs() {
       <div className="top-row">
         <h1>📊 User Chat Logs</h1>
         <div className="top-buttons">
-          <button onClick={loadLogs}>{loading ? "Refreshing..." : "Refresh"}</button>
+          <button onClick={() => loadLogs()}>{loading ? "Refreshing..." : "Refresh"}</button>
+          <a href={exportUrl("csv")}><button>Export CSV</button></a>
+          <a href={exportUrl("ndjson")}><button>Export NDJSON</button></a>
           <button onClick={goToAdmin}>← Back to Dashboard</button>
         </div>
       </div>
 
       <div className="stats-box">
-        <div className="stat-card"><h2>{logs.length}</h2><p>Total Conversations</p></div>
-        <div className="stat-card green"><h2>{logs.filter(l => l.feedback === "positive").length}</h2><p>Positive</p></div>
-        <div className="stat-card red"><h2>{logs.filter(l => l.feedback === "negative").length}</h2><p>Negative</p></div>
-        <div className="stat-card gray"><h2>{logs.filter(l => !l.feedback).length}</h2><p>No Feedback</p></div>
+        <div className="stat-card"><h2>{summary.total}</h2><p>Total Conversations</p></div>
+        <div className="stat-card green"><h2>{summary.positive}</h2><p>Positive</p></div>
+        <div className="stat-card red"><h2>{summary.negative}</h2><p>Negative</p></div>
+        <div className="stat-card gray"><h2>{summary.none}</h2><p>No Feedback</p></div>
       </div>
 
       <div className="filters-row">
@@ -104,6 +107,20 @@ export default function AdminChatLogs() {
           <option value="gemma2:2b">gemma2:2B</option>
           <option value="phi3.1:3b">Phi3.1:3B</option>
         </select>
+        <select value={langFilter} onChange={e => setLangFilter(e.target.value)}>
+          <option value="all">All Languages</option>
+          <option value="en">English</option>
+          <option value="te">Telugu</option>
+        </select>
+        <input type="date" value={fromDate} onChange={e => setFromDate(e.target.value)} />
+        <input type="date" value={toDate} onChange={e => setToDate(e.target.value)} />
+        <input
+          type="text"
+          placeholder="Search questions and answers..."
+          value={search}
+          onChange={e => setSearch(e.target.value)}
+          onKeyDown={e => e.key === "Enter" && setQuery(search.trim())}
+        />
       </div>
 
       <table className="logs-table">
@@ -117,25 +134,33 @@ export default function AdminChatLogs() {
           </tr>
         </thead>
         <tbody>
-          {filtered.map((l, i) => (
-            <tr key={i}>
+          {logs.map(l => (
+            <tr key={l.id}>
               <td>{new Date(l.ts * 1000).toLocaleString()}</td>
               <td style={{ maxWidth: 500 }}>{l.question}</td>
               <td>{l.model}</td>
               <td>{l.feedback === "positive" ? "👍" : l.feedback === "negative" ? "👎" : "⚪"}</td>
               <td>
                 <button onClick={() => viewDetails(l.ts)}>Details</button>
-                <button onClick={() => setFeedback(l.ts, "positive")}>👍</button>
-                <button onClick={() => setFeedback(l.ts, "negative")}>👎</button>
-                <button onClick={() => setFeedback(l.ts, "none")}>Clear</button>
+                <button onClick={() => setFeedback(l.id, "positive")}>👍</button>
+                <button onClick={() => setFeedback(l.id, "negative")}>👎</button>
+                <button onClick={() => setFeedback(l.id, "none")}>Clear</button>
               </td>
             </tr>
           ))}
-          {filtered.length === 0 && !loading && (
+          {logs.length === 0 && !loading && (
             <tr><td colSpan="5" style={{ textAlign: 'center', padding: '20px' }}>No chat logs found.</td></tr>
           )}
         </tbody>
       </table>
+
+      {cursor && (
+        <div style={{ textAlign: "center", padding: "16px" }}>
+          <button onClick={() => loadLogs(cursor)} disabled={loading}>
+            {loading ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
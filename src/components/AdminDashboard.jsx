@@ -32,6 +32,9 @@ export default function AdminDashboard() {
   const [versionHistory, setVersionHistory] = useState([]);
   const [loadingHistory, setLoadingHistory] = useState(false);
 
+  const [analytics, setAnalytics] = useState(null);
+  const [analyticsGrain, setAnalyticsGrain] = useState("day");
+
   // ---------------------------------------------------------
   // INIT
   // ---------------------------------------------------------
@@ -56,6 +59,7 @@ export default function AdminDashboard() {
         }
 
         await refreshHistory();
+        await refreshAnalytics();
       } catch (err) {
         console.error("Init error", err);
       }
@@ -80,6 +84,26 @@ export default function AdminDashboard() {
     }
   };
 
+  // ---------------------------------------------------------
+  // LOAD ANALYTICS (server-side rollups)
+  // ---------------------------------------------------------
+  const refreshAnalytics = async (grain = analyticsGrain) => {
+    try {
+      const a = await axios.get("/api/admin/analytics", { params: { grain } });
+      setAnalytics(a.data);
+    } catch {
+      setAnalytics(null);
+    }
+  };
+
+  const changeGrain = (grain) => {
+    setAnalyticsGrain(grain);
+    refreshAnalytics(grain);
+  };
+
+  const pct = (ratio) => (ratio == null ? "—" : `${Math.round(ratio * 100)}%`);
+  const ms = (v) => (v == null ? "—" : `${v} ms`);
+
   // ---------------------------------------------------------
   // UPDATE MODEL FIELD
   // ---------------------------------------------------------
@@ -120,7 +144,16 @@ export default function AdminDashboard() {
         }
       });
 
-      updateField(modelKey, "progress", 90);
+      // training runs as a background job; poll until it finishes
+      const jobId = res.data?.job_id;
+      let job = null;
+      while (jobId) {
+        await new Promise(r => setTimeout(r, 1000));
+        job = (await axios.get(`/api/admin/train/jobs/${jobId}`)).data;
+        updateField(modelKey, "progress", 60 + Math.round((job.progress || 0) * 0.4));
+        if (["succeeded", "failed", "cancelled"].includes(job.state)) break;
+      }
+      if (job && job.state !== "succeeded") throw new Error(job.error || `Training ${job.state}`);
 
       const info = await axios.get(`/api/admin/train/info?model=${modelKey}`);
       updateField(modelKey, "info", info.data?.trained !== false ? info.data : null);
@@ -131,7 +164,7 @@ export default function AdminDashboard() {
       setTimeout(() => updateField(modelKey, "progress", 0), 700);
       updateField(modelKey, "loading", false);
 
-      alert(res.data?.message || "Trained successfully.");
+      alert(job?.warning || `Trained ${modelKey}:${m.version}.`);
     } catch (err) {
       console.error("Train error:", err);
       updateField(modelKey, "loading", false);
@@ -430,6 +463,49 @@ export default function AdminDashboard() {
           )}
         </div>
 
+        {/* ANALYTICS */}
+        <div className="admin-card">
+          <div className="flex-between">
+            <h2 className="card-title">📊 Usage</h2>
+            <div>
+              <select value={analyticsGrain} onChange={(e) => changeGrain(e.target.value)}>
+                <option value="hour">Last 48 hours (hourly)</option>
+                <option value="day">Last 30 days (daily)</option>
+              </select>
+              <button className="refresh-btn" onClick={() => refreshAnalytics()}>Refresh</button>
+            </div>
+          </div>
+
+          {!analytics || !analytics.totals.count ? (
+            <p className="no-version">No conversations in this period.</p>
+          ) : (
+            <>
+              <p>
+                <b>{analytics.totals.count}</b> conversations • 👍 {pct(analytics.totals.positive_ratio)} of rated •
+                avg latency {ms(analytics.totals.avg_latency_ms)}
+              </p>
+              <table style={{ width: "100%", textAlign: "left" }}>
+                <thead>
+                  <tr><th>Model / Version</th><th>Count</th><th>👍</th><th>👎</th><th>👍 ratio</th><th>Avg latency</th></tr>
+                </thead>
+                <tbody>
+                  {[...analytics.by_model.map(r => ({ ...r, label: r.model || "unknown" })),
+                    ...analytics.by_version.map(r => ({ ...r, label: `↳ ${r.version || "base index"}` }))].map(r => (
+                    <tr key={r.label}>
+                      <td>{r.label}</td>
+                      <td>{r.count}</td>
+                      <td>{r.positive}</td>
+                      <td>{r.negative}</td>
+                      <td>{pct(r.positive_ratio)}</td>
+                      <td>{ms(r.avg_latency_ms)}</td>
+                    </tr>
+                  ))}
+                </tbody>
+              </table>
+            </>
+          )}
+        </div>
+
         <footer className="admin-footer">© 2025 MSME ONE — All Rights Reserved.</footer>
       </div>
     </div>
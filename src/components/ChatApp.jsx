@@ -4,6 +4,12 @@ import axios from "axios";
 import ChatMessage from "./ChatMessage.jsx";
 import "./ChatApp.css";
 
+// conversation id for server-side chat memory; a new one starts a fresh conversation
+const newSessionId = () =>
+  window.crypto && window.crypto.randomUUID
+    ? window.crypto.randomUUID()
+    : Date.now().toString(36) + Math.random().toString(36).slice(2);
+
 function ChatApp() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
@@ -16,6 +22,7 @@ function ChatApp() {
   const [language, setLanguage] = useState("en");
 
   const recorderRef = useRef(null);
+  const sessionRef = useRef(newSessionId());
 
   // Static Text Content (Does Not Change → ESLint Ignore Required)
   const textContent = {
@@ -44,6 +51,7 @@ function ChatApp() {
   // eslint-disable-next-line react-hooks/exhaustive-deps
   useEffect(() => {
     setMessages([{ sender: "bot", text: textContent[language].greeting }]);
+    sessionRef.current = newSessionId();
   }, [language]);
 
   // ============================
@@ -53,90 +61,162 @@ function ChatApp() {
     if (!input.trim()) return;
 
     const userMsg = input;
-    setMessages(prev => [...prev, { sender: "user", text: userMsg }]);
+    // placeholder bot bubble that fills in as tokens stream in
+    const streamKey = Date.now();
+    setMessages(prev => [
+      ...prev,
+      { sender: "user", text: userMsg },
+      { sender: "bot", text: "", streamKey }
+    ]);
     setInput("");
 
+    const updateBot = (patch) =>
+      setMessages(prev => prev.map(m => (m.streamKey === streamKey ? { ...m, ...patch } : m)));
+
     try {
-      const res = await axios.post("http://localhost:5000/api/chat", {
-        message: userMsg,
-        lang: language,
-        model,
-        feature,
-        version,
-        user_id: "user-123"
+      // fetch (not axios) so the NDJSON body can be read incrementally
+      const res = await fetch("http://localhost:5000/api/chat", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          message: userMsg,
+          lang: language,
+          model,
+          feature,
+          version,
+          user_id: "user-123",
+          session_id: sessionRef.current,
+          stream: true
+        })
       });
-
-      setMessages(prev => [
-        ...prev,
-        {
-          sender: "bot",
-          text: res.data.reply,
-          ts: res.data.ts
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let text = "";
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const evt = JSON.parse(line);
+          if (evt.token) {
+            text += evt.token;
+            updateBot({ text });
+          }
+          if (evt.done) updateBot({ text: evt.reply, ts: evt.ts, id: evt.id });
         }
-      ]);
+      }
     } catch (err) {
       console.error("sendMessage error:", err);
-      setMessages(prev => [...prev, { sender: "bot", text: "⚠ Server not reachable." }]);
+      updateBot({ text: "⚠ Server not reachable." });
     }
   };
 
   // ============================
-  // START VOICE RECORDING
+  // VOICE RECORDING (chunked)
+  // The recorder is restarted every SEGMENT_MS so each piece is a standalone audio file;
+  // pieces are posted in order to /api/transcribe/stream and transcribed while recording goes on.
   // ============================
+  const SEGMENT_MS = 3000;
+  const MAX_RECORDING_MS = 60000;
+
+  const stopRecording = () => {
+    const rec = recorderRef.current;
+    if (rec) rec.stopping = true;
+    if (rec && rec.recorder.state !== "inactive") rec.recorder.stop();
+    setRecording(false);
+  };
+
   const startRecording = async () => {
+    if (recorderRef.current) {
+      stopRecording();
+      return;
+    }
+    let stream;
     try {
-      const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-      const recorder = new MediaRecorder(stream);
-      recorderRef.current = recorder;
-
-      const chunks = [];
-
-      recorder.ondataavailable = (e) => chunks.push(e.data);
+      stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+    } catch (err) {
+      console.error("Microphone Error:", err);
+      alert("Microphone access denied.");
+      return;
+    }
 
-      recorder.onstop = async () => {
-        const audioBlob = new Blob(chunks, { type: "audio/wav" });
+    const streamKey = Date.now();
+    setMessages(prev => [...prev, { sender: "user", text: "🎙️ …", streamKey }]);
+    const updateUser = (patch) =>
+      setMessages(prev => prev.map(m => (m.streamKey === streamKey ? { ...m, ...patch } : m)));
+
+    const rec = { stopping: false, recorder: null };
+    recorderRef.current = rec;
+    let seq = 0;
+    let session = null;
+    let failed = false;
+    let sending = Promise.resolve();
+
+    // segments are chained so they reach the server in order
+    const sendSegment = (blob, final) => {
+      const n = seq++;
+      sending = sending.then(async () => {
+        if (failed) return;
         const formData = new FormData();
-
-        formData.append("file", audioBlob);
+        if (blob) formData.append("file", blob);
+        formData.append("seq", n);
+        if (session) formData.append("session", session);
+        if (final) formData.append("final", "1");
         formData.append("lang", language);
         formData.append("model", model);
-        formData.append("feature", feature);
-        formData.append("version", version);
         formData.append("user_id", "user-123");
-
         try {
-          const res = await axios.post("http://localhost:5000/api/transcribe", formData, {
+          const res = await axios.post("http://localhost:5000/api/transcribe/stream", formData, {
             headers: { "Content-Type": "multipart/form-data" },
           });
-
-          const transcribed = res.data.text || "(voice)";
-          const reply = res.data.reply || "No reply.";
-
-          setMessages(prev => [
-            ...prev,
-            { sender: "user", text: transcribed },
-            { sender: "bot", text: reply, ts: res.data.ts }
-          ]);
-
+          session = res.data.session;
+          if (res.data.text) updateUser({ text: res.data.text });
+          if (final) {
+            updateUser({ text: res.data.text || "(voice)" });
+            setMessages(prev => [
+              ...prev,
+              { sender: "bot", text: res.data.reply || "No reply.", ts: res.data.ts, id: res.data.id }
+            ]);
+          }
         } catch (err) {
+          failed = true;
           console.error("transcribe error:", err);
           alert("Voice processing failed.");
         }
-      };
+      });
+    };
 
+    const recordSegment = () => {
+      const recorder = new MediaRecorder(stream);
+      rec.recorder = recorder;
+      const chunks = [];
+      recorder.ondataavailable = (e) => chunks.push(e.data);
+      recorder.onstop = () => {
+        const blob = new Blob(chunks, { type: recorder.mimeType });
+        if (rec.stopping) {
+          stream.getTracks().forEach(t => t.stop());
+          sendSegment(blob, true);
+          recorderRef.current = null;
+        } else {
+          sendSegment(blob, false);
+          recordSegment();
+        }
+      };
       recorder.start();
-      setRecording(true);
-
-      // auto stop after 4.5s
-      setTimeout(() => {
-        if (recorder.state !== "inactive") recorder.stop();
-        setRecording(false);
-      }, 4500);
+      setTimeout(() => recorder.state !== "inactive" && recorder.stop(), SEGMENT_MS);
+    };
 
-    } catch (err) {
-      console.error("Microphone Error:", err);
-      alert("Microphone access denied.");
-    }
+    recordSegment();
+    setRecording(true);
+    setTimeout(() => recorderRef.current === rec && stopRecording(), MAX_RECORDING_MS);
   };
 
   return (
@@ -182,6 +262,7 @@ function ChatApp() {
             sender={msg.sender}
             text={msg.text}
             ts={msg.ts}    // FEEDBACK SUPPORT
+            id={msg.id}
           />
         ))}
       </div>
@@ -2,7 +2,7 @@ import React, { useState } from "react";
 import axios from "axios";
 import "./ChatApp.css";
 
-function ChatMessage({ sender, text, ts }) {
+function ChatMessage({ sender, text, ts, id }) {
   const [feedback, setFeedback] = useState(null);
   const [showMsg, setShowMsg] = useState(false);
   const [displayMsg, setDisplayMsg] = useState("");
@@ -17,6 +17,7 @@ function ChatMessage({ sender, text, ts }) {
       await axios.post(
         "http://localhost:5000/api/chat/feedback",
         {
+          id,
           ts,
           feedback: type === "like" ? "positive" : "negative"
         },
@@ -0,0 +1,194 @@
+# tests/test_ollama_router.py — ollama_router.py + the generation queue against stub Ollama servers on localhost
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OLLAMA_HEALTH_INTERVAL", "0")  # probes are driven by the tests
+
+from ollama_router import Router, OllamaUnavailable  # noqa: E402
+from ollama_client import GenerationLimiter, OllamaBusy  # noqa: E402
+
+
+class StubOllama:
+    """Answers /api/tags, /api/ps (unless has_ps=False) and /api/generate with `status` after `delay` seconds."""
+
+    def __init__(self, models=("m:latest",), has_ps=True, status=200, delay=0.0):
+        self.models = list(models)
+        self.has_ps = has_ps
+        self.status = status
+        self.delay = delay
+        self.active = self.peak = self.generations = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, obj):
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/ps" and not stub.has_ps:
+                    return self._send(404, {"error": "not found"})
+                self._send(200, {"models": [{"name": m} for m in stub.models]})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with stub._lock:
+                    stub.active += 1
+                    stub.generations += 1
+                    stub.peak = max(stub.peak, stub.active)
+                time.sleep(stub.delay)
+                with stub._lock:
+                    stub.active -= 1
+                if stub.status != 200:
+                    return self._send(stub.status, {"error": "stub"})
+                self._send(200, {"response": "ok", "done": True})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stubs():
+    made = []
+
+    def make(**kwargs):
+        made.append(StubOllama(**kwargs))
+        return made[-1]
+    yield make
+    for stub in made:
+        stub.close()
+
+
+def make_router(*hosts, **kwargs):
+    kwargs.setdefault("probe_interval", 0)
+    return Router([h.url for h in hosts], log=lambda *a: None, **kwargs)
+
+
+def test_probe_without_api_ps_keeps_host_healthy(stubs):
+    router = make_router(stubs(has_ps=False))
+    assert router.probe(router.backends[0])
+    backend = router.backends[0]
+    assert backend.healthy and backend.loaded == set() and backend.available == {"m:latest"}
+
+
+def test_probe_of_unreachable_host_marks_it_down(stubs):
+    stub = stubs()
+    router = make_router(stub)
+    stub.close()
+    assert not router.probe(router.backends[0])
+    assert not router.backends[0].healthy
+
+
+def test_pick_respects_per_host_cap(stubs):
+    router = make_router(stubs(), stubs(), max_per_host=1)
+    a, b = router.pick("m"), router.pick("m")
+    assert {a, b} == set(router.backends)
+    assert router.pick("m") is None
+    router.release(a, "ok", "m")
+    assert router.pick("m") is a
+
+
+def test_client_errors_do_not_open_the_circuit(stubs):
+    router = make_router(stubs(), failure_threshold=2)
+    backend = router.backends[0]
+    for _ in range(5):
+        router.release(router.pick("m"), "rejected", "m")
+    assert router.stats()[0]["circuit"] == "closed"
+    for _ in range(2):
+        router.release(router.pick("m"), "error", "m")
+    assert router.stats()[0]["circuit"] == "open"
+    with pytest.raises(OllamaUnavailable):
+        router.pick("m")
+    assert backend.outstanding == 0
+
+
+def test_generations_never_exceed_the_cap_on_any_host(stubs, monkeypatch):
+    import ollama_client
+    hosts = [stubs(delay=0.1), stubs(delay=0.1)]
+    router = make_router(*hosts, max_per_host=2)
+    limiter = GenerationLimiter(4, max_queue=32, queue_timeout=10)
+    router.on_change(limiter.wake)
+    monkeypatch.setattr(ollama_client, "router", router)
+    monkeypatch.setattr(ollama_client, "limiter", limiter)
+    errors = []
+
+    def one(i):
+        try:
+            ollama_client._generate(f"prompt {i}", "m", 10)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert [h.peak for h in hosts] == [2, 2]
+    assert sum(h.generations for h in hosts) == 16
+    assert limiter.inflight == 0 and all(b.outstanding == 0 for b in router.backends)
+
+
+def test_host_freed_by_a_thread_wakes_an_async_waiter(stubs):
+    router = make_router(stubs(), max_per_host=1)
+    limiter = GenerationLimiter(2, queue_timeout=5)  # a free slot, but the only host is busy
+    router.on_change(limiter.wake)
+    held = router.pick("m")
+
+    async def wait():
+        t0 = time.monotonic()
+        backend = await limiter.acquire_async(lambda: router.pick("m"))
+        return backend, time.monotonic() - t0
+
+    async def main():
+        waiter = asyncio.ensure_future(wait())
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(router.release, held, "ok", "m")
+        return await waiter
+    backend, waited = asyncio.run(main())
+    assert backend is held and waited < 1
+
+
+def test_probe_reopening_a_host_wakes_waiters(stubs):
+    router = make_router(stubs(), stubs(), max_per_host=1, cooldown=60)
+    limiter = GenerationLimiter(2, queue_timeout=5)
+    router.on_change(limiter.wake)
+    busy, broken = router.backends
+    busy.outstanding = 1
+    broken.opened_at = time.monotonic()  # circuit open for the next minute
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(limiter.acquire(lambda: router.pick("m"))))
+    waiter.start()
+    time.sleep(0.05)
+    assert not got
+    router.probe(broken)  # answers again: half-open, one trial request allowed
+    waiter.join(1)
+    assert got == [broken] and broken.trial
+
+
+def test_queue_times_out_when_no_host_frees_up(stubs):
+    router = make_router(stubs(), max_per_host=1)
+    limiter = GenerationLimiter(2, queue_timeout=0.2)
+    router.on_change(limiter.wake)
+    router.pick("m")
+    with pytest.raises(OllamaBusy):
+        asyncio.run(limiter.acquire_async(lambda: router.pick("m")))
+    assert limiter.stats()["timed_out"] == 1 and limiter.waiting == 0
@@ -0,0 +1,288 @@
+# train_jobs.py — background training jobs (PDF extraction, chunking, indexing) for /api/admin/train
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS", "1"))
+# finished jobs kept for status queries
+TRAIN_JOBS_KEEP = int(os.getenv("TRAIN_JOBS_KEEP", "50"))
+# chunks embedded per step; cancellation is checked between steps
+TRAIN_EMBED_STEP = int(os.getenv("TRAIN_EMBED_STEP", "512"))
+
+# job states
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+TERMINAL = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# ----------------------------
+# Work steps
+# ----------------------------
+def extract_pdf_text(path, on_page=None, should_stop=None):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    total = len(reader.pages)
+    parts = []
+    for i, page in enumerate(reader.pages):
+        if should_stop and should_stop():
+            raise JobCancelled()
+        parts.append(page.extract_text() or "")
+        if on_page:
+            on_page(i + 1, total)
+    return "".join(parts)
+
+
+class StagedFiles:
+    """Outputs written under temp names: commit() moves them into place in the order they were added,
+    discard() deletes whatever was not committed."""
+
+    def __init__(self):
+        self._moves = []  # (temp path, final path)
+
+    def add(self, tmp, path):
+        self._moves.append((tmp, path))
+        return tmp
+
+    def commit(self):
+        while self._moves:
+            tmp, path = self._moves.pop(0)
+            os.replace(tmp, path)
+
+    def discard(self):
+        for tmp, _ in self._moves:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        self._moves = []
+
+
+def build_version_index(version_dir, texts, staged, should_stop=None):
+    """Chunk and embed the version's documents into a chunk store (chunks.*), a BM25 index (bm25.*) and
+    faiss.index next to the PDFs. Files are only staged in `staged` (index last); nothing live changes here.
+
+    `texts` is a list of (filename, raw_text). Returns the number of chunks indexed.
+    """
+    import numpy as np
+    import faiss
+    from ingest_dataset import clean_text, split_chunks, with_overlap
+    from chunk_store import ChunkStoreWriter, store_files
+    from bm25_index import build_bm25, index_files
+    from retriever import get_embedder
+
+    def check():
+        if should_stop and should_stop():
+            raise JobCancelled()
+
+    chunks, bases = [], []
+    prefix = os.path.join(version_dir, "chunks")
+    store = ChunkStoreWriter(prefix)
+    try:
+        for filename, text in texts:
+            check()
+            base = split_chunks(clean_text(text))
+            for i, (b, c) in enumerate(zip(base, with_overlap(base))):
+                store.put(len(chunks), b, filename, len(chunks) - 1 if i else -1)
+                chunks.append(c)
+                bases.append(b)
+        if not chunks:
+            store.abort()
+            return 0
+
+        embedder = get_embedder()
+        parts = []
+        for i in range(0, len(chunks), TRAIN_EMBED_STEP):
+            check()
+            parts.append(embedder.encode(chunks[i:i + TRAIN_EMBED_STEP], batch_size=64, show_progress_bar=False,
+                                         convert_to_numpy=True))
+        emb = np.ascontiguousarray(np.concatenate(parts), dtype="float32")
+        faiss.normalize_L2(emb)
+        index = faiss.IndexFlatIP(emb.shape[1])
+        index.add(emb)
+        check()
+    except BaseException:
+        # no half-written chunks.tmp.* left next to the PDFs
+        store.abort()
+        raise
+
+    store.close(commit=False)
+    for tmp, path in zip(store_files(store.staging), store_files(prefix)):
+        staged.add(tmp, path)
+    bm25 = os.path.join(version_dir, "bm25")
+    build_bm25(bm25 + ".tmp", enumerate(bases))
+    for tmp, path in zip(index_files(bm25 + ".tmp"), index_files(bm25)):
+        staged.add(tmp, path)
+    # last: retrievers reload when the index mtime changes
+    index_path = os.path.join(version_dir, "faiss.index")
+    faiss.write_index(index, staged.add(index_path + ".tmp", index_path))
+    return len(chunks)
+
+
+# ----------------------------
+# Job + manager
+# ----------------------------
+class TrainJob:
+    def __init__(self, model, version, description, version_dir, files):
+        self.id = uuid.uuid4().hex
+        self.model = model
+        self.version = version
+        self.description = description
+        self.version_dir = version_dir
+        self.files = [{"name": f, "status": "pending", "pages": 0, "pages_done": 0, "chars": 0, "error": None} for f in files]
+        self.state = QUEUED
+        self.stage = None
+        self.error = None
+        self.warning = None
+        self.chunks = 0
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = threading.Event()
+
+    def progress(self):
+        total = sum(max(f["pages"], 1) for f in self.files)
+        done = sum(f["pages_done"] if f["status"] != "done" else max(f["pages"], 1) for f in self.files)
+        # extraction is ~80% of the work, chunking + indexing the rest
+        pct = 80 * done / total if total else 0
+        if self.stage == "indexing":
+            pct = 85
+        if self.state == SUCCEEDED:
+            pct = 100
+        return round(pct, 1)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "model": self.model,
+            "version": self.version,
+            "state": self.state,
+            "stage": self.stage,
+            "progress": self.progress(),
+            "files": [dict(f) for f in self.files],
+            "chunks": self.chunks,
+            "error": self.error,
+            "warning": self.warning,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class TrainJobManager:
+    def __init__(self, on_success, workers=TRAIN_WORKERS, log=print):
+        """`on_success(job)` runs on the worker after a job completes (activates the version)."""
+        self.on_success = on_success
+        self.log = log
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="train")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, model, version, description, version_dir, files):
+        job = TrainJob(model, version, description, version_dir, files)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted(jobs, key=lambda j: j.created, reverse=True)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.state in TERMINAL:
+            return job
+        job.cancel_requested.set()
+        if job.state == QUEUED:
+            # not picked up yet; the worker will skip it
+            job.state, job.finished = CANCELLED, time.time()
+        return job
+
+    def _prune(self):
+        done = sorted((j for j in self._jobs.values() if j.state in TERMINAL), key=lambda j: j.created)
+        for j in done[:max(0, len(done) - TRAIN_JOBS_KEEP)]:
+            del self._jobs[j.id]
+
+    def _run(self, job):
+        if job.cancel_requested.is_set():
+            return
+        job.state, job.started = RUNNING, time.time()
+        should_stop = job.cancel_requested.is_set
+        # everything is written aside and swapped in just before activation, so a cancelled or failed job never
+        # touches the files of a version that may already be live (retraining the same version)
+        context, index = StagedFiles(), StagedFiles()
+        try:
+            job.stage = "extracting"
+            texts = []
+            for f in job.files:
+                if should_stop():
+                    raise JobCancelled()
+                f["status"] = "extracting"
+
+                def on_page(done, total, f=f):
+                    f["pages_done"], f["pages"] = done, total
+
+                try:
+                    text = extract_pdf_text(os.path.join(job.version_dir, f["name"]), on_page, should_stop)
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    # one bad PDF should not sink the whole version
+                    self.log("pdf extract error:", f["name"], e)
+                    f["status"], f["error"] = "error", str(e)
+                    continue
+                f["status"], f["chars"] = "done", len(text)
+                texts.append((f["name"], text))
+
+            if should_stop():
+                raise JobCancelled()
+            if not texts:
+                raise RuntimeError("no text could be extracted from the uploaded PDFs")
+            # context.txt stays as the plain-text fallback for retrieval
+            context_path = os.path.join(job.version_dir, "context.txt")
+            with open(context.add(context_path + ".tmp", context_path), "w", encoding="utf-8") as cf:
+                cf.write("".join(t + "\n\n" for _, t in texts))
+
+            job.stage = "indexing"
+            try:
+                job.chunks = build_version_index(job.version_dir, texts, index, should_stop)
+            except JobCancelled:
+                raise
+            except Exception as e:
+                # missing packages, NLTK data or an embedding model that cannot download: the version is still
+                # usable through context.txt, so it is activated unindexed rather than failed
+                self.log("train job indexing error:", job.id, e)
+                index.discard()
+                job.chunks = 0
+                # NLTK wraps its message in a banner of asterisks; the first real line is enough here
+                reason = next((l.strip() for l in str(e).splitlines() if l.strip(" *")), type(e).__name__)
+                job.warning = f"indexing skipped ({reason}); context.txt will be used"
+
+            if should_stop():
+                raise JobCancelled()
+            job.stage = "activating"
+            context.commit()
+            index.commit()
+            self.on_success(job)
+            job.state = SUCCEEDED
+        except JobCancelled:
+            job.state = CANCELLED
+        except Exception as e:
+            self.log("train job error:", job.id, e)
+            job.state, job.error = FAILED, str(e)
+        finally:
+            context.discard()
+            index.discard()
+            job.stage = None
+            job.finished = time.time()
@@ -0,0 +1,388 @@
+# transcriber.py — Whisper speech-to-text on a dedicated worker thread with a bounded job queue
+import io
+import asyncio
+import os
+import time
+import wave
+import queue
+import uuid
+import threading
+import subprocess
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from model_registry import registry
+
+# ----------------------------
+# Config
+# ----------------------------
+# tiny / base / small / medium (or the *.en variants); smaller is much faster on CPU
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")
+# "openai" (openai-whisper, the default) or "faster" (faster-whisper / CTranslate2, if installed)
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "openai")
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
+# int8: faster-whisper compute_type, or dynamic int8 quantization of the Linear layers for openai-whisper on CPU
+WHISPER_QUANTIZE = os.getenv("WHISPER_QUANTIZE", "")
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))  # 0 = library default
+TRANSCRIBE_MAX_QUEUE = int(os.getenv("TRANSCRIBE_MAX_QUEUE", "4"))
+TRANSCRIBE_TIMEOUT = float(os.getenv("TRANSCRIBE_TIMEOUT", "120"))  # per job, queue wait included
+TRANSCRIBE_RETRY_AFTER = int(os.getenv("TRANSCRIBE_RETRY_AFTER", "5"))
+# chunked (streaming) voice: segments are cut at pauses found by a simple energy VAD
+VAD_FRAME_MS = 30
+VAD_SILENCE_MS = int(os.getenv("VAD_SILENCE_MS", "500"))  # pause long enough to end an utterance
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "0.01"))  # frames quieter than this never count as speech
+# speech must be this many times the session's background noise level (learnt from its quiet frames)
+VAD_NOISE_RATIO = float(os.getenv("VAD_NOISE_RATIO", "3"))
+VAD_MAX_SEGMENT_S = float(os.getenv("VAD_MAX_SEGMENT_S", "25"))  # cut anyway (Whisper works on 30 s windows)
+TRANSCRIBE_SESSION_TTL = int(os.getenv("TRANSCRIBE_SESSION_TTL", "300"))
+TRANSCRIBE_MAX_SESSIONS = int(os.getenv("TRANSCRIBE_MAX_SESSIONS", "32"))
+
+SAMPLE_RATE = 16000
+
+
+class TranscriberBusy(Exception):
+    """Queue full (or too many voice sessions); callers should answer 503 + Retry-After."""
+
+    def __init__(self, message, retry_after=TRANSCRIBE_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TranscribeTimeout(Exception):
+    pass
+
+
+# ----------------------------
+# In-memory audio decoding (16 kHz mono float32, what Whisper expects)
+# ----------------------------
+def _decode_wav(data):
+    # PCM WAV straight from the browser/recorder: no ffmpeg process needed
+    with wave.open(io.BytesIO(data), "rb") as w:
+        if w.getsampwidth() != 2 or w.getcomptype() != "NONE":
+            return None
+        rate, channels = w.getframerate(), w.getnchannels()
+        pcm = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2").astype("float32") / 32768.0
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE and len(pcm):
+        n = int(round(len(pcm) * SAMPLE_RATE / rate))
+        pcm = np.interp(np.linspace(0, len(pcm) - 1, n), np.arange(len(pcm)), pcm).astype("float32")
+    return pcm
+
+
+def decode_audio(data):
+    """Decode uploaded audio bytes without touching disk."""
+    try:
+        pcm = _decode_wav(data)
+        if pcm is not None:
+            return pcm
+    except (wave.Error, EOFError):
+        pass
+    # anything else (webm/ogg/mp3, compressed wav): ffmpeg reading stdin, writing raw PCM to stdout
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+           "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"could not decode audio: {e.stderr.decode(errors='ignore')[-200:]}") from e
+    return np.frombuffer(out, dtype="<i2").astype("float32") / 32768.0
+
+
+# ----------------------------
+# Model backends
+# ----------------------------
+def load_model(name=WHISPER_MODEL, backend=WHISPER_BACKEND, device=WHISPER_DEVICE, quantize=WHISPER_QUANTIZE):
+    """Returns transcribe(audio, language, prompt=None) -> (text, detected_language)."""
+    print(f"🎙️ Loading Whisper model ({name}, backend={backend}{', ' + quantize if quantize else ''})...")
+    if backend == "faster":
+        from faster_whisper import WhisperModel
+
+        model = WhisperModel(name, device=device, compute_type=quantize or "default",
+                             cpu_threads=WHISPER_THREADS)
+
+        def run(audio, language, prompt=None):
+            segments, info = model.transcribe(audio, language=language, initial_prompt=prompt)
+            return "".join(s.text for s in segments), info.language
+        return run
+
+    import torch
+    import whisper
+
+    if WHISPER_THREADS:
+        torch.set_num_threads(WHISPER_THREADS)
+    model = whisper.load_model(name, device=device)
+    if quantize == "int8" and device == "cpu":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def run(audio, language, prompt=None):
+        result = model.transcribe(audio, language=language, initial_prompt=prompt, fp16=device != "cpu")
+        return result.get("text", ""), result.get("language")
+    return run
+
+
+# ----------------------------
+# Worker + bounded queue
+# ----------------------------
+class _Job:
+    def __init__(self, audio, language, prompt, deadline):
+        self.audio = audio
+        self.language = language
+        self.prompt = prompt
+        self.deadline = deadline
+        self.future = Future()
+
+
+class Transcriber:
+    """One inference thread owns the model, so concurrent uploads queue up instead of fighting over cores.
+
+    Nothing is loaded up front: the worker starts with the first job and gets the model from
+    model_registry (loading it on first use, reloading it after an idle unload).
+    """
+
+    def __init__(self, loader=load_model, max_queue=TRANSCRIBE_MAX_QUEUE, timeout=TRANSCRIBE_TIMEOUT,
+                 name="whisper"):
+        self.name = name
+        registry.register(name, loader)
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        # metrics
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.audio_total = 0.0
+        self.infer_total = 0.0
+
+    def ready(self):
+        return registry.loaded(self.name)
+
+    def transcribe(self, data, language=None):
+        """Decode `data` (audio file bytes) and transcribe it on the worker. Blocks until done.
+
+        Returns {text, language, audio_seconds, inference_seconds, rtf}.
+        """
+        # decoded on the request thread, outside the inference queue
+        return self.transcribe_audio(decode_audio(data), language)
+
+    def transcribe_audio(self, audio, language=None, prompt=None):
+        """Same as transcribe() for already decoded 16 kHz mono float32 audio; `prompt` primes the decoder."""
+        future = self.submit(audio, language, prompt)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self._expire(future)
+
+    async def transcribe_async(self, data, language=None):
+        """transcribe() for coroutines (asgi_app.py): decoding runs on an executor thread and waiting for
+        the worker holds no thread at all."""
+        audio = await asyncio.to_thread(decode_audio, data)
+        future = self.submit(audio, language)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self._expire(future)
+
+    def submit(self, audio, language=None, prompt=None):
+        """Queue decoded audio for the worker; returns a concurrent.futures.Future of the result dict."""
+        self._start_worker()
+        job = _Job(audio, language, prompt, time.monotonic() + self.timeout)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise TranscriberBusy("transcription queue is full")
+        return job.future
+
+    def _expire(self, future):
+        # a job that has not started yet is dropped by the worker once past its deadline
+        future.cancel()
+        with self._lock:
+            self.timed_out += 1
+        raise TranscribeTimeout(f"transcription took longer than {self.timeout:.0f}s")
+
+    def _start_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._worker, name="whisper", daemon=True)
+                    self._thread.start()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if time.monotonic() > job.deadline or not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                # the first job after boot (or after an idle unload) pays for loading the model
+                model = registry.get(self.name)
+                t0 = time.perf_counter()
+                text, lang = model(job.audio, job.language, job.prompt)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                job.future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - t0
+            duration = len(job.audio) / SAMPLE_RATE
+            with self._lock:
+                self.completed += 1
+                self.audio_total += duration
+                self.infer_total += elapsed
+            job.future.set_result({
+                "text": text.strip(),
+                "language": lang,
+                "audio_seconds": round(duration, 2),
+                "inference_seconds": round(elapsed, 3),
+                # real-time factor: < 1 means faster than the audio plays
+                "rtf": round(elapsed / duration, 3) if duration else None,
+            })
+
+    def stats(self):
+        with self._lock:
+            return {
+                "model": WHISPER_MODEL,
+                "backend": WHISPER_BACKEND,
+                "quantize": WHISPER_QUANTIZE or None,
+                "loaded": self.ready(),
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "failed": self.failed,
+                "audio_seconds": round(self.audio_total, 2),
+                "avg_rtf": round(self.infer_total / self.audio_total, 3) if self.audio_total else None,
+            }
+
+
+# ----------------------------
+# Chunked voice: VAD segmentation + per-recording sessions
+# ----------------------------
+def split_at_pause(audio, final=False, noise_floor=None):
+    """Split buffered audio into (ready, rest, quiet_level).
+
+    `ready` ends at the last pause, `rest` is speech still in progress; `ready` is None when there is no
+    complete utterance yet or the audio holds no speech at all. The speech threshold is VAD_MIN_RMS, raised to
+    VAD_NOISE_RATIO x `noise_floor` (the caller's running background level); it never depends on the buffer
+    alone, so evenly loud speech is not mistaken for background. quiet_level: mean RMS of the frames below the
+    threshold (None if there were none), for the caller to update its noise floor with.
+    """
+    frame = SAMPLE_RATE * VAD_FRAME_MS // 1000
+    n = len(audio) // frame
+    if n == 0:
+        return (None, audio[:0], None) if final else (None, audio, None)
+    rms = np.sqrt(np.mean(audio[:n * frame].reshape(n, frame) ** 2, axis=1))
+    threshold = max(VAD_MIN_RMS, VAD_NOISE_RATIO * noise_floor) if noise_floor else VAD_MIN_RMS
+    speech = rms > threshold
+    quiet_level = float(rms[~speech].mean()) if not speech.all() else None
+    if not speech.any():
+        # every frame is below the threshold: drop it, but keep a short tail in case speech starts at the boundary
+        return None, audio[:0] if final else audio[-frame * 5:], quiet_level
+    if final:
+        return audio, audio[:0], quiet_level
+
+    quiet = VAD_SILENCE_MS // VAD_FRAME_MS
+    cut = None
+    run = 0
+    for i in range(n - 1, -1, -1):
+        # scan back for the last run of `quiet` silent frames with speech before it
+        run = run + 1 if not speech[i] else 0
+        if run >= quiet and speech[:i].any():
+            cut = (i + quiet // 2) * frame
+            break
+    if cut is None:
+        if len(audio) < VAD_MAX_SEGMENT_S * SAMPLE_RATE:
+            return None, audio, quiet_level
+        cut = len(audio)
+    return audio[:cut], audio[cut:], quiet_level
+
+
+class VoiceSession:
+    """One chunked recording: segments arrive in order, complete utterances are transcribed as they close."""
+
+    def __init__(self, transcriber, language=None):
+        self.id = uuid.uuid4().hex
+        self.transcriber = transcriber
+        self.language = language
+        self.next_seq = 0
+        self.parts = []
+        self.buffer = np.zeros(0, dtype="float32")
+        self.noise_floor = None  # running RMS of the recording's non-speech frames
+        self.audio_seconds = 0.0
+        self.inference_seconds = 0.0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def text(self):
+        return " ".join(p for p in self.parts if p)
+
+    def feed(self, data, seq, final=False):
+        """Add segment `seq` (standalone audio file bytes, may be empty on the final call).
+
+        Returns the text transcribed from this segment ("" while the speaker has not paused yet).
+        """
+        with self.lock:
+            if seq != self.next_seq:
+                raise ValueError(f"expected segment {self.next_seq}, got {seq}")
+            self.last_used = time.monotonic()
+            before = self.buffer
+            if data:
+                self.buffer = np.concatenate([self.buffer, decode_audio(data)])
+            ready, rest, quiet = split_at_pause(self.buffer, final, self.noise_floor)
+            if quiet is not None:
+                # slow average, so a burst of loud background does not lift the threshold over speech at once
+                self.noise_floor = quiet if self.noise_floor is None else 0.8 * self.noise_floor + 0.2 * quiet
+            self.buffer = rest
+            new = ""
+            if ready is not None:
+                # the transcript so far keeps wording and spelling consistent across segments
+                try:
+                    result = self.transcriber.transcribe_audio(ready, self.language, prompt=self.text()[-200:] or None)
+                except BaseException:
+                    # keep the buffered utterance; seq is not advanced, so the client can resend this segment
+                    # (after a busy / timeout error) without its audio being added twice
+                    self.buffer = before
+                    raise
+                new = result["text"]
+                self.parts.append(new)
+                self.audio_seconds += result["audio_seconds"]
+                self.inference_seconds += result["inference_seconds"]
+            self.next_seq += 1
+            return new
+
+
+class VoiceSessions:
+    def __init__(self, transcriber, ttl=TRANSCRIBE_SESSION_TTL, max_sessions=TRANSCRIBE_MAX_SESSIONS):
+        self.transcriber = transcriber
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, language=None):
+        with self._lock:
+            self._prune()
+            if len(self._sessions) >= self.max_sessions:
+                raise TranscriberBusy("too many voice sessions in progress")
+            session = VoiceSession(self.transcriber, language)
+            self._sessions[session.id] = session
+            return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._prune()
+            return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _prune(self):
+        # abandoned recordings (client closed the tab mid-stream)
+        now = time.monotonic()
+        for sid in [sid for sid, s in self._sessions.items() if now - s.last_used > self.ttl]:
+            del self._sessions[sid]
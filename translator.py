@@ -0,0 +1,227 @@
+# translator.py — cached, batched translation (Telugu path) with pluggable backends
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# ----------------------------
+# Config
+# ----------------------------
+# "google" (deep_translator, remote), "argos" (argostranslate, offline) or "none" (returns text unchanged)
+TRANSLATOR_BACKEND = os.getenv("TRANSLATOR_BACKEND", "google")
+TRANSLATION_CACHE_DB = os.getenv("TRANSLATION_CACHE_DB", "data/translations.db")
+TRANSLATION_CACHE_MEM = int(os.getenv("TRANSLATION_CACHE_MEM", "2048"))  # hot entries kept in memory
+TRANSLATION_CACHE_MAX = int(os.getenv("TRANSLATION_CACHE_MAX", "50000"))  # rows kept on disk (LRU)
+# Google's free endpoint takes ~5000 chars per request; segments are packed up to this size
+TRANSLATE_BATCH_CHARS = int(os.getenv("TRANSLATE_BATCH_CHARS", "4500"))
+
+
+# ----------------------------
+# Backends: translate_batch(texts, source, target) -> list of the same length
+# ----------------------------
+class NoopBackend:
+    """Offline stand-in (tests, or deployments without translation)."""
+    name = "none"
+
+    def translate_batch(self, texts, source, target):
+        return list(texts)
+
+
+class GoogleBackend:
+    name = "google"
+
+    def translate_batch(self, texts, source, target):
+        from deep_translator import GoogleTranslator
+        gt = GoogleTranslator(source=source, target=target)
+        out = []
+        for batch in self._pack(texts):
+            if len(batch) == 1 or any("\n" in t for t in batch):
+                out.extend(gt.translate(t) for t in batch)
+                continue
+            # one request per packed batch; segments are newline-free, so lines map back one to one
+            lines = (gt.translate("\n".join(batch)) or "").split("\n")
+            if len(lines) != len(batch):
+                lines = [gt.translate(t) for t in batch]
+            out.extend(lines)
+        return out
+
+    @staticmethod
+    def _pack(texts):
+        batch, size = [], 0
+        for t in texts:
+            if batch and size + len(t) + 1 > TRANSLATE_BATCH_CHARS:
+                yield batch
+                batch, size = [], 0
+            batch.append(t)
+            size += len(t) + 1
+        if batch:
+            yield batch
+
+
+class ArgosBackend:
+    """Local models via argostranslate (the language pair package must be installed); needs an explicit source."""
+    name = "argos"
+
+    def translate_batch(self, texts, source, target):
+        from argostranslate import translate
+        if source == "auto":
+            raise ValueError("argos backend needs an explicit source language")
+        return [translate.translate(t, source, target) for t in texts]
+
+
+BACKENDS = {"google": GoogleBackend, "argos": ArgosBackend, "none": NoopBackend}
+
+
+def register_backend(name, factory):
+    BACKENDS[name] = factory
+
+
+# ----------------------------
+# Cache: in-memory LRU in front of a SQLite table
+# ----------------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    source  TEXT NOT NULL,
+    target  TEXT NOT NULL,
+    text    TEXT NOT NULL,
+    result  TEXT NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (source, target, text)
+);
+CREATE INDEX IF NOT EXISTS idx_translations_used ON translations(used_at);
+"""
+
+
+class Translator:
+    def __init__(self, backend=None, db_path=TRANSLATION_CACHE_DB, mem_entries=TRANSLATION_CACHE_MEM,
+                 max_rows=TRANSLATION_CACHE_MAX, log=print):
+        self.backend = backend or BACKENDS[TRANSLATOR_BACKEND]()
+        self.mem_entries = mem_entries
+        self.max_rows = max_rows
+        self.log = log
+        self._mem = OrderedDict()  # (source, target, text) -> result, oldest first
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        self._writes = 0
+        # metrics
+        self.mem_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.backend_calls = 0
+        self.errors = 0
+
+    def _remember(self, key, result):
+        # call with the lock held
+        self._mem[key] = result
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_entries:
+            self._mem.popitem(last=False)
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._mem:
+                    self._mem.move_to_end(key)
+                    found[key] = self._mem[key]
+                    self.mem_hits += 1
+            if self._conn is None:
+                return found
+            now = time.time()
+            for key in keys:
+                if key in found:
+                    continue
+                row = self._conn.execute(
+                    "SELECT result FROM translations WHERE source = ? AND target = ? AND text = ?", key).fetchone()
+                if row:
+                    found[key] = row[0]
+                    self.disk_hits += 1
+                    self._remember(key, row[0])
+                    # recency only needs refreshing when an entry is promoted back into memory
+                    self._conn.execute("UPDATE translations SET used_at = ? WHERE source = ? AND target = ? AND text = ?",
+                                       (now,) + key)
+            self._conn.commit()
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            for key, result in items:
+                self._remember(key, result)
+            if self._conn is None:
+                return
+            now = time.time()
+            self._conn.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                                   [key + (result, now) for key, result in items])
+            self._writes += len(items)
+            if self._writes >= max(100, self.max_rows // 100):
+                # trim the least recently used rows now and then, not on every write
+                self._writes = 0
+                self._conn.execute("DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations "
+                                   "ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_rows,))
+            self._conn.commit()
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def translate_many(self, texts, target, source="auto"):
+        """Translate a list of segments; cached ones cost nothing, the rest go to the backend in one batch.
+
+        Segments that fail to translate come back unchanged (and are not cached).
+        """
+        out = list(texts)
+        keys = {}
+        for i, t in enumerate(texts):
+            if t and t.strip():
+                keys.setdefault((source, target, t.strip()), []).append(i)
+        if not keys:
+            return out
+        found = self._lookup(list(keys))
+        missing = [k for k in keys if k not in found]
+        with self._lock:
+            self.misses += len(missing)
+        if missing:
+            try:
+                with self._lock:
+                    self.backend_calls += 1
+                results = self.backend.translate_batch([k[2] for k in missing], source, target)
+                fresh = [(k, r) for k, r in zip(missing, results) if r]
+                self._store(fresh)
+                found.update(fresh)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                self.log("translate error:", e)
+        for key, positions in keys.items():
+            if key in found:
+                for i in positions:
+                    out[i] = found[key]
+        return out
+
+    def translate(self, text, target, source="auto"):
+        """Translate `text` paragraph by paragraph, so repeated paragraphs are cache hits too."""
+        if not text or not text.strip():
+            return text
+        parts = text.split("\n")
+        return "\n".join(self.translate_many(parts, target, source))
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0] if self._conn else 0
+            lookups = self.mem_hits + self.disk_hits + self.misses
+            return {
+                "backend": getattr(self.backend, "name", type(self.backend).__name__),
+                "mem_entries": len(self._mem),
+                "disk_entries": rows,
+                "mem_hits": self.mem_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.mem_hits + self.disk_hits) / lookups, 3) if lookups else None,
+                "backend_calls": self.backend_calls,
+                "errors": self.errors,
+            }
@@ -0,0 +1,117 @@
+# version_registry.py — process-wide, in-memory view of versions.json and active contexts
+import os
+import copy
+import json
+import time
+import tempfile
+import threading
+
+# how often (seconds) the hot path may stat versions.json to pick up edits from other processes
+VERSIONS_RELOAD_INTERVAL = float(os.getenv("VERSIONS_RELOAD_INTERVAL", "2"))
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file in the same directory, then rename over `path`."""
+    folder = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class VersionRegistry:
+    # versions.json structure: list of {model, version, description, timestamp, files[], active}
+    def __init__(self, versions_path, pdf_store, log=print):
+        self.versions_path = versions_path
+        self.pdf_store = pdf_store
+        self.log = log
+        self._lock = threading.RLock()
+        self._versions = []
+        self._mtime = None
+        self._checked = 0.0
+        self._contexts = {}  # (model, version) -> context text prefix
+        self._reload()
+
+    # ----------------------------
+    # Disk sync
+    # ----------------------------
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.versions_path)
+        except OSError:
+            return None
+
+    def _reload(self):
+        mtime = self._file_mtime()
+        versions = []
+        if mtime is not None:
+            try:
+                with open(self.versions_path, "r", encoding="utf-8") as f:
+                    versions = json.load(f)
+            except Exception as e:
+                self.log("load_versions error:", e)
+                return
+        self._versions, self._mtime = versions, mtime
+        self._contexts.clear()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < VERSIONS_RELOAD_INTERVAL:
+            return
+        with self._lock:
+            self._checked = now
+            if self._file_mtime() != self._mtime:
+                self._reload()
+
+    # ----------------------------
+    # Reads (memory only, apart from the throttled mtime check)
+    # ----------------------------
+    def all(self):
+        self._maybe_reload()
+        with self._lock:
+            return copy.deepcopy(self._versions)
+
+    def active_for(self, model):
+        self._maybe_reload()
+        with self._lock:
+            for v in self._versions:
+                # match model key by prefix (e.g., "gemma2" in "gemma2:2b") or exact
+                if (v.get("model") and v.get("model") in model) or (v.get("model") == model):
+                    if v.get("active"):
+                        return dict(v)
+        return None
+
+    def context_for(self, entry, max_chars):
+        """First `max_chars` of the version's context.txt; read from disk once, then served from memory."""
+        key = (entry["model"], entry["version"])
+        with self._lock:
+            if key in self._contexts:
+                return self._contexts[key]
+        ctx_path = os.path.join(self.pdf_store, entry["model"], entry["version"], "context.txt")
+        text = ""
+        if os.path.exists(ctx_path):
+            with open(ctx_path, "r", encoding="utf-8") as f:
+                text = f.read(max_chars)
+        with self._lock:
+            self._contexts[key] = text
+        return text
+
+    # ----------------------------
+    # Writes
+    # ----------------------------
+    def save(self, versions):
+        with self._lock:
+            atomic_write_json(self.versions_path, versions)
+            self._versions = copy.deepcopy(versions)
+            self._mtime = self._file_mtime()
+            # context files may have been written or removed alongside this change
+            self._contexts.clear()